@@ -1,4 +1,9 @@
 from .slash import *
+from .bufferedsender import *
+from .bulk import *
+from .cache import *
+from .cachebackend import *
+from .cachestats import *
 from .channel import *
 from .client import *
 from .command import *
@@ -9,14 +14,27 @@ from .file import *
 from .gateway import *
 from .guild import *
 from .handler import *
+from .httpclient import *
+from .httpstats import *
 from .member import *
+from .memberpolicy import *
 from .message import *
+from .messagecache import *
 from .ogg import *
+from .paginator import *
+from .permission import *
 from .player import *
+from .presence import *
+from .processhandler import *
 from .ratelimit import *
+from .responsecache import *
+from .retry import *
+from .sharedcache import *
+from .snapshot import *
 from .user import *
 from .util import *
 from .voice import *
+from .webhook import *
 from .websocket import *
 
 __version__ = LIB_VER
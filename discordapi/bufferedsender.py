@@ -0,0 +1,199 @@
+#
+# NicoBot is Nicovideo Player bot for Discord, written from the scratch.
+# This file is part of NicoBot.
+#
+# Copyright (C) 2021 Wonjun Jung (KokoseiJ)
+#
+#    Nicobot is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+
+from .const import EMPTY, LIB_NAME
+
+import logging
+from threading import Thread, Event, Lock
+from concurrent.futures import Future
+
+__all__ = ["BufferedSender"]
+
+logger = logging.getLogger(LIB_NAME)
+
+MAX_CONTENT_LENGTH = 2000
+MAX_EMBEDS = 10
+
+
+class BufferedSender:
+    """Merges text sent to a channel in a short window into fewer messages.
+
+    Every channel only allows a few messages per second, so sending many
+    small messages quickly ends up waiting on the rate limit. Contents sent
+    through this object are held for .window seconds and then sent joined
+    with .separator, packed into as few messages as the 2000 characters and
+    10 embeds limits allow, keeping their order. Sends queued while a
+    message is being sent or waiting for the rate limit are merged into the
+    next one.
+
+    Every send returns a Future resolving to the Message its content ended up
+    in, which could be shared with other sends.
+
+    Attributes:
+        channel:
+            Channel to send the messages to.
+        window:
+            Seconds to wait for more sends after the first pending one.
+        separator:
+            String to put between the merged contents.
+        allowed_mentions:
+            allowed_mentions object used for every message.
+    """
+    def __init__(self, channel, window=0.5, separator="\n",
+                 allowed_mentions=EMPTY):
+        self.channel = channel
+        self.window = window
+        self.separator = separator
+        self.allowed_mentions = allowed_mentions
+
+        self._pending = []
+        self._lock = Lock()
+        self._send_lock = Lock()
+        self._wakeup = Event()
+        self._closed = Event()
+        self._thread = None
+
+    def send(self, content=EMPTY, embeds=EMPTY):
+        """Queues the content and embeds to be sent.
+
+        Returns:
+            concurrent.futures.Future resolving to the sent Message.
+
+        Raises:
+            ValueError:
+                Raised when the content or embeds can't fit in a message.
+            RuntimeError:
+                Raised when the sender has been closed.
+        """
+        if not content:
+            content = EMPTY
+        if not embeds:
+            embeds = EMPTY
+        if content is EMPTY and embeds is EMPTY:
+            raise ValueError("Either content or embeds should be given.")
+        if content is not EMPTY and len(content) > MAX_CONTENT_LENGTH:
+            raise ValueError(
+                f"content is longer than {MAX_CONTENT_LENGTH} characters.")
+        if embeds is not EMPTY and len(embeds) > MAX_EMBEDS:
+            raise ValueError(f"More than {MAX_EMBEDS} embeds were given.")
+
+        future = Future()
+        with self._lock:
+            if self._closed.is_set():
+                raise RuntimeError("Sender has been closed.")
+            self._pending.append((content, embeds, future))
+            if self._thread is None:
+                self._thread = Thread(
+                    target=self._send_loop,
+                    name=f"{self.channel.client.name}_sender_"
+                         f"{self.channel.id}"
+                )
+                self._thread.daemon = True
+                self._thread.start()
+        self._wakeup.set()
+
+        return future
+
+    def flush(self):
+        """Sends everything pending right away, in the calling thread."""
+        with self._send_lock:
+            with self._lock:
+                pending, self._pending = self._pending, []
+            for batch in self._pack(pending):
+                self._send_batch(batch)
+
+    def close(self):
+        """Sends what's pending and stops the sending thread."""
+        with self._lock:
+            self._closed.set()
+            thread = self._thread
+        self._wakeup.set()
+        if thread is not None:
+            thread.join()
+        self.flush()
+
+    def get_pending(self):
+        """Returns amount of the sends waiting to be sent."""
+        return len(self._pending)
+
+    def _send_loop(self):
+        while True:
+            self._wakeup.wait()
+            self._wakeup.clear()
+            if self._closed.is_set():
+                return
+            if not self._pending:
+                continue
+            # Gives the other sends in the window a chance to be merged
+            if self._closed.wait(self.window):
+                return
+            self.flush()
+
+    def _pack(self, pending):
+        batches = []
+        batch = []
+        length = 0
+        embed_count = 0
+
+        for item in pending:
+            content, embeds, _ = item
+            add_length = 0 if content is EMPTY else len(content)
+            if add_length and length:
+                add_length += len(self.separator)
+            add_embeds = 0 if embeds is EMPTY else len(embeds)
+
+            if batch and (length + add_length > MAX_CONTENT_LENGTH or
+                          embed_count + add_embeds > MAX_EMBEDS):
+                batches.append(batch)
+                batch = []
+                length = 0 if content is EMPTY else len(content)
+                embed_count = add_embeds
+            else:
+                length += add_length
+                embed_count += add_embeds
+            batch.append(item)
+
+        if batch:
+            batches.append(batch)
+        return batches
+
+    def _send_batch(self, batch):
+        contents = [
+            content for content, _, _ in batch if content is not EMPTY
+        ]
+        embeds = [
+            embed for _, embeds, _ in batch if embeds is not EMPTY
+            for embed in embeds
+        ]
+
+        try:
+            message = self.channel.send(
+                content=self.separator.join(contents) if contents else EMPTY,
+                embeds=embeds or EMPTY,
+                allowed_mentions=self.allowed_mentions
+            )
+        except Exception as e:
+            logger.warning(
+                f"Failed to send {len(batch)} buffered messages: {e}")
+            for _, _, future in batch:
+                future.set_exception(e)
+        else:
+            for _, _, future in batch:
+                future.set_result(message)
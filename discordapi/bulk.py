@@ -0,0 +1,191 @@
+#
+# NicoBot is Nicovideo Player bot for Discord, written from the scratch.
+# This file is part of NicoBot.
+#
+# Copyright (C) 2021 Wonjun Jung (KokoseiJ)
+#
+#    Nicobot is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+
+from .const import LIB_NAME
+
+import time
+import logging
+from queue import Queue
+from threading import Thread, Lock
+
+__all__ = ["BulkOperation", "get_snowflake_time"]
+
+logger = logging.getLogger(LIB_NAME)
+
+DISCORD_EPOCH = 1420070400000
+BULK_DELETE_MIN = 2
+BULK_DELETE_MAX = 100
+BULK_BAN_MAX = 200
+# Bulk delete rejects messages older than 2 weeks, minus a safety margin
+BULK_DELETE_MAX_AGE = 14 * 24 * 60 * 60 - 60
+
+
+def get_snowflake_time(id_):
+    """Returns unix timestamp in seconds the snowflake was created at."""
+    return ((int(id_) >> 22) + DISCORD_EPOCH) / 1000
+
+
+def is_bulk_deletable(id_, now=None):
+    """Returns if the message is new enough to be bulk deleted."""
+    if now is None:
+        now = time.time()
+    return now - get_snowflake_time(id_) < BULK_DELETE_MAX_AGE
+
+
+def split_bulk_delete(ids, now=None):
+    """Splits message ids into bulk delete batches and single deletes.
+
+    Returns:
+        tuple of (batches, singles) where batches is a list of lists holding
+        2 to 100 ids each, and singles is a list of ids that should be
+        deleted one by one- either too old, or left alone in the last batch.
+    """
+    recent = []
+    singles = []
+    for id_ in dict.fromkeys(ids):
+        if is_bulk_deletable(id_, now):
+            recent.append(id_)
+        else:
+            singles.append(id_)
+
+    batches = [
+        recent[start:start + BULK_DELETE_MAX]
+        for start in range(0, len(recent), BULK_DELETE_MAX)
+    ]
+    if batches and len(batches[-1]) < BULK_DELETE_MIN:
+        singles.extend(batches.pop())
+
+    return batches, singles
+
+
+class BulkOperation:
+    """Runs many REST requests, in parallel across the rate limit buckets.
+
+    Requests sharing a rate limit bucket can't go faster than the bucket
+    allows, so each bucket gets a worker thread sending its requests one by
+    one, while different buckets are worked on at the same time. Bucket is
+    just a hashable key chosen by the caller, e.g. ("bulk-delete", channel).
+
+    Tasks can be submitted while the earlier ones are running, so that the
+    work could be streamed rather than collected up front.
+
+    Attributes:
+        progress:
+            function to be called with this object whenever a task finishes.
+            None to not report the progress.
+        total:
+            Amount of items submitted. A task could cover multiple items,
+            e.g. a bulk delete of 100 messages.
+        done:
+            Amount of items successfully processed.
+        failed:
+            list of (args, exception) of the tasks that have failed.
+        started_at:
+            time.monotonic() value of when the first task got submitted.
+    """
+    def __init__(self, progress=None):
+        self.progress = progress
+        self.total = 0
+        self.done = 0
+        self.failed = []
+        self.started_at = None
+        self.finished_at = None
+
+        self._queues = {}
+        self._threads = []
+        self._lock = Lock()
+
+    def submit(self, bucket, func, *args, count=1):
+        """Queues func(*args) to be run in the bucket's worker."""
+        with self._lock:
+            if self.started_at is None:
+                self.started_at = time.monotonic()
+            self.total += count
+
+            queue = self._queues.get(bucket)
+            if queue is None:
+                queue = self._queues[bucket] = Queue()
+                thread = Thread(
+                    target=self._worker, args=(queue,),
+                    name=f"bulk_{len(self._threads)}"
+                )
+                thread.daemon = True
+                thread.start()
+                self._threads.append(thread)
+
+        queue.put((func, args, count))
+
+    def wait(self):
+        """Waits for every submitted task to finish, returns self."""
+        for queue in self._queues.values():
+            queue.put(None)
+        for thread in self._threads:
+            thread.join()
+
+        self._queues.clear()
+        self._threads.clear()
+        self.finished_at = time.monotonic()
+
+        return self
+
+    def get_elapsed(self):
+        if self.started_at is None:
+            return 0.0
+        end = self.finished_at if self.finished_at is not None \
+            else time.monotonic()
+        return end - self.started_at
+
+    def get_rate(self):
+        """Returns amount of items processed per second."""
+        elapsed = self.get_elapsed()
+        return self.done / elapsed if elapsed else 0.0
+
+    def _worker(self, queue):
+        while True:
+            task = queue.get()
+            if task is None:
+                return
+
+            func, args, count = task
+            try:
+                result = func(*args)
+            except Exception as e:
+                logger.warning(f"Bulk task {func.__name__}{args} failed: {e}")
+                with self._lock:
+                    self.failed.append((args, e))
+            else:
+                # func may return how many of the items actually succeeded
+                if isinstance(result, int) and not isinstance(result, bool):
+                    count = result
+                with self._lock:
+                    self.done += count
+
+            if self.progress is not None:
+                try:
+                    self.progress(self)
+                except Exception:
+                    logger.exception("Exception occured in progress callback.")
+
+    def __str__(self):
+        return f"<{self.__class__.__name__} {self.done}/{self.total} done, " \
+            f"{len(self.failed)} failed, {self.get_rate():.1f}/s>"
+
+    def __repr__(self):
+        return self.__str__()
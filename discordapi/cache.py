@@ -0,0 +1,113 @@
+#
+# NicoBot is Nicovideo Player bot for Discord, written from the scratch.
+# This file is part of NicoBot.
+#
+# Copyright (C) 2021 Wonjun Jung (KokoseiJ)
+#
+#    Nicobot is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+
+
+from threading import RLock
+from types import MappingProxyType
+
+__all__ = ["CacheDict"]
+
+
+class CacheDict(dict):
+    """dict used for caches shared between the gateway and other threads.
+
+    Writes are serialized with a lock and bump .version, while single-key
+    reads such as `.get` and `[]` are plain dict lookups with no locking or
+    copying involved.
+
+    Iterating over the cache while the gateway thread is mutating it is not
+    safe, so use .snapshot() instead. It returns a read-only view of the
+    cache as of the call. The copy behind the view is made at most once per
+    version and shared between readers, so repeated iteration over an
+    unchanged cache is free.
+
+    Attributes:
+        version:
+            int incremented on every write.
+    """
+    def __init__(self, *args, **kwargs):
+        super(CacheDict, self).__init__(*args, **kwargs)
+        self._lock = RLock()
+        self._snapshot = None
+        self.version = 0
+
+    def snapshot(self):
+        """Returns a read-only mapping of the current content."""
+        snapshot = self._snapshot
+        if snapshot is not None and snapshot[0] == self.version:
+            return snapshot[1]
+
+        with self._lock:
+            view = MappingProxyType(dict(self))
+            self._snapshot = (self.version, view)
+
+        return view
+
+    def copy(self):
+        """Returns a plain dict copy of the content, not kept around.
+
+        Use this over .snapshot() for one-off reads, as the copy made for a
+        snapshot stays in memory until the next write.
+        """
+        with self._lock:
+            return dict(self)
+
+    def __setitem__(self, key, value):
+        with self._lock:
+            super(CacheDict, self).__setitem__(key, value)
+            self.version += 1
+
+    def __delitem__(self, key):
+        with self._lock:
+            super(CacheDict, self).__delitem__(key)
+            self.version += 1
+
+    def __ior__(self, other):
+        self.update(other)
+        return self
+
+    def update(self, *args, **kwargs):
+        with self._lock:
+            super(CacheDict, self).update(*args, **kwargs)
+            self.version += 1
+
+    def setdefault(self, key, default=None):
+        with self._lock:
+            if key in self:
+                return self[key]
+            self[key] = default
+            return default
+
+    def pop(self, key, *args):
+        with self._lock:
+            value = super(CacheDict, self).pop(key, *args)
+            self.version += 1
+            return value
+
+    def popitem(self):
+        with self._lock:
+            item = super(CacheDict, self).popitem()
+            self.version += 1
+            return item
+
+    def clear(self):
+        with self._lock:
+            super(CacheDict, self).clear()
+            self.version += 1
@@ -0,0 +1,289 @@
+#
+# NicoBot is Nicovideo Player bot for Discord, written from the scratch.
+# This file is part of NicoBot.
+#
+# Copyright (C) 2021 Wonjun Jung (KokoseiJ)
+#
+#    Nicobot is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+
+
+from .const import LIB_NAME
+
+import json
+import time
+import socket
+import logging
+from threading import Lock
+
+__all__ = ["CacheBackendError", "CacheBackend", "DictCacheBackend",
+           "RedisCacheBackend"]
+
+logger = logging.getLogger(LIB_NAME)
+
+
+class CacheBackendError(Exception):
+    pass
+
+
+class CacheBackend:
+    """Base class for stores the gateway writes its cache through.
+
+    Gateway calls .set and .delete as entities change, and .flush once per
+    dispatched event, so that implementations are free to buffer writes and
+    send them in batches.
+
+    Keys used by the gateway are:
+        guild:{guild_id}
+        channel:{channel_id}
+        member:{guild_id}:{user_id}
+        voice_state:{guild_id}:{user_id}
+    Values are JSON-serializable objects- raw JSON objects from Discord, or
+    channel id for voice states.
+    """
+    def set(self, key, value):
+        raise NotImplementedError()
+
+    def get(self, key):
+        raise NotImplementedError()
+
+    def delete(self, key):
+        raise NotImplementedError()
+
+    def flush(self):
+        pass
+
+    def get_guild(self, id_):
+        return self.get(f"guild:{id_}")
+
+    def get_channel(self, id_):
+        return self.get(f"channel:{id_}")
+
+    def get_member(self, guild_id, user_id):
+        return self.get(f"member:{guild_id}:{user_id}")
+
+    def get_voice_state(self, guild_id, user_id):
+        return self.get(f"voice_state:{guild_id}:{user_id}")
+
+
+class DictCacheBackend(CacheBackend):
+    """In-process backend storing values in a dict."""
+    def __init__(self):
+        self.data = {}
+
+    def set(self, key, value):
+        self.data[key] = value
+
+    def get(self, key):
+        return self.data.get(key)
+
+    def delete(self, key):
+        self.data.pop(key, None)
+
+
+class RedisCacheBackend(CacheBackend):
+    """Backend talking to a Redis protocol compatible key-value server.
+
+    Writes are buffered and sent pipelined- every buffered command goes out
+    in a single send, and the replies are read afterwards. Buffer is flushed
+    by the gateway after each event, when it reaches max_pipeline commands,
+    and before any read.
+
+    Commands that couldn't be sent as the server was unreachable are kept
+    and sent again with the next flush after retry_interval seconds. SET
+    and DEL are idempotent, so sending a batch twice is harmless. Oldest
+    commands get dropped once more than max_pending are waiting.
+
+    Attributes:
+        host:
+            Host of the server.
+        port:
+            Port of the server.
+        db:
+            Database index to SELECT after connecting.
+        password:
+            Password to AUTH with, None to skip.
+        prefix:
+            String to be prepended to every key.
+        timeout:
+            Socket timeout in seconds.
+        max_pipeline:
+            Amount of buffered commands that triggers a flush.
+        retry_interval:
+            Seconds to wait for before sending again after a failure.
+        max_pending:
+            Maximum amount of commands kept while the server is unreachable.
+    """
+    def __init__(self, host="127.0.0.1", port=6379, db=0, password=None,
+                 prefix=f"{LIB_NAME}:", timeout=5, max_pipeline=1000,
+                 retry_interval=5, max_pending=100000):
+        self.host = host
+        self.port = port
+        self.db = db
+        self.password = password
+        self.prefix = prefix
+        self.timeout = timeout
+        self.max_pipeline = max_pipeline
+        self.retry_interval = retry_interval
+        self.max_pending = max_pending
+
+        self._sock = None
+        self._file = None
+        self._pending = []
+        self._retry_at = 0
+        self._lock = Lock()
+
+    def set(self, key, value):
+        self._queue("SET", self.prefix + key, json.dumps(value))
+
+    def delete(self, key):
+        self._queue("DEL", self.prefix + key)
+
+    def get(self, key):
+        with self._lock:
+            self._flush(True)
+            value = self._execute([("GET", self.prefix + key)])[0]
+        if value is None:
+            return None
+        return json.loads(value)
+
+    def flush(self):
+        with self._lock:
+            self._flush()
+
+    def close(self):
+        with self._lock:
+            self._disconnect()
+
+    def _queue(self, *command):
+        with self._lock:
+            self._pending.append(command)
+            if len(self._pending) > self.max_pending:
+                logger.warning(
+                    "Cache backend is unreachable, dropping "
+                    f"{len(self._pending) - self.max_pending} commands.")
+                del self._pending[:-self.max_pending]
+            if len(self._pending) >= self.max_pipeline:
+                self._flush()
+
+    def _flush(self, force=False):
+        """Sends the pending commands, keeping them if it fails to.
+
+        Does nothing until retry_interval has passed since the last failure
+        unless force is True.
+        """
+        if not self._pending:
+            return
+        if not force and time.monotonic() < self._retry_at:
+            return
+        commands = self._pending
+        self._pending = []
+        try:
+            self._execute(commands)
+        except (OSError, EOFError):
+            self._pending = commands
+            self._retry_at = time.monotonic() + self.retry_interval
+            raise
+        self._retry_at = 0
+
+    def _execute(self, commands):
+        """Sends commands pipelined, and returns list of their replies.
+
+        Reconnects and retries once if the connection has been lost.
+        """
+        payload = b"".join(self._encode(*command) for command in commands)
+
+        for attempt in range(2):
+            try:
+                if self._sock is None:
+                    self._connect()
+                self._sock.sendall(payload)
+                replies = [self._read_reply() for _ in commands]
+            except (OSError, EOFError):
+                self._disconnect()
+                if attempt:
+                    raise
+            else:
+                break
+
+        # Errors are raised after every reply has been read, so that the
+        # connection doesn't go out of sync with the server.
+        for reply in replies:
+            if isinstance(reply, CacheBackendError):
+                raise reply
+        return replies
+
+    def _connect(self):
+        self._sock = socket.create_connection(
+            (self.host, self.port), self.timeout
+        )
+        self._file = self._sock.makefile("rb")
+
+        setup = []
+        if self.password is not None:
+            setup.append(("AUTH", self.password))
+        if self.db:
+            setup.append(("SELECT", str(self.db)))
+        if setup:
+            self._sock.sendall(
+                b"".join(self._encode(*command) for command in setup)
+            )
+            for _ in setup:
+                reply = self._read_reply()
+                if isinstance(reply, CacheBackendError):
+                    raise reply
+
+    def _disconnect(self):
+        if self._sock is not None:
+            try:
+                self._file.close()
+                self._sock.close()
+            except OSError:
+                pass
+        self._sock = None
+        self._file = None
+
+    @staticmethod
+    def _encode(*args):
+        parts = [b"*%d\r\n" % len(args)]
+        for arg in args:
+            if isinstance(arg, str):
+                arg = arg.encode()
+            parts.append(b"$%d\r\n%s\r\n" % (len(arg), arg))
+        return b"".join(parts)
+
+    def _read_reply(self):
+        line = self._file.readline()
+        if not line:
+            raise EOFError("Connection closed by the server")
+        prefix, rest = line[:1], line[1:-2]
+
+        if prefix == b"+":
+            return rest.decode()
+        elif prefix == b"-":
+            return CacheBackendError(rest.decode())
+        elif prefix == b":":
+            return int(rest)
+        elif prefix == b"$":
+            length = int(rest)
+            if length == -1:
+                return None
+            return self._file.read(length + 2)[:-2]
+        elif prefix == b"*":
+            length = int(rest)
+            if length == -1:
+                return None
+            return [self._read_reply() for _ in range(length)]
+        else:
+            raise CacheBackendError(f"Unknown reply {line!r}")
@@ -0,0 +1,278 @@
+#
+# NicoBot is Nicovideo Player bot for Discord, written from the scratch.
+# This file is part of NicoBot.
+#
+# Copyright (C) 2021 Wonjun Jung (KokoseiJ)
+#
+#    Nicobot is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+
+from .const import LIB_NAME
+from .dictobject import DictObject
+from .util import StoppableThread
+
+import sys
+import random
+import logging
+
+__all__ = ["CacheStatsReporter", "get_cache_stats"]
+
+logger = logging.getLogger(LIB_NAME)
+
+# Attributes referring to other cached entities, which are accounted for
+# separately and shouldn't be counted as a part of the referring object.
+SKIP_ATTRS = frozenset(("client", "guild", "channel", "manager"))
+# Guild fields stored as separate entities.
+GUILD_ENTITY_KEYS = frozenset(("channels", "members", "presences"))
+
+
+def _snapshot(mapping):
+    """Returns a copy of the cache safe to iterate from another thread.
+
+    The copy is temporary, unlike CacheDict.snapshot() which would keep a
+    copy of every cache around and double their size.
+    """
+    if mapping is None:
+        return {}
+    return mapping.copy()
+
+
+def sizeof(obj, seen=None, skip_keys=()):
+    """Returns approximate size of obj in bytes, including what it contains.
+
+    DictObjects are measured by their raw JSON and the attribute dict, while
+    references to other cached entities like .guild aren't followed. dicts
+    are copied before being walked through, as the gateway thread could be
+    updating them.
+    """
+    if seen is None:
+        seen = set()
+    if id(obj) in seen:
+        return 0
+    seen.add(id(obj))
+
+    size = sys.getsizeof(obj)
+
+    if isinstance(obj, DictObject):
+        attrs = vars(obj)
+        size += sys.getsizeof(attrs)
+        size += sizeof(obj._json, seen, skip_keys)
+        for key, value in list(attrs.items()):
+            if key not in SKIP_ATTRS and key not in skip_keys and \
+                    key != "_json":
+                size += sizeof(value, seen)
+    elif isinstance(obj, dict):
+        for key, value in list(obj.items()):
+            if key in skip_keys:
+                continue
+            size += sizeof(key, seen) + sizeof(value, seen)
+    elif isinstance(obj, (list, tuple, set, frozenset)):
+        for value in list(obj):
+            size += sizeof(value, seen)
+
+    return size
+
+
+def estimate(objects, sample_size):
+    """Estimates total size of objects by measuring a random sample.
+
+    Returns:
+        tuple of (count, bytes).
+    """
+    objects = list(objects)
+    count = len(objects)
+    if not count:
+        return 0, 0
+
+    if count > sample_size:
+        sample = random.sample(objects, sample_size)
+    else:
+        sample = objects
+
+    total = sum(sizeof(obj) for obj in sample)
+    return count, total * count // len(sample)
+
+
+def get_guild_stats(guild, sample_size=100):
+    """Returns count and approximate size of entities cached in the guild."""
+    channels = _snapshot(guild.channels).values()
+    members = _snapshot(guild.members).values()
+
+    channel_count, channel_bytes = estimate(channels, sample_size)
+    member_count, member_bytes = estimate(members, sample_size)
+    own_bytes = sizeof(guild, skip_keys=GUILD_ENTITY_KEYS)
+
+    return {
+        "name": guild.name,
+        "channels": channel_count,
+        "members": member_count,
+        "channel_bytes": channel_bytes,
+        "member_bytes": member_bytes,
+        "bytes": own_bytes + channel_bytes + member_bytes
+    }
+
+
+def get_cache_stats(client, sample_size=100):
+    """Returns entity counts and approximate sizes of the client's cache.
+
+    Sizes are measured with sys.getsizeof over sample_size randomly chosen
+    entities of each kind and extrapolated, so they're estimates. users
+    share their objects with members, and is not included in the total.
+
+    Returns:
+        dict with "types" mapping entity kinds to {"count", "bytes"},
+        "guilds" mapping guild ids to per guild stats, and "bytes" for the
+        total size.
+    """
+    guilds = [guild for guild in _snapshot(client.guilds).values() if guild]
+    per_guild = {
+        guild.id: get_guild_stats(guild, sample_size) for guild in guilds
+    }
+
+    types = {
+        "guilds": {
+            "count": len(guilds),
+            "bytes": sum(
+                stats['bytes'] - stats['channel_bytes'] -
+                stats['member_bytes'] for stats in per_guild.values()
+            )
+        },
+        "channels": {
+            "count": sum(stats['channels'] for stats in per_guild.values()),
+            "bytes": sum(
+                stats['channel_bytes'] for stats in per_guild.values())
+        },
+        "members": {
+            "count": sum(stats['members'] for stats in per_guild.values()),
+            "bytes": sum(stats['member_bytes'] for stats in per_guild.values())
+        }
+    }
+
+    channels = _snapshot(client.channels)
+    guild_channels = set(channels) - {
+        id_ for guild in guilds for id_ in _snapshot(guild.channels)
+    }
+    count, size = estimate(
+        (channels[id_] for id_ in guild_channels), sample_size)
+    types['private_channels'] = {"count": count, "bytes": size}
+
+    count, size = estimate(_snapshot(client.users).values(), sample_size)
+    types['users'] = {"count": count, "bytes": size}
+
+    cache = client.message_cache
+    if cache is not None:
+        with cache._lock:
+            messages = [entry[0] for entry in cache._messages.values()]
+        count, size = estimate(messages, sample_size)
+        types['messages'] = {"count": count, "bytes": size}
+
+    store = client.presence_store
+    if store is not None:
+        with store._lock:
+            activities = list(store._activities.values())
+            size = sys.getsizeof(store._ids) + \
+                sys.getsizeof(store._status) + \
+                sizeof(store._pending) + \
+                sys.getsizeof(store._activities)
+            count = store._get_count()
+        size += estimate(activities, sample_size)[1]
+        types['presences'] = {"count": count, "bytes": size}
+
+    return {
+        "types": types,
+        "guilds": per_guild,
+        "bytes": sum(
+            stats['bytes'] for kind, stats in types.items()
+            if kind != "users"
+        )
+    }
+
+
+class CacheStatsReporter:
+    """Periodically reports the guilds taking up the most of the cache.
+
+    Enable it with client.set_cache_stats_reporter method.
+
+    Attributes:
+        interval:
+            Seconds between reports.
+        top:
+            Amount of the largest guilds to be reported.
+        sample_size:
+            Amount of entities of each kind to be measured, passed to
+            get_cache_stats.
+        callback:
+            Function to be called with the stats dict and the list of top
+            (guild_id, guild_stats) tuples. None to log them instead.
+    """
+    def __init__(self, interval=300, top=10, sample_size=100,
+                 callback=None):
+        self.interval = interval
+        self.top = top
+        self.sample_size = sample_size
+        self.callback = callback
+        self.client = None
+        self.report_thread = None
+
+    def set_client(self, client):
+        from .gateway import DiscordGateway
+        if not isinstance(client, DiscordGateway):
+            raise TypeError("client should be DiscordGateway, "
+                            f"not '{type(client)}'")
+        self.client = client
+
+    def start(self):
+        """Starts the thread reporting every .interval seconds."""
+        if self.report_thread is not None:
+            return
+
+        self.report_thread = StoppableThread(
+            target=self._report_loop,
+            name=f"{self.client.name}_cachestats"
+        )
+        self.report_thread.daemon = True
+        self.report_thread.start()
+
+    def stop(self):
+        if self.report_thread is not None:
+            self.report_thread.stop()
+            self.report_thread = None
+
+    def _report_loop(self):
+        stop_flag = self.report_thread.stop_flag
+        while not stop_flag.wait(self.interval):
+            try:
+                self.report()
+            except Exception:
+                logger.exception("Failed to report cache stats.")
+
+    def report(self):
+        stats = get_cache_stats(self.client, self.sample_size)
+        top = sorted(
+            stats['guilds'].items(),
+            key=lambda item: item[1]['bytes'],
+            reverse=True
+        )[:self.top]
+
+        if self.callback is not None:
+            self.callback(stats, top)
+            return
+
+        logger.info(f"Cache is using approximately {stats['bytes']} bytes.")
+        for guild_id, guild in top:
+            logger.info(
+                f"Guild '{guild['name']}' ({guild_id}): {guild['bytes']} "
+                f"bytes, {guild['channels']} channels, "
+                f"{guild['members']} members"
+            )
@@ -22,12 +22,18 @@ from .file import File
 from .user import User
 from .const import LIB_NAME
 from .message import Message
-from .util import clear_postdata, get_formdata
+from .util import clear_postdata, collect_files, get_attachments, \
+    get_files_formdata
 from .dictobject import DictObject
+from .paginator import Paginator
+from .bufferedsender import BufferedSender
+from .bulk import BulkOperation, BULK_DELETE_MAX, is_bulk_deletable, \
+    split_bulk_delete
 from .const import EMPTY, VOICE_VER
 from .voice import DiscordVoiceClient
 
 import json
+import time
 import base64
 import logging
 from queue import Queue
@@ -99,7 +105,7 @@ class Channel(DictObject):
             "PATCH", "", postdata
         )
 
-        self.__init__(self.client, channel_obj)
+        self._update(channel_obj)
 
         return self
 
@@ -128,7 +134,50 @@ class Channel(DictObject):
 
         return [Message(self.client, message) for message in messages]
 
+    def history(self, limit=None, before=EMPTY, after=EMPTY, prefetch=True):
+        """Returns iterator going through messages in the channel.
+
+        Messages are fetched lazily, 100 messages per request, with the next
+        page being fetched in the background while the current one is being
+        processed.
+
+        Messages are yielded from the newest one, or from the oldest one if
+        only after is given. If both are given, messages between them are
+        yielded from the newest one.
+        """
+        if isinstance(before, Message):
+            before = before.id
+        if isinstance(after, Message):
+            after = after.id
+
+        if after is not EMPTY and before is EMPTY:
+            def fetch(cursor, count):
+                messages = self.get_messages(limit=count, after=cursor)
+                messages.sort(key=lambda message: int(message.id))
+                cursor = messages[-1].id if messages else None
+                return messages, cursor
+
+            return iter(Paginator(fetch, 100, limit, after, prefetch))
+
+        def fetch(cursor, count):
+            messages = self.get_messages(limit=count, before=cursor)
+            messages.sort(key=lambda message: int(message.id), reverse=True)
+            cursor = messages[-1].id if messages else None
+            if after is not EMPTY:
+                messages = [
+                    message for message in messages
+                    if int(message.id) > int(after)
+                ]
+            return messages, cursor
+
+        return iter(Paginator(fetch, 100, limit, before, prefetch))
+
     def get_message(self, id_):
+        """Returns the message, served from the message cache if possible."""
+        cached = self.client.get_cached_message(id_)
+        if cached is not None:
+            return cached
+
         message = self._send_request(
             "GET", f"/messages/{id_}"
         )
@@ -137,7 +186,7 @@ class Channel(DictObject):
 
     def send(self, content=EMPTY, tts=EMPTY, file=None, embeds=EMPTY,
              allowed_mentions=EMPTY, reply_to=None,
-             components=EMPTY):
+             components=EMPTY, files=None):
         if reply_to is not None:
             if isinstance(reply_to, Message):
                 reply_to = reply_to.id
@@ -163,14 +212,10 @@ class Channel(DictObject):
         }
         postdata = clear_postdata(postdata)
 
-        if file is not None:
-            if not isinstance(file, File):
-                raise ValueError(f"file should be File, not {type(file)}")
-
-            content_type, formdata = get_formdata({
-                "file": file,
-                "payload_json": postdata
-            })
+        files = collect_files(file, files)
+        if files:
+            postdata['attachments'] = get_attachments(files)
+            content_type, formdata = get_files_formdata(postdata, files)
 
             headers = {"Content-Type": content_type}
 
@@ -184,17 +229,33 @@ class Channel(DictObject):
 
         return Message(self.client, message)
 
+    def get_buffered_sender(self, window=0.5, separator="\n"):
+        """Returns BufferedSender of the channel, creating one if needed.
+
+        The same sender is returned for the channel until the client stops,
+        so that every caller's sends get merged together. window and
+        separator are only used when the sender gets created.
+        """
+        senders = self.client.buffered_senders
+        sender = senders.get(self.id)
+        if sender is None:
+            sender = senders.setdefault(
+                self.id, BufferedSender(self, window, separator))
+        return sender
+
     def edit_message(self, message, content=EMPTY, file=None, embeds=EMPTY,
                      flags=EMPTY, allowed_mentions=EMPTY, attachments=EMPTY,
-                     components=EMPTY):
-        # TODO: implement multipart/form-data
+                     components=EMPTY, files=None):
+        """Edits the message.
 
+        Files in file and files are uploaded as new attachments. Existing
+        attachments not in attachments get removed if attachments is given.
+        """
         if isinstance(message, Message):
             message = message.id
 
         postdata = {
             "content": content,
-            "file": file,
             "embeds": embeds,
             "flags": flags,
             "allowed_mentions": allowed_mentions,
@@ -203,14 +264,10 @@ class Channel(DictObject):
         }
         postdata = clear_postdata(postdata)
 
-        if file is not None:
-            if not isinstance(file, File):
-                raise ValueError(f"file should be File, not {type(file)}")
-
-            content_type, formdata = get_formdata({
-                "file": file,
-                "payload_json": postdata
-            })
+        files = collect_files(file, files)
+        if files:
+            postdata['attachments'] = get_attachments(files, attachments)
+            content_type, formdata = get_files_formdata(postdata, files)
 
             headers = {"Content-Type": content_type}
 
@@ -233,8 +290,22 @@ class Channel(DictObject):
         )
 
     def delete_messages(self, messages):
+        """Deletes the messages in as few requests as possible.
+
+        Messages are bulk deleted 100 at a time. Messages older than 2 weeks
+        that can't be bulk deleted, and a single message left over, are
+        deleted one by one.
+        """
         messages = [message.id if isinstance(message, Message) else message
                     for message in messages]
+        batches, singles = split_bulk_delete(messages)
+
+        for batch in batches:
+            self._bulk_delete(batch)
+        for message in singles:
+            self.delete_message(message)
+
+    def _bulk_delete(self, messages):
         postdata = {
             "messages": messages
         }
@@ -243,6 +314,57 @@ class Channel(DictObject):
             "POST", "/messages/bulk-delete", postdata
         )
 
+    def purge(self, check=None, limit=None, before=EMPTY, after=EMPTY,
+              progress=None):
+        """Deletes messages in the channel for which check returns True.
+
+        Messages are streamed from .history, and deleted while the rest are
+        still being fetched. Bulk deletes and single deletes of the messages
+        older than 2 weeks use different rate limits, so they run in
+        parallel.
+
+        Args:
+            check:
+                function receiving Message, returning whether to delete it.
+                None to delete every message.
+            limit:
+                Maximum amount of messages to go through, not to delete.
+            before, after:
+                Same as .history.
+            progress:
+                function called with BulkOperation whenever a request is
+                done, to report the progress.
+
+        Returns:
+            BulkOperation holding the amount of deleted messages, failures,
+            and the throughput.
+        """
+        operation = BulkOperation(progress)
+        batch = []
+        now = time.time()
+
+        for message in self.history(limit, before, after):
+            if check is not None and not check(message):
+                continue
+
+            if not is_bulk_deletable(message.id, now):
+                operation.submit("single", self.delete_message, message.id)
+                continue
+
+            batch.append(message.id)
+            if len(batch) == BULK_DELETE_MAX:
+                operation.submit(
+                    "bulk", self._bulk_delete, batch, count=len(batch))
+                batch = []
+
+        if len(batch) > 1:
+            operation.submit(
+                "bulk", self._bulk_delete, batch, count=len(batch))
+        elif batch:
+            operation.submit("single", self.delete_message, batch[0])
+
+        return operation.wait()
+
     def typing(self):
         self._send_request(
             "POST", "/typing"
@@ -332,6 +454,24 @@ class Channel(DictObject):
 
         return [User(self.client, user) for user in users]
 
+    def iter_reactions(self, message, emoji, limit=None, after=EMPTY,
+                       urlencoded=False, prefetch=True):
+        """Returns iterator going through users who reacted with the emoji.
+
+        Users are fetched lazily, 100 users per request, with the next page
+        being fetched in the background. Refer to .history for details.
+        """
+        if not urlencoded:
+            emoji = urlencode(emoji)
+
+        def fetch(cursor, count):
+            users = self.get_reactions(message, emoji, count, cursor, True)
+            cursor = max(users, key=lambda user: int(user.id)).id \
+                if users else None
+            return users, cursor
+
+        return iter(Paginator(fetch, 100, limit, after, prefetch))
+
     def delete_all_reactions(self, message):
         if isinstance(message, Message):
             message = message.id
@@ -365,6 +505,14 @@ class DMChannel(Channel):
         super(DMChannel, self).__init__(client, data)
         self.recipients = [User(client, user) for user in self.recipients]
 
+    def _update(self, data):
+        changed = super(DMChannel, self)._update(data)
+        if "recipients" in changed:
+            self.recipients = [
+                User(self.client, user) for user in self.recipients
+            ]
+        return changed
+
 
 class GroupDMChannel(DMChannel):
     def modify(self, name=EMPTY, icon=None):
@@ -497,6 +645,30 @@ class GuildVoiceChannel(GuildChannel):
 
         return super(GuildVoiceChannel, self).modify(postdata)
 
+    def get_voice_members(self):
+        """Returns frozenset of ids of users connected to this channel."""
+        return self.get_guild().get_voice_members(self.id)
+
+    def get_voice_member_count(self):
+        return self.get_guild().get_voice_member_count(self.id)
+
+    def is_bot_alone(self):
+        """Returns whether the bot is the only one left in this channel."""
+        return self.get_guild().is_voice_alone(self.id, self.client.user.id)
+
+    def set_auto_leave(self, delay=0):
+        """Makes the bot leave the guild's voice channel once it's alone.
+
+        The bot leaves after staying alone in the channel for delay seconds,
+        and the timer gets cancelled if somebody joins in the meantime. Pass
+        None to disable it. This setting applies to the whole guild, as a
+        bot can only be in one voice channel per guild.
+        """
+        if delay is None:
+            self.client.auto_leave.pop(self.guild_id, None)
+        else:
+            self.client.auto_leave[self.guild_id] = delay
+
     def connect(self, mute=False, deaf=False):
         """Connects the bot to the voice channel.
 
@@ -24,42 +24,26 @@ from .guild import Guild
 from .channel import Channel
 from .gateway import DiscordGateway
 from .util import EMPTY, clear_postdata
-from .ratelimit import RateLimitHandler
-from .exceptions import DiscordHTTPError
+from .httpclient import HTTPClient
 from .channel import get_channel as _get_channel
-from .const import API_URL, LIB_NAME, LIB_VER, LIB_URL
+from .const import LIB_NAME, LIB_VER, LIB_URL
 
-import json
 import time
 import base64
 import logging
-from urllib.parse import urljoin
-from urllib.error import HTTPError
-from urllib.request import Request, urlopen
 
 __all__ = ["DiscordClient"]
 
 logger = logging.getLogger(LIB_NAME)
 
 
-def construct_url(baseurl, endpoint):
-    if endpoint.startswith("/"):
-        endpoint = endpoint[1:]
-
-    return urljoin(baseurl, endpoint)
-
-
-class DiscordClient(DiscordGateway):
+class DiscordClient(DiscordGateway, HTTPClient):
     """Class which handles sending events to Discord.
 
     Attributes:
-        headers:
-            Headers to be used when sending HTTP request.
         _activities:
             Activity objects used when sending UPDATE_PRESENCE event- This
             attribute is required as changing status resets the activities.
-        ratelimit_handler:
-            handler used to handle rate limit accordingly.
     """
     def __init__(self, token, handler=None, event_parser=None, intents=32509,
                  name="main"):
@@ -70,38 +54,45 @@ class DiscordClient(DiscordGateway):
             intents=intents,
             name=name)
 
-        self.headers = {
+        HTTPClient.__init__(self, {
             "User-Agent": f"{LIB_NAME} ({LIB_URL}, {LIB_VER})",
             "Authorization": f"Bot {self.token}",
-            "Content-Type": "application/json"
-        }
+            "Content-Type": "application/json",
+            "Accept-Encoding": "gzip, deflate"
+        })
         self._activities = ()
-        self.ratelimit_handler = RateLimitHandler()
+        # BufferedSender of the channels, by channel id
+        self.buffered_senders = {}
+
+    def stop(self, status=1000):
+        # Sends what's left in the buffers before going down
+        for sender in list(self.buffered_senders.values()):
+            sender.close()
+        self.buffered_senders.clear()
+
+        super(DiscordClient, self).stop(status)
 
     def get_guilds(self):
-        return self.guilds.copy()
+        """Returns a read-only snapshot of the guilds, safe to iterate."""
+        return self.guilds.snapshot()
 
     def get_guild(self, id_):
-        return self.get_guilds().get(id_)
+        return self.guilds.get(id_)
 
     def get_channels(self):
-        return {
-            x: y for guild in self.get_guilds().values()
-            for x, y in guild.get_channels().items()
-        }
+        return self.channels.snapshot()
 
     def get_channel(self, id_):
-        return self.get_channels().get(id_)
+        return self.channels.get(id_)
 
     def get_users(self):
-        return {
-            x: y.user for guild in self.get_guilds().values()
-            for x, y in guild.get_members().items()
-            if guild.get_members() is not None
-        }
+        return self.users.snapshot()
 
     def get_user(self, id_):
-        return self.get_users().get(id_)
+        return self.users.get(id_)
+
+    def get_member(self, guild_id, user_id):
+        return self.members.get((guild_id, user_id))
 
     def update_presence(self, activities=None, status=None, afk=False,
                         since=None):
@@ -243,130 +234,3 @@ class DiscordClient(DiscordGateway):
         )
 
         return preview
-
-    def send_request(self, method, route, data=None, expected_code=None,
-                     raise_at_exc=True, baseurl=API_URL, headers=None):
-        """Sends HTTP API request.
-
-        It sends the request, parses result data, checks ratelimit, and returns
-        result data in JSON format.
-
-        Args:
-            method:
-                HTTP method to use- e.g. GET, POST, DELETE, etc...
-            route:
-                API subdirectory to send request to. e.g. /channels/id
-            data:
-                POST data to send to, as a dictionary, refer to urllib.request
-                for details.
-            expected_code:
-                HTTP return code to check for. If this code mismatches and
-                raise_at_exc is true, This will raise DiscordHTTPError.
-            raise_at_exc:
-                Whether or not to throw exception when urllib.request raises
-                HTTPError or return code is not what we were expecting.
-                If this is true, DiscordHTTPError will be raised.
-            baseurl:
-                Base URL to construct full URL with. Defaluts to Discord API
-                endpoint.
-            headers:
-                Headers to use when sending requests. It contains User-Agent,
-                Autorization, Content-Type by default. Should be used if
-                Content-Type is not application/json .
-
-        Returns:
-            Dict made out of JSON object returned from API.
-
-        Raises:
-            DiscordHTTPError:
-                Raised when HTTPError is raised, or unexpected code is returned
-        """
-        if baseurl is None:
-            baseurl = API_URL
-
-        self.ratelimit_handler.check(route)
-        
-        res, exc = self._send_request(method, route, data, baseurl, headers)
-
-        try:
-            code = res.status
-        except AttributeError:
-            code = res.getstatus()
-
-        rawdata = res.read()
-        if not rawdata:
-            resdata = None
-        else:
-            resdata = json.loads(rawdata)
-        
-        logger.debug(f"Received from HTTP API: {resdata}")
-        logger.debug(f"HTTP Header: {res.headers}")
-
-        if code == 429:
-            limit = time.time() + resdata['retry_after']
-            _route = "global" if resdata['global'] else route
-            self.ratelimit_handler.set_limit(_route, limit)
-
-            return self.send_request(method, route, data, expected_code,
-                                     raise_at_exc, baseurl, headers)
-
-        bucket = res.headers.get("X-RateLimit-Bucket")
-        if bucket is not None and\
-                not self.ratelimit_handler.is_in_bucket_map(route):
-            self.ratelimit_handler.register_bucket(route, bucket)
-
-        if raise_at_exc and \
-                ((expected_code is not None and code != expected_code) or exc):
-            raise DiscordHTTPError(
-                resdata['code'], resdata['message'], res
-            )
-
-        return resdata
-
-    def _send_request(self, method, route, data=None, baseurl=API_URL,
-                      headers=None):
-        """Returns Response object directly.
-
-        Args:
-            method:
-                HTTP method to use- e.g. GET, POST, DELETE, etc...
-            route:
-                API subdirectory to send request to. e.g. /channels/id
-            data:
-                POST data to send to, as a dictionary, refer to urllib.request
-                for details.
-            baseurl:
-                Base URL to construct full URL with. Defaluts to Discord API
-                endpoint.
-            headers:
-                Headers to use when sending requests. It contains User-Agent,
-                Autorization, Content-Type by default. Should be used if
-                Content-Type is not application/json.
-
-        Returns:
-            A tuple of (Response, exc) where exc determines whether an
-            exception was occured or not.
-            If HTTPError was thrown, Response object would be a catched
-            exception, but there's no difference in its functionality.
-        """
-        url = construct_url(API_URL, route)
-
-        if isinstance(data, dict):
-            data = json.dumps(data)
-        if isinstance(data, str):
-            data = data.encode()
-
-        req_headers = self.headers.copy()
-        if headers is not None:
-            req_headers.update(headers)
-
-        req = Request(url, data, req_headers, method=method)
-
-        exc = False
-        try:
-            res = urlopen(req)
-        except HTTPError as e:
-            exc = True
-            res = e
-
-        return res, exc
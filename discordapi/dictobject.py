@@ -18,6 +18,9 @@
 #    along with this program.  If not, see <https://www.gnu.org/licenses/>.
 #
 
+import copy
+import weakref
+
 __all__ = ["DictObject"]
 
 
@@ -38,7 +41,8 @@ class DictObject:
         initialized instance.
         """
         self._json = data
-        
+        self._keylist = keylist
+
         for key in keylist:
             value = data.get(key)
             if value is not None:
@@ -46,6 +50,43 @@ class DictObject:
             elif getattr(self, key, None) is None:
                 setattr(self, key, None)
 
+    def _update(self, data):
+        """Merges fields in data that differ from the current ones in place.
+
+        Unlike running __init__ again, fields missing in data are kept as is
+        and nested DictObjects are updated rather than reconstructed. Nested
+        objects are copied before being modified, so a shallow copy of this
+        object taken before the update keeps seeing the previous values.
+
+        Returns:
+            dict of {key: previous value} for every field that has changed.
+        """
+        changed = {}
+        json_data = None
+
+        for key in self._keylist:
+            if key not in data:
+                continue
+            value = data[key]
+            if self._json.get(key) == value:
+                continue
+
+            if json_data is None:
+                json_data = self._json.copy()
+            json_data[key] = value
+
+            prev = getattr(self, key, None)
+            if isinstance(prev, DictObject) and isinstance(value, dict):
+                value = copy.copy(prev)
+                value._update(data[key])
+            changed[key] = prev
+            setattr(self, key, value)
+
+        if json_data is not None:
+            self._json = json_data
+
+        return changed
+
     def _get_str(self, class_, id_, repr=None):
         if repr is not None:
             return f"<{class_} '{repr}' ({id_})>"
@@ -65,3 +106,55 @@ class DictObject:
             return self.id == other.id
         else:
             return False
+
+
+class WeakLink:
+    __slots__ = ("ref", "id")
+
+    def __init__(self, obj):
+        self.ref = weakref.ref(obj)
+        self.id = obj.id
+
+
+class EntityLink:
+    """Descriptor for references to other cached entities, such as .guild.
+
+    The referenced object is stored as is by default. When the client has
+    weak_references set, only a weak reference to it is stored along with
+    its id, and once the object is gone it's looked up again by the id-
+    so that an object kept around by the user doesn't keep whole guild
+    alive after it has been removed from the cache.
+
+    Attributes:
+        lookup:
+            function receiving client and id, returning the entity from the
+            cache or None if there isn't one.
+    """
+    def __init__(self, lookup):
+        self.lookup = lookup
+        self.name = None
+
+    def __set_name__(self, owner, name):
+        self.name = name
+
+    def __get__(self, obj, owner=None):
+        if obj is None:
+            return self
+
+        value = obj.__dict__.get(self.name)
+        if not isinstance(value, WeakLink):
+            return value
+
+        target = value.ref()
+        if target is None:
+            target = self.lookup(obj.client, value.id) or None
+            if target is not None:
+                obj.__dict__[self.name] = WeakLink(target)
+
+        return target
+
+    def __set__(self, obj, value):
+        client = obj.__dict__.get("client")
+        if value and getattr(client, "weak_references", False):
+            value = WeakLink(value)
+        obj.__dict__[self.name] = value
@@ -18,7 +18,8 @@
 #    along with this program.  If not, see <https://www.gnu.org/licenses/>.
 #
 
-__all__ = ["DiscordError", "DiscordHTTPError"]
+__all__ = ["DiscordError", "DiscordHTTPError", "DiscordRequestError",
+           "DiscordCircuitOpenError"]
 
 
 class DiscordError(Exception):
@@ -45,3 +46,29 @@ class DiscordHTTPError(DiscordError):
         self.response = response
 
         self.args = (f"{code}: {message}",)
+
+
+class DiscordRequestError(DiscordError):
+    """Exception to be thrown when a request couldn't get a response.
+
+    e.g. the connection failed or timed out on every attempt, or the
+    deadline of the request has passed.
+
+    Attributes:
+        route:
+            Template of the route the request was sent to, with ids and
+            tokens replaced.
+        attempts:
+            Amount of times the request has been sent.
+    """
+    def __init__(self, message, route, attempts):
+        super(DiscordRequestError, self).__init__(message)
+        self.route = route
+        self.attempts = attempts
+
+
+class DiscordCircuitOpenError(DiscordRequestError):
+    """Exception to be thrown when a request is refused without being sent,
+    as the recent requests to the route have kept failing.
+    """
+    pass
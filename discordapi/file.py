@@ -19,7 +19,7 @@
 #
 
 from io import BytesIO
-from os.path import split, abspath, exists, isdir
+from os.path import split, abspath, exists, isdir, getsize
 
 __all__ = ["File"]
 
@@ -188,6 +188,14 @@ class File:
     def get_name(self):
         return self.name
 
+    def get_size(self):
+        """Returns size of the file content in bytes, without reading it."""
+        if self.path is not None:
+            return getsize(self.path)
+        elif self.fileobj is not None:
+            return self.fileobj.getbuffer().nbytes
+        raise RuntimeError("Class has not been initialized properly.")
+
     def read(self, *args, **kwargs):
         self._prep_read()
 
@@ -19,18 +19,28 @@
 #
 
 from .guild import Guild
+from .cache import CacheDict
 from .user import BotUser
 from .member import Member
 from .message import Message
+from .snapshot import CacheSnapshot
+from .responsecache import get_invalidated_paths
+from .cachestats import CacheStatsReporter, get_cache_stats
+from .presence import PresenceStore
+from .cachebackend import CacheBackend
+from .messagecache import MessageCache
+from .permission import PermissionResolver
+from .memberpolicy import MemberCachePolicy, CacheAllMembers
 from .channel import get_channel, GuildVoiceChannel
 from .websocket import WebSocketThread
 from .const import LIB_NAME, GATEWAY_URL
 from .handler import EventHandler, GeneratorEventHandler
 
 import sys
+import copy
 import time
 import logging
-from threading import Event
+from threading import Event, Timer
 from websocket import STATUS_ABNORMAL_CLOSED
 
 __all__ = []
@@ -71,6 +81,7 @@ class DiscordGateway(WebSocketThread):
 
         self.set_handler(handler)
         self.event_parser = event_parser(self)
+        self.set_member_cache_policy(CacheAllMembers)
 
         self.token = token
         self.intents = intents
@@ -82,21 +93,215 @@ class DiscordGateway(WebSocketThread):
         self.is_reconnect = False
         self.voice_queue = {}
         self.voice_clients = {}
+        self.chunk_queue = {}
+        self.auto_leave = {}
+        self._auto_leave_timers = {}
+        self.message_cache = None
+        self.presence_store = None
+        self.cache_snapshot = None
+        self.cache_backend = None
+        self.cache_stats_reporter = None
+        # ResponseCache of DiscordClient, invalidated by the gateway events
+        self.response_cache = None
+        self.permission_resolver = PermissionResolver()
+        # Whether *_UPDATE events should be handled as (before, after) tuple
+        self.emit_update_pairs = False
+        # Whether messages and members should refer to their guild and
+        # channel weakly, so that they don't keep removed guilds alive
+        self.weak_references = False
 
         self.user = None
         self.guilds = None
         self.session_id = None
         self.application = None
 
+        # Global indexes maintained by GatewayEventParser, so that looking up
+        # an entity by its id doesn't require scanning every guild.
+        self.channels = CacheDict()
+        self.users = CacheDict()
+        self.members = CacheDict()
+        self._user_refs = {}
+
     def set_ready(
             self, user=None, guilds=None, session_id=None, application=None):
         if None not in [user, guilds, session_id, application]:
+            # Guilds we already have, e.g. from the cache snapshot, are kept
+            # to be served until their GUILD_CREATE arrives.
+            prev = self.guilds if self.guilds is not None else {}
+
             self.user = BotUser(self, user)
-            self.guilds = {obj['id']: False for obj in guilds}
+            self.guilds = CacheDict({
+                obj['id']: prev.get(obj['id']) or False for obj in guilds
+            })
             self.session_id = session_id
             self.application = application
+
+            self.channels.clear()
+            self.users.clear()
+            self.members.clear()
+            self._user_refs.clear()
+            for guild in self.guilds.values():
+                if guild:
+                    self._index_guild(guild)
         self.ready_to_run.set()
 
+    def set_cache_backend(self, backend):
+        """Sets CacheBackend to write the cache through, None to disable."""
+        if backend is None or isinstance(backend, CacheBackend):
+            self.cache_backend = backend
+        elif issubclass(backend, CacheBackend):
+            self.cache_backend = backend()
+        else:
+            raise TypeError("Inappropriate CacheBackend object.")
+
+    # Failures of the backend are only logged, so that a remote cache
+    # going down doesn't leave the local one half updated.
+    def _backend_set(self, key, value):
+        if self.cache_backend is not None:
+            try:
+                self.cache_backend.set(key, value)
+            except Exception:
+                logger.exception(f"Failed to set {key} in cache backend.")
+
+    def _backend_delete(self, key):
+        if self.cache_backend is not None:
+            try:
+                self.cache_backend.delete(key)
+            except Exception:
+                logger.exception(f"Failed to delete {key} in cache backend.")
+
+    def _backend_set_guild(self, guild):
+        if self.cache_backend is None:
+            return
+        data = {
+            key: value for key, value in guild._json.items()
+            if key not in ("channels", "members", "voice_states",
+                           "presences", "threads")
+        }
+        data['roles'] = guild.roles
+        data['emojis'] = guild.emojis
+        self._backend_set(f"guild:{guild.id}", data)
+
+    def set_cache_snapshot(self, snapshot, load=True):
+        """Sets CacheSnapshot to persist the cache to.
+
+        The snapshot gets loaded into the cache right away if load is True,
+        and saved when the client stops.
+        """
+        if not isinstance(snapshot, CacheSnapshot):
+            raise TypeError("snapshot should be CacheSnapshot, "
+                            f"not '{type(snapshot)}'")
+        if self.cache_snapshot is not None:
+            self.cache_snapshot.stop()
+
+        self.cache_snapshot = snapshot
+        snapshot.set_client(self)
+
+        if load:
+            snapshot.load()
+        snapshot.start()
+
+    def set_cache_stats_reporter(self, reporter):
+        """Starts CacheStatsReporter, or stops the current one if None."""
+        if self.cache_stats_reporter is not None:
+            self.cache_stats_reporter.stop()
+        if reporter is None:
+            self.cache_stats_reporter = None
+            return
+        elif isinstance(reporter, CacheStatsReporter):
+            self.cache_stats_reporter = reporter
+        elif issubclass(reporter, CacheStatsReporter):
+            self.cache_stats_reporter = reporter()
+        else:
+            raise TypeError("Inappropriate CacheStatsReporter object.")
+
+        self.cache_stats_reporter.set_client(self)
+        self.cache_stats_reporter.start()
+
+    def cache_stats(self, sample_size=100):
+        """Returns entity counts and approximate memory usage of the cache.
+
+        See cachestats.get_cache_stats for the format.
+        """
+        return get_cache_stats(self, sample_size)
+
+    def _index_guild(self, guild):
+        """Adds channels and members of the guild to the global indexes."""
+        self._backend_set_guild(guild)
+        for user_id, channel in guild.voice_state.items():
+            if channel is not None:
+                self._backend_set(
+                    f"voice_state:{guild.id}:{user_id}", channel.id)
+        if guild.channels is not None:
+            for channel in guild.channels.values():
+                self._index_channel(channel)
+        if guild.members is not None:
+            for member in guild.members.values():
+                self._index_member(guild.id, member)
+
+    def _unindex_guild(self, guild):
+        """Removes channels and members of the guild from the indexes."""
+        for user_id in guild.voice_state:
+            self._backend_delete(f"voice_state:{guild.id}:{user_id}")
+        if guild.channels is not None:
+            for id_ in guild.channels:
+                self._unindex_channel(id_)
+        if guild.members is not None:
+            for user_id in guild.members:
+                self._unindex_member(guild.id, user_id)
+
+    def _cache_member(self, guild, member):
+        """Stores member in the guild and the index."""
+        if guild.members is None:
+            guild.members = CacheDict()
+        guild.members[member.user.id] = member
+        self._index_member(guild.id, member)
+
+    def _uncache_member(self, guild, user_id):
+        """Removes member from the guild and the index."""
+        self.permission_resolver.invalidate_member(guild.id, user_id)
+        if guild.members is not None:
+            guild.members.pop(user_id, None)
+        self._unindex_member(guild.id, user_id)
+        self.member_cache_policy.forget(guild, user_id)
+
+    def _index_channel(self, channel):
+        self.channels[channel.id] = channel
+        self._backend_set(f"channel:{channel.id}", channel._json)
+
+    def _unindex_channel(self, id_):
+        self.channels.pop(id_, None)
+        self._backend_delete(f"channel:{id_}")
+
+    def _index_member(self, guild_id, member):
+        """Indexes member by (guild_id, user_id), and its user by user_id.
+
+        Users are reference counted per guild they're in, so that a user
+        stays in the index until it leaves every guild we know of.
+        """
+        if member.user is None:
+            return
+        user_id = member.user.id
+        key = (guild_id, user_id)
+
+        if key not in self.members:
+            self._user_refs[user_id] = self._user_refs.get(user_id, 0) + 1
+        self.members[key] = member
+        self.users[user_id] = member.user
+        self._backend_set(f"member:{guild_id}:{user_id}", member._json)
+
+    def _unindex_member(self, guild_id, user_id):
+        if self.members.pop((guild_id, user_id), None) is None:
+            return
+        self._backend_delete(f"member:{guild_id}:{user_id}")
+
+        refs = self._user_refs.get(user_id, 1) - 1
+        if refs > 0:
+            self._user_refs[user_id] = refs
+        else:
+            self._user_refs.pop(user_id, None)
+            self.users.pop(user_id, None)
+
     def add_voice_queue(self, guild_id, event, payload):
         # Puts data into voice_queue so that GuildVoiceChannel.connect
         # method can start a voice session
@@ -105,6 +310,92 @@ class DiscordGateway(WebSocketThread):
 
         self.voice_queue[guild_id].put((event, payload))
 
+    def set_message_cache(self, cache):
+        """Enables message cache, or disables it if cache is None."""
+        if cache is None or isinstance(cache, MessageCache):
+            self.message_cache = cache
+        elif issubclass(cache, MessageCache):
+            self.message_cache = cache()
+        else:
+            raise TypeError("Inappropriate MessageCache object.")
+
+    def set_presence_store(self, store):
+        """Enables presence store, or disables it if store is None.
+
+        GUILD_PRESENCES intent (1 << 8) is required for the store to receive
+        presences, which isn't included in the default intents.
+        """
+        if store is None or isinstance(store, PresenceStore):
+            self.presence_store = store
+        elif issubclass(store, PresenceStore):
+            self.presence_store = store()
+        else:
+            raise TypeError("Inappropriate PresenceStore object.")
+
+    def set_member_cache_policy(self, policy):
+        """Sets MemberCachePolicy deciding which members to be cached."""
+        if isinstance(policy, MemberCachePolicy):
+            self.member_cache_policy = policy
+        elif issubclass(policy, MemberCachePolicy):
+            self.member_cache_policy = policy()
+        else:
+            raise TypeError("Inappropriate MemberCachePolicy object.")
+
+        self.member_cache_policy.set_client(self)
+
+    def add_chunk_queue(self, nonce, payload):
+        # Puts data into chunk_queue so that Guild.fetch_members method can
+        # receive chunks requested with the nonce
+        queue = self.chunk_queue.get(nonce)
+        if queue is None:
+            return
+
+        queue.put(payload)
+
+    def get_cached_message(self, id_):
+        """Returns message from the message cache, or None if not found."""
+        if self.message_cache is None:
+            return None
+        return self.message_cache.get(id_)
+
+    def _check_auto_leave(self, guild):
+        """Schedules leaving the voice channel if the bot is alone in it.
+
+        A timer already running for the channel is kept as long as the bot
+        stays alone in there, so that changes in the other channels don't
+        restart the countdown.
+        """
+        delay = self.auto_leave.get(guild.id)
+        channel = guild.voice_state.get(self.user.id)
+        alone = delay is not None and channel is not None and \
+            guild.is_voice_alone(channel.id, self.user.id)
+
+        timer = self._auto_leave_timers.get(guild.id)
+        if timer is not None:
+            if alone and timer.args[1] == channel.id:
+                return
+            timer.cancel()
+            self._auto_leave_timers.pop(guild.id, None)
+        if not alone:
+            return
+
+        timer = Timer(delay, self._auto_leave, (guild, channel.id))
+        timer.daemon = True
+        self._auto_leave_timers[guild.id] = timer
+        timer.start()
+
+    def _auto_leave(self, guild, channel_id):
+        self._auto_leave_timers.pop(guild.id, None)
+        if not guild.is_voice_alone(channel_id, self.user.id):
+            return
+
+        logger.info(f"Leaving voice channel {channel_id} as it's empty.")
+        voice_client = self.voice_clients.get(guild.id)
+        if voice_client is not None:
+            voice_client.disconnect()
+        else:
+            self.update_voice_state(guild.id, None)
+
     def set_handler(self, handler):
         if isinstance(handler, EventHandler):
             self.handler = handler
@@ -201,6 +492,18 @@ class DiscordGateway(WebSocketThread):
             "d": data if d is None else d
         }
 
+    def stop(self, status=1000):
+        if self.cache_stats_reporter is not None:
+            self.cache_stats_reporter.stop()
+        if self.cache_snapshot is not None:
+            self.cache_snapshot.stop()
+            try:
+                self.cache_snapshot.save()
+            except Exception:
+                logger.exception("Failed to save cache snapshot.")
+
+        super(DiscordGateway, self).stop(status)
+
     def cleanup(self):
         self.is_heartbeat_ready.clear()
 
@@ -216,7 +519,13 @@ class DiscordGateway(WebSocketThread):
 
         if op == self.DISPATCH:
             self.seq = seq
+            self.handler.handle_raw(event, payload)
             obj = self.event_parser._handle(event, payload)
+            if self.cache_backend is not None:
+                try:
+                    self.cache_backend.flush()
+                except Exception:
+                    logger.exception("Failed to flush cache backend.")
             self.handler.handle(event, obj)
 
         elif op == self.INVALID_SESSION or op == self.RECONNECT:
@@ -260,6 +569,10 @@ class GatewayEventParser:
         self.client = client
 
     def _handle(self, event, payload):
+        if self.client.response_cache is not None:
+            for path in get_invalidated_paths(event, payload):
+                self.client.response_cache.invalidate(path)
+
         name = "on_" + event.lower()
         handler = getattr(self, name, None)
         if handler is None:
@@ -273,6 +586,22 @@ class GatewayEventParser:
 
         return value
 
+    def _copy(self, obj):
+        """Returns shallow copy of obj to be used as the state before update.
+
+        Copy is only made when the client wants update pairs. Being a shallow
+        copy, containers such as Guild.members are shared with the updated
+        object.
+        """
+        if obj is None or not self.client.emit_update_pairs:
+            return None
+        return copy.copy(obj)
+
+    def _pair(self, before, after):
+        if self.client.emit_update_pairs:
+            return before, after
+        return after
+
     def on_ready(self, payload):
         self.client.set_ready(
             payload['user'],
@@ -286,7 +615,8 @@ class GatewayEventParser:
 
     def on_channel_create(self, payload):
         obj = get_channel(self.client, payload)
-        
+        self.client._index_channel(obj)
+
         guild_id = obj.guild_id
         if guild_id is None:
             return obj
@@ -299,11 +629,28 @@ class GatewayEventParser:
         return obj
 
     def on_channel_update(self, payload):
-        return self.on_channel_create(payload)
+        guild_id = payload.get("guild_id")
+        if guild_id is not None:
+            self.client.permission_resolver.invalidate_channel(
+                guild_id, payload['id'])
+
+        prev = self.client.channels.get(payload['id'])
+        if prev is None or prev.type != payload['type']:
+            return self._pair(None, self.on_channel_create(payload))
+
+        before = self._copy(prev)
+        prev._update(payload)
+        self.client._index_channel(prev)
+
+        return self._pair(before, prev)
 
     def on_channel_delete(self, payload):
         obj = get_channel(self.client, payload)
-        
+        self.client._unindex_channel(obj.id)
+        if obj.guild_id is not None:
+            self.client.permission_resolver.invalidate_channel(
+                obj.guild_id, obj.id)
+
         guild_id = obj.guild_id
         if guild_id is None:
             return obj
@@ -314,6 +661,9 @@ class GatewayEventParser:
         if guild.channels.get(id_) is not None:
             del guild.channels[id_]
 
+        if self.client.message_cache is not None:
+            self.client.message_cache.remove_channel(id_)
+
         return obj
 
     def on_channel_pins_update(self, payload):
@@ -327,15 +677,60 @@ class GatewayEventParser:
             channel.last_pin_timestamp = timestamp
 
     def on_guild_create(self, payload):
-        obj = Guild(self.client, payload)
-        self.client.guilds[obj.id] = obj
+        store = self.client.presence_store
+        if store is not None and "presences" in payload:
+            # Presences go to the store instead of being kept in the guild
+            for presence in payload.pop("presences"):
+                presence['guild_id'] = payload['id']
+                store.update(presence)
+
+        obj = self._merge_guild(payload)[1]
+        obj.stale = False
         return obj
 
     def on_guild_update(self, payload):
-        return self.on_guild_create(payload)
+        return self._pair(*self._merge_guild(payload))
+
+    def _merge_guild(self, payload):
+        """Creates guild, or merges payload into the cached one.
+
+        Returns:
+            tuple of (before, after), where before is None if the guild wasn't
+            cached or the client doesn't want update pairs.
+        """
+        self.client.permission_resolver.invalidate_guild(payload['id'])
+
+        prev = self.client.guilds.get(payload['id'])
+        if not prev:
+            obj = Guild(self.client, payload)
+            self.client.guilds[obj.id] = obj
+            self.client._index_guild(obj)
+            return None, obj
+
+        reindex = "channels" in payload or "members" in payload or \
+            "voice_states" in payload
+        before = self._copy(prev)
+
+        if reindex:
+            self.client._unindex_guild(prev)
+        prev._update(payload)
+        if reindex:
+            self.client._index_guild(prev)
+        else:
+            self.client._backend_set_guild(prev)
+
+        return before, prev
 
     def on_guild_delete(self, payload):
-        self.client.guilds[payload.get("id")] = False
+        id_ = payload.get("id")
+        self.client.permission_resolver.invalidate_guild(id_)
+        prev = self.client.guilds.get(id_)
+        if prev:
+            self.client._unindex_guild(prev)
+            self.client.member_cache_policy.forget_guild(prev)
+        self.client._backend_delete(f"guild:{id_}")
+
+        self.client.guilds[id_] = False
 
     def on_guild_ban_add(self, payload):
         guild = self.client.guilds.get(payload.get('guild_id'))
@@ -343,9 +738,7 @@ class GatewayEventParser:
             return
 
         user_id = payload.get("user").get("id")
-        member = guild.members.get(user_id)
-        if member is not None:
-            del guild.members[user_id]
+        self.client._uncache_member(guild, user_id)
 
     def on_guild_emojis_update(self, payload):
         guild = self.client.guilds.get(payload.get('guild_id'))
@@ -353,6 +746,7 @@ class GatewayEventParser:
             return
 
         guild.emojis = payload.get('emojis')
+        self.client._backend_set_guild(guild)
 
     def on_guild_member_add(self, payload):
         guild = self.client.guilds.get(payload.get('guild_id'))
@@ -362,7 +756,7 @@ class GatewayEventParser:
         del payload['guild_id']
         obj = Member(self.client, guild, payload)
 
-        guild.members.append(obj)
+        self.client.member_cache_policy.touch(guild, obj)
 
         return obj
 
@@ -371,7 +765,8 @@ class GatewayEventParser:
         if not guild:
             return
 
-        del guild.members[payload.get("user").get("id")]
+        user_id = payload.get("user").get("id")
+        self.client._uncache_member(guild, user_id)
 
     def on_guild_member_update(self, payload):
         guild = self.client.guilds.get(payload.get('guild_id'))
@@ -380,28 +775,80 @@ class GatewayEventParser:
 
         user_id = payload.get("user").get("id")
         del payload['guild_id']
-        member = guild.members.get(user_id)
-        member.__init__(self.client, guild, payload)
+        self.client.permission_resolver.invalidate_member(guild.id, user_id)
+        member = guild.members.get(user_id) if guild.members else None
+        if member is None:
+            before = None
+            member = Member(self.client, guild, payload)
+        else:
+            before = self._copy(member)
+            member._update(payload)
+            self.client._index_member(guild.id, member)
+
+        self.client.member_cache_policy.touch(guild, member)
+
+        return self._pair(before, member)
 
     def on_guild_members_chunk(self, payload):
         guild = self.client.guilds.get(payload.get('guild_id'))
         if not guild:
             return
 
-        memberobjs = payload.get("members")
-        members = {
-            member['user']['id']: Member(self.client, guild, member)
-            for member in memberobjs
-        }
-        guild.members.update(members)
+        policy = self.client.member_cache_policy
+        members = [
+            Member(self.client, guild, member)
+            for member in payload.get("members")
+        ]
+        for member in members:
+            if policy.check(guild, member.user.id):
+                self.client._cache_member(guild, member)
+
+        nonce = payload.get("nonce")
+        if nonce is not None:
+            self.client.add_chunk_queue(nonce, {
+                "members": members,
+                "chunk_index": payload.get("chunk_index"),
+                "chunk_count": payload.get("chunk_count"),
+                "not_found": payload.get("not_found", [])
+            })
 
     def on_message_create(self, payload):
         if payload.get("author") is None:
             return
-        return Message(self.client, payload)
+        obj = Message(self.client, payload)
+
+        if self.client.message_cache is not None:
+            self.client.message_cache.put(obj)
+
+        guild = getattr(obj, "guild", None)
+        if guild and obj.member is not None:
+            self.client.member_cache_policy.touch(guild, obj.member)
+
+        return obj
 
     def on_message_update(self, payload):
-        return self.on_message_create(payload)
+        cache = self.client.message_cache
+        before = None
+        if cache is not None:
+            before = self._copy(cache.peek(payload.get("id")))
+            obj = cache.update(payload)
+            if obj is not None:
+                return self._pair(before, obj)
+
+        obj = self.on_message_create(payload)
+        if obj is None:
+            return None
+
+        return self._pair(before, obj)
+
+    def on_message_delete(self, payload):
+        if self.client.message_cache is not None:
+            self.client.message_cache.remove(payload.get("id"))
+
+    def on_message_delete_bulk(self, payload):
+        if self.client.message_cache is not None:
+            for id_ in payload.get("ids", ()):
+                self.client.message_cache.remove(id_)
 
     def on_voice_server_update(self, payload, event="VOICE_SERVER_UPDATE"):
         guild_id = payload.get("guild_id")
@@ -412,19 +859,47 @@ class GatewayEventParser:
             self.on_voice_server_update(payload, "VOICE_STATE_UPDATE")
 
         if payload.get('guild_id') is not None:
-            guild = self.client.get_guild(payload['guild_id'])
+            guild = self.client.guilds.get(payload['guild_id'])
             channel_id = payload['channel_id']
             if channel_id is not None:
-                channel = guild.get_channel(channel_id)
+                channel = guild.channels.get(channel_id)
             else:
                 channel = None
 
-            guild.voice_state.update({
-                payload['member']['user']['id']: channel
-            })
+            user_id = payload['member']['user']['id']
+            guild._set_voice_state(user_id, channel)
+            self.client._check_auto_leave(guild)
+
+            key = f"voice_state:{guild.id}:{user_id}"
+            if channel_id is not None:
+                self.client._backend_set(key, channel_id)
+            else:
+                self.client._backend_delete(key)
+
+            member = Member(self.client, guild, payload['member'])
+            self.client.member_cache_policy.touch(guild, member)
 
     def on_presence_update(self, payload):
-        # Silencing frequent warning
-        pass
+        if self.client.presence_store is not None:
+            self.client.presence_store.update(payload)
+
+    def on_guild_role_create(self, payload):
+        guild = self.client.guilds.get(payload.get('guild_id'))
+        if not guild:
+            return
+
+        guild._set_role(payload['role'])
+        self.client.permission_resolver.invalidate_guild(guild.id)
+        self.client._backend_set_guild(guild)
+
+    def on_guild_role_update(self, payload):
+        return self.on_guild_role_create(payload)
+
+    def on_guild_role_delete(self, payload):
+        guild = self.client.guilds.get(payload.get('guild_id'))
+        if not guild:
+            return
 
-    # Add GUILD_ROLE event
+        guild._remove_role(payload['role_id'])
+        self.client.permission_resolver.invalidate_guild(guild.id)
+        self.client._backend_set_guild(guild)
@@ -21,13 +21,18 @@
 from .file import File
 from .user import User
 from .const import EMPTY
+from .cache import CacheDict
 from .member import Member
 from .channel import get_channel
 from .util import clear_postdata
 from .dictobject import DictObject
+from .paginator import Paginator
+from .bulk import BulkOperation, BULK_BAN_MAX
 from .exceptions import DiscordHTTPError
 
+import os
 import base64
+from queue import Queue, Empty
 
 __all__ = ["Guild"]
 
@@ -54,32 +59,262 @@ and thus I did not add further explanations about how things work.
 """
 
 
+class _VoiceMembers:
+    """Set of ids of users in a voice channel, updated in place.
+
+    Joins and leaves are O(1). The frozenset handed out by .freeze() is
+    built at most once per change and shared until the next one.
+    """
+    __slots__ = ("ids", "version", "_frozen")
+
+    def __init__(self):
+        self.ids = set()
+        self.version = 0
+        self._frozen = None
+
+    def add(self, user_id):
+        self.ids.add(user_id)
+        self.version += 1
+
+    def discard(self, user_id):
+        self.ids.discard(user_id)
+        self.version += 1
+
+    def freeze(self):
+        frozen = self._frozen
+        if frozen is not None and frozen[0] == self.version:
+            return frozen[1]
+
+        # Version is read first, so a change during the copy only makes
+        # the next call build it again
+        version = self.version
+        view = frozenset(self.ids)
+        self._frozen = (version, view)
+        return view
+
+    def __len__(self):
+        return len(self.ids)
+
+    def __contains__(self, user_id):
+        return user_id in self.ids
+
+
 class Guild(DictObject):
     def __init__(self, client, data):
         super(Guild, self).__init__(data, KEYLIST)
         self.client = client
+        # Set when loaded from CacheSnapshot and not yet seen on the gateway
+        self.stale = False
 
-        self.members = {
-            member['user']['id']: Member(client, self, member)
-            for member in self.members
-        } if self.members is not None else None
+        self.role_map = CacheDict({
+            role['id']: role for role in self.roles
+        }) if self.roles is not None else CacheDict()
 
-        self.channels = {
+        self.channels = CacheDict({
             channel['id']: get_channel(client, channel, self)
             for channel in self.channels
-        } if self.channels is not None else None
+        }) if self.channels is not None else None
 
-        self.voice_state = dict()
+        # voice_state maps user id to the channel, voice_members maps channel
+        # id to _VoiceMembers holding ids of the users in there.
+        self._set_voice_states(self.voice_states or ())
 
-    def get_channels(self):
-        return self.channels.copy()
+        # Only members the policy asks for get constructed, so that large
+        # guilds don't allocate a Member for everyone in GUILD_CREATE.
+        policy = getattr(client, "member_cache_policy", None)
+        self.members = CacheDict({
+            member['user']['id']: Member(client, self, member)
+            for member in self.members
+            if policy is None or policy.check(self, member['user']['id'])
+        }) if self.members is not None else None
+
+    def _update(self, data):
+        """Merges changed fields into the guild in place.
+
+        channels and members in data update the existing Channel and Member
+        objects instead of replacing them, and voice_states replaces the
+        voice state maps. When data lacks them, which is the case for
+        GUILD_UPDATE, the cached ones are kept untouched.
+        """
+        data = data.copy()
+        channels = data.pop("channels", None)
+        members = data.pop("members", None)
+        voice_states = data.pop("voice_states", None)
+
+        changed = super(Guild, self)._update(data)
+
+        if "roles" in changed:
+            self.role_map = CacheDict({
+                role['id']: role for role in self.roles or ()
+            })
+
+        if channels is not None:
+            self._update_channels(channels)
+        # Before the members, as the member cache policy may look them up
+        if voice_states is not None:
+            self._set_voice_states(voice_states)
+        if members is not None:
+            self._update_members(members)
+
+        return changed
+
+    def _update_channels(self, channels):
+        if self.channels is None:
+            self.channels = CacheDict()
+
+        ids = set()
+        for channel in channels:
+            id_ = channel['id']
+            ids.add(id_)
+            prev = self.channels.get(id_)
+            if prev is not None and prev.type == channel['type']:
+                prev._update(channel)
+            else:
+                self.channels[id_] = get_channel(self.client, channel, self)
+
+        for id_ in self.channels.keys() - ids:
+            del self.channels[id_]
+
+    def _update_members(self, members):
+        if self.members is None:
+            self.members = CacheDict()
+
+        policy = getattr(self.client, "member_cache_policy", None)
+        ids = set()
+        for member in members:
+            id_ = member['user']['id']
+            ids.add(id_)
+            prev = self.members.get(id_)
+            if prev is not None:
+                prev._update(member)
+            elif policy is None or policy.check(self, id_):
+                self.members[id_] = Member(self.client, self, member)
+
+        # GUILD_CREATE of a large guild only carries a part of the members,
+        # Only drop the ones we've got if the list is complete.
+        if self.member_count is not None and len(ids) >= self.member_count:
+            for id_ in self.members.keys() - ids:
+                del self.members[id_]
+                if policy is not None:
+                    policy.forget(self, id_)
 
     def get_channel(self, id_):
-        return self.get_channels().get(id_)
+        if self.channels is None:
+            self.get_channels()
+        return self.channels.get(id_)
+
+    def _set_voice_states(self, voice_states):
+        """Replaces the voice state maps with the ones in voice_states."""
+        self.voice_state = CacheDict()
+        self.voice_members = CacheDict()
+        if self.channels is None:
+            return
+        for state in voice_states:
+            channel = self.channels.get(state.get('channel_id'))
+            if channel is not None:
+                self._set_voice_state(state['user_id'], channel)
+
+    def _set_voice_state(self, user_id, channel):
+        """Moves user to the voice channel, or out of voice if it's None."""
+        prev = self.voice_state.get(user_id)
+        if prev is not None:
+            members = self.voice_members.get(prev.id)
+            if members is not None:
+                members.discard(user_id)
+                if not members:
+                    self.voice_members.pop(prev.id, None)
+
+        if channel is None:
+            self.voice_state.pop(user_id, None)
+        else:
+            self.voice_state[user_id] = channel
+            members = self.voice_members.get(channel.id)
+            if members is None:
+                members = self.voice_members[channel.id] = _VoiceMembers()
+            members.add(user_id)
+
+    def get_voice_members(self, channel_id):
+        """Returns frozenset of ids of users in the voice channel."""
+        members = self.voice_members.get(channel_id)
+        return members.freeze() if members is not None else frozenset()
+
+    def get_voice_member_count(self, channel_id):
+        members = self.voice_members.get(channel_id)
+        return len(members) if members is not None else 0
+
+    def is_voice_alone(self, channel_id, user_id):
+        """Returns whether the user is the only one in the voice channel."""
+        members = self.voice_members.get(channel_id)
+        return members is not None and len(members) == 1 and \
+            user_id in members
+
+    def get_role(self, id_):
+        return self.role_map.get(id_)
+
+    def _set_role(self, role):
+        """Adds or replaces the role, keeping .roles and .role_map in sync."""
+        self.roles = [
+            prev for prev in self.roles or () if prev['id'] != role['id']
+        ]
+        self.roles.append(role)
+        self.role_map[role['id']] = role
+
+    def _remove_role(self, id_):
+        self.roles = [role for role in self.roles or () if role['id'] != id_]
+        self.role_map.pop(id_, None)
 
     def get_members(self):
+        """Returns a read-only snapshot of the members, safe to iterate."""
         if self.members is not None:
-            return self.members.copy()
+            return self.members.snapshot()
+
+    def fetch_members(self, query="", limit=0, user_ids=EMPTY,
+                      presences=EMPTY, timeout=30):
+        """Requests members through the gateway, yielding them chunk by chunk.
+
+        Sends REQUEST_GUILD_MEMBERS with a random nonce and yields Member
+        objects from the matching GUILD_MEMBERS_CHUNK events as they arrive,
+        so that members of large guilds can be processed without keeping all
+        of them in memory. Whether the members get cached depends on the
+        client's MemberCachePolicy.
+
+        Requesting every member with an empty query requires GUILD_MEMBERS
+        intent.
+
+        Raises:
+            TimeoutError:
+                Raised if no chunk arrives within timeout seconds.
+        """
+        if isinstance(user_ids, (list, tuple)):
+            user_ids = [user.id if isinstance(user, User) else user
+                        for user in user_ids]
+
+        if user_ids is not EMPTY:
+            query = EMPTY
+
+        nonce = os.urandom(16).hex()
+        queue = Queue()
+        self.client.chunk_queue[nonce] = queue
+
+        try:
+            self.client.request_guild_member(
+                self.id, query, limit, presences, user_ids, nonce
+            )
+
+            while True:
+                try:
+                    chunk = queue.get(timeout=timeout)
+                except Empty:
+                    raise TimeoutError("Timed out waiting for member chunk "
+                                       f"of guild {self.id}") from None
+
+                for member in chunk['members']:
+                    yield member
+
+                if chunk['chunk_index'] + 1 >= chunk['chunk_count']:
+                    break
+        finally:
+            del self.client.chunk_queue[nonce]
 
     def get_preview(self):
         return self.client.get_guild_preiew(self.id)
@@ -124,7 +359,7 @@ class Guild(DictObject):
             "PATCH", "", postdata
         )
 
-        self.__init__(self.client, guild)
+        self._update(guild)
 
         return self
 
@@ -137,19 +372,24 @@ class Guild(DictObject):
         return self.client.user.leave_guild(self)
 
     def get_channels(self):
+        """Returns a read-only snapshot of the channels, safe to iterate.
+
+        Channels are fetched from the HTTP API if they weren't provided by the
+        gateway.
+        """
         if self.channels is not None:
-            return self.channels
-        
+            return self.channels.snapshot()
+
         raw_channels = self._send_request(
             "GET", "/channels"
         )
 
-        channels = [
-            get_channel(self.client, channel) for channel in raw_channels
-        ]
-        self.channels = channels
+        self.channels = CacheDict({
+            channel['id']: get_channel(self.client, channel, self)
+            for channel in raw_channels
+        })
 
-        return channels
+        return self.channels.snapshot()
 
     def create_channel(self, name, type, topic=EMPTY, bitrate=EMPTY,
                        user_limit=EMPTY, rate_limit_per_user=EMPTY,
@@ -207,6 +447,21 @@ class Guild(DictObject):
 
         return [Member(self.client, self, member) for member in members]
 
+    def iter_members(self, limit=None, after=EMPTY, prefetch=True):
+        """Returns iterator going through members of the guild.
+
+        Members are fetched lazily, 1000 members per request, with the next
+        page being fetched in the background while the current one is being
+        processed. Members are yielded in the order of their user id.
+        """
+        def fetch(cursor, count):
+            members = self.list_members(count, cursor)
+            cursor = max(members, key=lambda member: int(member.user.id))\
+                .user.id if members else None
+            return members, cursor
+
+        return iter(Paginator(fetch, 1000, limit, after, prefetch))
+
     def search_members(self, query=EMPTY, limit=EMPTY):
         postdata = {
             "query": query,
@@ -269,6 +524,30 @@ class Guild(DictObject):
             "DELETE", f"/members/{member}/roles/{role}"
         )
 
+    def bulk_add_role(self, members, role, progress=None):
+        """Adds the role to every member, returns BulkOperation.
+
+        Refer to .bulk_ban for details.
+        """
+        return self._bulk_members(
+            "add_role", self.add_role_to_member, members, role, progress)
+
+    def bulk_remove_role(self, members, role, progress=None):
+        """Removes the role from every member, returns BulkOperation.
+
+        Refer to .bulk_ban for details.
+        """
+        return self._bulk_members(
+            "remove_role", self.remove_role_from_member, members, role,
+            progress
+        )
+
+    def _bulk_members(self, bucket, func, members, role, progress):
+        operation = BulkOperation(progress)
+        for member in members:
+            operation.submit(bucket, func, member, role)
+        return operation.wait()
+
     def kick(self, member):
         if isinstance(member, Member):
             member = member.user.id
@@ -277,13 +556,55 @@ class Guild(DictObject):
             "DELETE", f"/members/{member}"
         )
 
-    def get_bans(self):
+    def get_bans(self, limit=EMPTY, before=EMPTY, after=EMPTY):
+        postdata = {
+            "limit": limit,
+            "before": before,
+            "after": after
+        }
+        postdata = clear_postdata(postdata)
+
+        endpoint = "/bans?"
+        for key, val in postdata.items():
+            endpoint += f"{key}={val}&"
+        endpoint = endpoint[:-1]
+
         bans = self._send_request(
-            "GET", "/bans"
+            "GET", endpoint
         )
 
         return bans
 
+    def iter_bans(self, limit=None, before=EMPTY, after=EMPTY,
+                  prefetch=True):
+        """Returns iterator going through bans of the guild.
+
+        Bans are fetched lazily, 1000 bans per request, with the next page
+        being fetched in the background. Bans are yielded in the order of
+        the user id, or in the reverse order if only before is given.
+        """
+        if before is not EMPTY and after is EMPTY:
+            def fetch(cursor, count):
+                bans = self.get_bans(limit=count, before=cursor)
+                bans.sort(key=lambda ban: int(ban['user']['id']), reverse=True)
+                cursor = bans[-1]['user']['id'] if bans else None
+                return bans, cursor
+
+            return iter(Paginator(fetch, 1000, limit, before, prefetch))
+
+        def fetch(cursor, count):
+            bans = self.get_bans(limit=count, after=cursor)
+            bans.sort(key=lambda ban: int(ban['user']['id']))
+            cursor = bans[-1]['user']['id'] if bans else None
+            if before is not EMPTY:
+                bans = [
+                    ban for ban in bans
+                    if int(ban['user']['id']) < int(before)
+                ]
+            return bans, cursor
+
+        return iter(Paginator(fetch, 1000, limit, after, prefetch))
+
     def get_ban(self, member):
         if isinstance(member, Member):
             member = member.user.id
@@ -310,6 +631,47 @@ class Guild(DictObject):
         
         return ban
 
+    def bulk_ban(self, members, delete_message_seconds=EMPTY, progress=None):
+        """Bans every member, 200 members per request.
+
+        Args:
+            members:
+                Iterable of Member objects or user ids.
+            delete_message_seconds:
+                Seconds of messages from the members to be deleted.
+            progress:
+                function called with BulkOperation whenever a request is
+                done, to report the progress.
+
+        Returns:
+            BulkOperation holding the amount of banned members, failures,
+            and the throughput.
+        """
+        ids = [member.user.id if isinstance(member, Member) else member
+               for member in members]
+        operation = BulkOperation(progress)
+
+        for start in range(0, len(ids), BULK_BAN_MAX):
+            batch = ids[start:start + BULK_BAN_MAX]
+            operation.submit(
+                "bulk_ban", self._bulk_ban, batch, delete_message_seconds,
+                count=len(batch)
+            )
+
+        return operation.wait()
+
+    def _bulk_ban(self, user_ids, delete_message_seconds=EMPTY):
+        postdata = clear_postdata({
+            "user_ids": user_ids,
+            "delete_message_seconds": delete_message_seconds
+        })
+
+        result = self._send_request(
+            "POST", "/bulk-ban", postdata
+        )
+
+        return len(result.get("banned_users", ())) if result else 0
+
     def remove_ban(self, member):
         if isinstance(member, Member):
             member = member.user.id
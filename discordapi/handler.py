@@ -18,11 +18,17 @@
 #    along with this program.  If not, see <https://www.gnu.org/licenses/>.
 #
 
-from queue import Queue
+import time
+from queue import Queue, Full
 from threading import Thread
 
 __all__ = ["EventHandler", "GeneratorEventHandler"]
 
+# Overflow policies of GeneratorEventHandler
+BLOCK = "block"
+DROP_NEW = "drop_new"
+DROP_OLD = "drop_old"
+
 
 class EventHandler:
     """Base client for EventHandler.
@@ -46,6 +52,14 @@ class EventHandler:
                             f"not '{type(client)}'")
         self.client = client
 
+    def handle_raw(self, event, payload):
+        """Receives the event payload as is, before it gets parsed.
+
+        Called for every DISPATCH event right before the payload is passed
+        to the event parser, which may modify it. Does nothing by default.
+        """
+        pass
+
     def handle(self, event, obj):
         """Handler function to handle the event.
 
@@ -64,6 +78,9 @@ class EventHandler:
                 Possible types are: Channel/Guild/Member/Message/dict.
                 Check DiscordGateway._event_parser method to see how things
                 are handled.
+                If client.emit_update_pairs is set, GUILD_UPDATE,
+                CHANNEL_UPDATE, GUILD_MEMBER_UPDATE and MESSAGE_UPDATE come
+                as a tuple of (before, after) instead.
         """
         raise NotImplementedError()
 
@@ -76,16 +93,59 @@ class GeneratorEventHandler(EventHandler):
     events without declaring additional functions, which is suitable for simple
     usages.
 
+    The queue is unbounded by default. When maxsize is set, overflow decides
+    what happens once the queue is full:
+        "block": the gateway stops reading events until there's room, which
+            pushes back to the gateway instead of growing memory.
+        "drop_new": the incoming event is discarded.
+        "drop_old": the oldest queued event is discarded.
+
     Attributes:
         self.event_queue:
             Queue object storing events.
+        self.overflow:
+            Overflow policy, one of "block", "drop_new" or "drop_old".
+        self.dropped:
+            Amount of events discarded due to the overflow.
     """
-    def __init__(self, client=None):
+    def __init__(self, client=None, maxsize=0, overflow=BLOCK):
+        if overflow not in (BLOCK, DROP_NEW, DROP_OLD):
+            raise ValueError(f"Unknown overflow policy '{overflow}'")
         super(GeneratorEventHandler, self).__init__(client)
-        self.event_queue = Queue()
+        self.event_queue = Queue(maxsize)
+        self.overflow = overflow
+        self.dropped = 0
 
     def handle(self, event, obj):
-        self.event_queue.put((event, obj))
+        item = (event, obj)
+        queue = self.event_queue
+
+        if queue.maxsize <= 0:
+            queue.put(item)
+            return
+
+        if self.overflow == BLOCK:
+            # Waits in steps so that a stopping client won't block forever
+            while True:
+                try:
+                    queue.put(item, timeout=1)
+                    return
+                except Full:
+                    if self.client is not None and \
+                            self.client.stop_flag.is_set():
+                        return
+
+        with queue.mutex:
+            if queue._qsize() >= queue.maxsize:
+                self.dropped += 1
+                if self.overflow == DROP_NEW:
+                    return
+                # Replaces the oldest event, unfinished_tasks stays the same
+                queue._get()
+            else:
+                queue.unfinished_tasks += 1
+            queue._put(item)
+            queue.not_empty.notify()
 
     def event_generator(self):
         """Generator yielding events.
@@ -115,6 +175,49 @@ class GeneratorEventHandler(EventHandler):
         except KeyboardInterrupt:
             return
 
+    def batch_generator(self, max_batch=100, max_wait=0.05):
+        """Generator yielding lists of events.
+
+        Waits for an event to arrive, then keeps collecting events for up to
+        max_wait seconds or until max_batch events are queued, and takes them
+        all at once. This takes the queue lock once per batch instead of once
+        per event, which is cheaper when events come in bursts.
+
+        ```
+        for events in handler.batch_generator():
+            for event, obj in events:
+                print(f"{event}: {obj}")
+        ```
+
+        Same as .event_generator, This generator silences KeyboardInterrupt.
+        """
+        queue = self.event_queue
+        try:
+            while not self.client.stop_flag.is_set():
+                with queue.not_empty:
+                    # Waits in steps so that a stopping client won't block
+                    # forever
+                    while not queue._qsize():
+                        queue.not_empty.wait(1)
+                        if self.client.stop_flag.is_set():
+                            return
+
+                    deadline = time.monotonic() + max_wait
+                    while queue._qsize() < max_batch:
+                        remaining = deadline - time.monotonic()
+                        if remaining <= 0:
+                            break
+                        queue.not_empty.wait(remaining)
+
+                    count = min(max_batch, queue._qsize())
+                    batch = [queue._get() for _ in range(count)]
+                    queue.not_full.notify(count)
+
+                yield batch
+            return
+        except KeyboardInterrupt:
+            return
+
 
 class MethodEventHandler(EventHandler):
     """Handler to handle methods with defined methods.
@@ -0,0 +1,381 @@
+#
+# NicoBot is Nicovideo Player bot for Discord, written from the scratch.
+# This file is part of NicoBot.
+#
+# Copyright (C) 2021 Wonjun Jung (KokoseiJ)
+#
+#    Nicobot is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+
+from .util import MultipartEncoder, get_route_template, read_response
+from .retry import RetryPolicy
+from .httpstats import HTTPTelemetry
+from .ratelimit import RateLimitHandler
+from .responsecache import ResponseCache, get_written_paths
+from .exceptions import DiscordHTTPError, DiscordRequestError
+from .const import API_URL, LIB_NAME
+
+import json
+import time
+import logging
+from http.client import HTTPException
+from urllib.parse import urljoin
+from urllib.error import HTTPError, URLError
+from urllib.request import Request, urlopen
+
+__all__ = ["HTTPClient"]
+
+logger = logging.getLogger(LIB_NAME)
+
+
+def construct_url(baseurl, endpoint):
+    if endpoint.startswith("/"):
+        endpoint = endpoint[1:]
+
+    return urljoin(baseurl, endpoint)
+
+
+class HTTPClient:
+    """Sends requests to the HTTP API, waiting for their rate limits.
+
+    Every HTTPClient has its own RateLimitHandler, so that the requests
+    sent by different clients- e.g. a bot and webhooks, don't wait for each
+    other's rate limits.
+
+    Attributes:
+        headers:
+            Headers to be used when sending HTTP request.
+        ratelimit_handler:
+            handler used to handle rate limit accordingly.
+        response_cache:
+            ResponseCache serving GET requests, None if disabled.
+        retry_policy:
+            RetryPolicy deciding the timeouts and retries of the requests.
+        http_telemetry:
+            HTTPTelemetry recording the requests, None if disabled.
+    """
+    def __init__(self, headers=None):
+        self.headers = headers if headers is not None else {}
+        self.ratelimit_handler = RateLimitHandler()
+        self.response_cache = None
+        self.retry_policy = RetryPolicy()
+        self.http_telemetry = HTTPTelemetry()
+
+    def http_stats(self):
+        """Returns snapshot of the HTTP telemetry, None if it's disabled."""
+        if self.http_telemetry is None:
+            return None
+        return self.http_telemetry.get_snapshot()
+
+    def set_http_telemetry(self, telemetry):
+        """Sets HTTPTelemetry, or disables it if telemetry is None."""
+        if telemetry is None or isinstance(telemetry, HTTPTelemetry):
+            self.http_telemetry = telemetry
+        elif issubclass(telemetry, HTTPTelemetry):
+            self.http_telemetry = telemetry()
+        else:
+            raise TypeError("Inappropriate HTTPTelemetry object.")
+
+    def set_retry_policy(self, policy):
+        if isinstance(policy, RetryPolicy):
+            self.retry_policy = policy
+        elif issubclass(policy, RetryPolicy):
+            self.retry_policy = policy()
+        else:
+            raise TypeError("Inappropriate RetryPolicy object.")
+
+    def set_response_cache(self, cache):
+        """Enables response cache, or disables it if cache is None."""
+        if cache is None or isinstance(cache, ResponseCache):
+            self.response_cache = cache
+        elif issubclass(cache, ResponseCache):
+            self.response_cache = cache()
+        else:
+            raise TypeError("Inappropriate ResponseCache object.")
+
+    def send_request(self, method, route, data=None, expected_code=None,
+                     raise_at_exc=True, baseurl=API_URL, headers=None):
+        """Sends HTTP API request.
+
+        It sends the request, parses result data, checks ratelimit, and returns
+        result data in JSON format.
+
+        Args:
+            method:
+                HTTP method to use- e.g. GET, POST, DELETE, etc...
+            route:
+                API subdirectory to send request to. e.g. /channels/id
+            data:
+                POST data to send to, as a dictionary, refer to urllib.request
+                for details.
+            expected_code:
+                HTTP return code to check for. If this code mismatches and
+                raise_at_exc is true, This will raise DiscordHTTPError.
+            raise_at_exc:
+                Whether or not to throw exception when urllib.request raises
+                HTTPError or return code is not what we were expecting.
+                If this is true, DiscordHTTPError will be raised.
+            baseurl:
+                Base URL to construct full URL with. Defaluts to Discord API
+                endpoint.
+            headers:
+                Headers to use when sending requests. It contains User-Agent,
+                Autorization, Content-Type by default. Should be used if
+                Content-Type is not application/json .
+
+        Returns:
+            Dict made out of JSON object returned from API.
+
+        Raises:
+            DiscordHTTPError:
+                Raised when HTTPError is raised, or unexpected code is returned
+            DiscordRequestError:
+                Raised when no response could be received within the attempts
+                and the deadline of .retry_policy.
+            DiscordCircuitOpenError:
+                Raised when the route's circuit is open.
+        """
+        if baseurl is None:
+            baseurl = API_URL
+
+        cache = self.response_cache
+        if cache is not None and baseurl == API_URL:
+            if not route.startswith("/"):
+                route = f"/{route}"
+            if method == "GET":
+                return cache.request(route, lambda: self._request(
+                    method, route, data, expected_code, raise_at_exc,
+                    baseurl, headers
+                ))
+            for path in get_written_paths(route.split("?", 1)[0]):
+                cache.invalidate(path)
+
+        return self._request(method, route, data, expected_code,
+                             raise_at_exc, baseurl, headers)
+
+    def _request(self, method, route, data=None, expected_code=None,
+                 raise_at_exc=True, baseurl=API_URL, headers=None):
+        """Same as .send_request, without going through the response cache.
+        """
+        # Query strings don't make a different rate limit bucket, e.g. pages
+        bucket_route = route.split("?", 1)[0]
+        # Used in logs and exceptions too, as routes can contain tokens
+        circuit_route = get_route_template(bucket_route)
+        policy = self.retry_policy
+        policy.add_request()
+        deadline = policy.get_deadline()
+        attempt = 0
+
+        # Encoded once, rather than in every attempt
+        if isinstance(data, dict):
+            data = json.dumps(data)
+        if isinstance(data, str):
+            data = data.encode()
+        bytes_out = len(data) if data is not None else 0
+
+        while True:
+            policy.check_circuit(circuit_route)
+            wait_start = time.perf_counter()
+            if self.ratelimit_handler.check(
+                    bucket_route, self._get_remaining(deadline)):
+                raise DiscordRequestError(
+                    f"{method} {circuit_route} is rate limited past its "
+                    "deadline.", circuit_route, attempt
+                )
+            attempt += 1
+            start = time.perf_counter()
+            wait = start - wait_start
+
+            timeout = policy.timeout
+            remaining = self._get_remaining(deadline)
+            if remaining is not None:
+                if remaining <= 0:
+                    raise DiscordRequestError(
+                        f"{method} {circuit_route} has passed its deadline.",
+                        circuit_route, attempt - 1
+                    )
+                timeout = remaining if timeout is None \
+                    else min(timeout, remaining)
+
+            try:
+                res, exc = self._send_request(
+                    method, route, data, baseurl, headers, timeout)
+                try:
+                    code = res.status
+                except AttributeError:
+                    code = res.getstatus()
+                rawdata, bytes_in = read_response(res)
+            except (URLError, HTTPException, OSError) as e:
+                self._record(method, circuit_route, None,
+                             time.perf_counter() - start, wait, 0, bytes_out)
+                policy.add_failure(circuit_route)
+                delay = policy.get_retry_delay(method, attempt, deadline)
+                if delay is None:
+                    raise DiscordRequestError(
+                        f"{method} {circuit_route} failed after {attempt} "
+                        f"attempts: {e}", circuit_route, attempt
+                    ) from e
+                logger.warning(f"{method} {circuit_route} failed: {e}, "
+                               f"retrying in {delay:.2f}s...")
+                time.sleep(delay)
+                continue
+
+            latency = time.perf_counter() - start
+
+            try:
+                resdata = json.loads(rawdata) if rawdata else None
+            except ValueError:
+                # Error pages of the proxies aren't JSON
+                if not exc:
+                    raise
+                resdata = None
+
+            if self.http_telemetry is not None:
+                scope = None
+                if code == 429:
+                    scope = res.headers.get("X-RateLimit-Scope")
+                    if scope is None:
+                        is_global = isinstance(resdata, dict) and \
+                            resdata.get("global")
+                        scope = "global" if is_global else "user"
+                self._record(method, circuit_route, code, latency, wait,
+                             bytes_in, bytes_out, scope)
+
+            if code >= 500:
+                policy.add_failure(circuit_route)
+                delay = policy.get_retry_delay(method, attempt, deadline)
+                if delay is not None:
+                    logger.warning(f"{method} {circuit_route} returned {code},"
+                                   f" retrying in {delay:.2f}s...")
+                    time.sleep(delay)
+                    continue
+            else:
+                policy.add_success(circuit_route)
+
+            logger.debug(f"Received from HTTP API: {resdata}")
+            logger.debug(f"HTTP Header: {res.headers}")
+
+            if code != 429:
+                break
+
+            if isinstance(resdata, dict) and "retry_after" in resdata:
+                retry_after = float(resdata['retry_after'])
+                is_global = resdata.get("global", False)
+            else:
+                # e.g. HTML ban page of the proxy in front of the API
+                retry_after = res.headers.get("Retry-After") or \
+                    res.headers.get("X-RateLimit-Reset-After")
+                if retry_after is None:
+                    raise DiscordHTTPError(
+                        code, getattr(res, "reason", ""), res)
+                retry_after = float(retry_after)
+                is_global = res.headers.get("X-RateLimit-Global") == "true"
+
+            if deadline is not None and \
+                    time.monotonic() + retry_after >= deadline:
+                raise DiscordRequestError(
+                    f"{method} {circuit_route} is rate limited past its "
+                    "deadline.", circuit_route, attempt
+                )
+            _route = "global" if is_global else bucket_route
+            self.ratelimit_handler.set_limit(_route, time.time() + retry_after)
+
+        bucket = res.headers.get("X-RateLimit-Bucket")
+        if bucket is not None and\
+                not self.ratelimit_handler.is_in_bucket_map(bucket_route):
+            self.ratelimit_handler.register_bucket(bucket_route, bucket)
+
+        # Waits for the reset before the next request instead of hitting 429
+        if res.headers.get("X-RateLimit-Remaining") == "0":
+            reset_after = res.headers.get("X-RateLimit-Reset-After")
+            if reset_after is not None:
+                self.ratelimit_handler.set_limit(
+                    bucket_route, time.time() + float(reset_after), False)
+
+        if raise_at_exc and \
+                ((expected_code is not None and code != expected_code) or exc):
+            if isinstance(resdata, dict) and "code" in resdata:
+                raise DiscordHTTPError(
+                    resdata['code'], resdata['message'], res
+                )
+            raise DiscordHTTPError(code, getattr(res, "reason", ""), res)
+
+        return resdata
+
+    @staticmethod
+    def _get_remaining(deadline):
+        if deadline is None:
+            return None
+        return deadline - time.monotonic()
+
+    def _record(self, method, route, status, latency, wait, bytes_in,
+                bytes_out, scope=None):
+        telemetry = self.http_telemetry
+        if telemetry is not None:
+            telemetry.record(method, route, status, latency, wait, bytes_in,
+                             bytes_out, scope)
+
+    def _send_request(self, method, route, data=None, baseurl=API_URL,
+                      headers=None, timeout=None):
+        """Returns Response object directly.
+
+        Args:
+            method:
+                HTTP method to use- e.g. GET, POST, DELETE, etc...
+            route:
+                API subdirectory to send request to. e.g. /channels/id
+            data:
+                POST data to send to, as a dictionary, refer to urllib.request
+                for details.
+            baseurl:
+                Base URL to construct full URL with. Defaluts to Discord API
+                endpoint.
+            headers:
+                Headers to use when sending requests. It contains User-Agent,
+                Autorization, Content-Type by default. Should be used if
+                Content-Type is not application/json.
+            timeout:
+                Seconds to wait for the connection and each read of the
+                socket. None to wait indefinitely.
+
+        Returns:
+            A tuple of (Response, exc) where exc determines whether an
+            exception was occured or not.
+            If HTTPError was thrown, Response object would be a catched
+            exception, but there's no difference in its functionality.
+        """
+        url = construct_url(baseurl, route)
+
+        if isinstance(data, dict):
+            data = json.dumps(data)
+        if isinstance(data, str):
+            data = data.encode()
+
+        req_headers = self.headers.copy()
+        if headers is not None:
+            req_headers.update(headers)
+        if isinstance(data, MultipartEncoder):
+            # urllib falls back to chunked encoding for iterables otherwise
+            req_headers['Content-Length'] = str(len(data))
+
+        req = Request(url, data, req_headers, method=method)
+
+        exc = False
+        try:
+            res = urlopen(req, timeout=timeout)
+        except HTTPError as e:
+            exc = True
+            res = e
+
+        return res, exc
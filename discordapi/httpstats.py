@@ -0,0 +1,170 @@
+#
+# NicoBot is Nicovideo Player bot for Discord, written from the scratch.
+# This file is part of NicoBot.
+#
+# Copyright (C) 2021 Wonjun Jung (KokoseiJ)
+#
+#    Nicobot is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+
+from .const import LIB_NAME
+
+import time
+import bisect
+import logging
+from threading import Lock
+
+__all__ = ["HTTPTelemetry"]
+
+logger = logging.getLogger(LIB_NAME)
+
+# Upper bounds in seconds of the latency histogram buckets
+LATENCY_BUCKETS = (0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, float("inf"))
+
+
+class _Stats:
+    def __init__(self):
+        self.count = 0
+        self.errors = 0
+        self.statuses = {}
+        self.ratelimited = {}
+        self.histogram = [0] * len(LATENCY_BUCKETS)
+        self.network_time = 0.0
+        self.max_latency = 0.0
+        self.wait_time = 0.0
+        self.bytes_in = 0
+        self.bytes_out = 0
+
+    def add(self, status, latency, wait, bytes_in, bytes_out, scope):
+        self.count += 1
+        if status is None:
+            self.errors += 1
+        else:
+            self.statuses[status] = self.statuses.get(status, 0) + 1
+        if scope is not None:
+            self.ratelimited[scope] = self.ratelimited.get(scope, 0) + 1
+
+        self.histogram[bisect.bisect_left(LATENCY_BUCKETS, latency)] += 1
+        self.network_time += latency
+        self.max_latency = max(self.max_latency, latency)
+        self.wait_time += wait
+        self.bytes_in += bytes_in
+        self.bytes_out += bytes_out
+
+    def get_percentile(self, percent):
+        """Returns upper bound of the bucket the percentile falls in."""
+        target = self.count * percent / 100
+        seen = 0
+        for bound, count in zip(LATENCY_BUCKETS, self.histogram):
+            seen += count
+            if count and seen >= target:
+                return min(bound, self.max_latency)
+        return 0.0
+
+    def to_dict(self):
+        return {
+            "count": self.count,
+            "errors": self.errors,
+            "statuses": dict(self.statuses),
+            "ratelimited": dict(self.ratelimited),
+            "latency": {
+                "mean": self.network_time / self.count if self.count else 0.0,
+                "max": self.max_latency,
+                "p50": self.get_percentile(50),
+                "p95": self.get_percentile(95),
+                "p99": self.get_percentile(99),
+                "histogram": list(zip(LATENCY_BUCKETS, self.histogram))
+            },
+            "network_time": self.network_time,
+            "ratelimit_wait": self.wait_time,
+            "bytes_in": self.bytes_in,
+            "bytes_out": self.bytes_out
+        }
+
+
+class HTTPTelemetry:
+    """Records latency, status and rate limits of every HTTP request.
+
+    Every attempt of a request is recorded under "METHOD /route/{id}", with
+    the route normalized by get_route_template so that the requests to the
+    same endpoint are counted together. Time spent waiting in the rate
+    limiter is kept apart from the time spent on the network.
+
+    Get a snapshot with client.http_stats method.
+
+    Attributes:
+        callbacks:
+            list of functions called with a dict describing every request
+            attempt, with method, route, status, latency, wait, bytes_in,
+            bytes_out and scope keys. status is None when no response was
+            received, and scope is the X-RateLimit-Scope of 429 responses:
+            "user", "global" or "shared".
+        started_at:
+            time.time() value of when the recording started.
+    """
+    def __init__(self):
+        self.callbacks = []
+        self.started_at = time.time()
+
+        self._routes = {}
+        self._total = _Stats()
+        self._lock = Lock()
+
+    def add_callback(self, func):
+        self.callbacks.append(func)
+
+    def remove_callback(self, func):
+        self.callbacks.remove(func)
+
+    def record(self, method, route, status, latency, wait=0.0, bytes_in=0,
+               bytes_out=0, scope=None):
+        """Records an attempt of request to the route template."""
+        key = f"{method} {route}"
+        with self._lock:
+            stats = self._routes.get(key)
+            if stats is None:
+                stats = self._routes[key] = _Stats()
+            stats.add(status, latency, wait, bytes_in, bytes_out, scope)
+            self._total.add(status, latency, wait, bytes_in, bytes_out, scope)
+
+        if not self.callbacks:
+            return
+        event = {
+            "method": method, "route": route, "status": status,
+            "latency": latency, "wait": wait, "bytes_in": bytes_in,
+            "bytes_out": bytes_out, "scope": scope
+        }
+        for callback in self.callbacks:
+            try:
+                callback(event)
+            except Exception:
+                logger.exception("Exception occured in telemetry callback.")
+
+    def get_snapshot(self):
+        """Returns dict of the stats, "routes" by route and the "total"."""
+        with self._lock:
+            return {
+                "since": self.started_at,
+                "total": self._total.to_dict(),
+                "routes": {
+                    key: stats.to_dict()
+                    for key, stats in self._routes.items()
+                }
+            }
+
+    def reset(self):
+        with self._lock:
+            self._routes.clear()
+            self._total = _Stats()
+            self.started_at = time.time()
@@ -20,7 +20,7 @@
 
 from .user import User
 from .const import EMPTY
-from .dictobject import DictObject
+from .dictobject import DictObject, EntityLink
 
 __all__ = ["Member"]
 
@@ -29,6 +29,8 @@ KEYLIST = ["user", "nick", "roles", "joined_at", "premium_since",
 
 
 class Member(DictObject):
+    guild = EntityLink(lambda client, id_: client.guilds.get(id_))
+
     def __init__(self, client, guild, data):
         super(Member, self).__init__(data, KEYLIST)
         self.client = client
@@ -37,6 +39,13 @@ class Member(DictObject):
         if self.user is not None:
             self.user = User(client, self.user)
 
+    def get_permissions(self, channel=None):
+        """Returns permissions of the member, in the channel if given."""
+        resolver = self.client.permission_resolver
+        if channel is None:
+            return resolver.compute_base(self)
+        return resolver.compute(self, channel)
+
     def modify(self, nick=EMPTY, roles=EMPTY, mute=EMPTY, deaf=EMPTY,
                channel_id=EMPTY):
         self.guild.modify_member(self, nick, roles, mute, deaf, channel_id)
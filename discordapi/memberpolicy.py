@@ -0,0 +1,158 @@
+#
+# NicoBot is Nicovideo Player bot for Discord, written from the scratch.
+# This file is part of NicoBot.
+#
+# Copyright (C) 2021 Wonjun Jung (KokoseiJ)
+#
+#    Nicobot is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+
+
+from threading import Lock
+from collections import OrderedDict
+
+__all__ = ["MemberCachePolicy", "CacheAllMembers", "CacheNoMembers",
+           "CacheVoiceMembers", "CacheRecentMembers"]
+
+
+class MemberCachePolicy:
+    """Base class for policies deciding which members are kept in the cache.
+
+    Gateway consults the policy whenever it receives a member- from
+    GUILD_CREATE, GUILD_MEMBER_* events, member chunks, messages and voice
+    state updates. The bot's own member is always cached regardless of the
+    policy.
+
+    Attributes:
+        client:
+            DiscordGateway object this policy is attached to.
+    """
+    def __init__(self):
+        self.client = None
+
+    def set_client(self, client):
+        from .gateway import DiscordGateway
+        if not isinstance(client, DiscordGateway):
+            raise TypeError("client should be DiscordGateway, "
+                            f"not '{type(client)}'")
+        self.client = client
+
+    def check(self, guild, user_id):
+        """Returns whether the member should be cached."""
+        user = self.client.user if self.client is not None else None
+        if user is not None and user.id == user_id:
+            return True
+        return self.should_cache(guild, user_id)
+
+    def should_cache(self, guild, user_id):
+        """Decides if the member should be cached.
+
+        This method should be implemented by the inherited class.
+        """
+        raise NotImplementedError()
+
+    def touch(self, guild, member):
+        """Called when the member has shown an activity in the guild.
+
+        Adds the member to the cache if the policy wants it there, and drops
+        it if the policy no longer does.
+        """
+        user_id = member.user.id
+        is_cached = guild.members is not None and user_id in guild.members
+
+        if self.check(guild, user_id):
+            if not is_cached:
+                self.client._cache_member(guild, member)
+        elif is_cached:
+            self.client._uncache_member(guild, user_id)
+
+    def forget(self, guild, user_id):
+        """Called after the member has been removed from the cache."""
+        pass
+
+    def forget_guild(self, guild):
+        """Called after the guild has been removed from the cache."""
+        pass
+
+
+class CacheAllMembers(MemberCachePolicy):
+    """Caches every member the gateway sends. This is the default."""
+    def should_cache(self, guild, user_id):
+        return True
+
+
+class CacheNoMembers(MemberCachePolicy):
+    """Caches no member other than the bot itself."""
+    def should_cache(self, guild, user_id):
+        return False
+
+
+class CacheVoiceMembers(MemberCachePolicy):
+    """Caches members connected to a voice channel only.
+
+    Members get dropped from the cache as soon as they leave the voice
+    channel.
+    """
+    def should_cache(self, guild, user_id):
+        return guild.voice_state.get(user_id) is not None
+
+
+class CacheRecentMembers(MemberCachePolicy):
+    """Caches recently active members, up to max_members per guild.
+
+    Sending a message, joining, updating or changing voice state counts as an
+    activity. Least recently active members get evicted when the limit is
+    reached.
+
+    Attributes:
+        max_members:
+            Maximum amount of members to be cached per guild.
+    """
+    def __init__(self, max_members=1000):
+        super(CacheRecentMembers, self).__init__()
+        self.max_members = max_members
+        self._recent = {}
+        self._lock = Lock()
+
+    def should_cache(self, guild, user_id):
+        recent = self._recent.get(guild.id)
+        return recent is not None and user_id in recent
+
+    def touch(self, guild, member):
+        user_id = member.user.id
+
+        with self._lock:
+            recent = self._recent.setdefault(guild.id, OrderedDict())
+            recent[user_id] = None
+            recent.move_to_end(user_id)
+
+            evicted = []
+            while len(recent) > self.max_members:
+                evicted.append(recent.popitem(last=False)[0])
+
+        super(CacheRecentMembers, self).touch(guild, member)
+
+        for id_ in evicted:
+            if not self.check(guild, id_):
+                self.client._uncache_member(guild, id_)
+
+    def forget(self, guild, user_id):
+        with self._lock:
+            recent = self._recent.get(guild.id)
+            if recent is not None:
+                recent.pop(user_id, None)
+
+    def forget_guild(self, guild):
+        with self._lock:
+            self._recent.pop(guild.id, None)
@@ -21,7 +21,7 @@
 from .user import User
 from .const import EMPTY
 from .member import Member
-from .dictobject import DictObject
+from .dictobject import DictObject, EntityLink
 
 __all__ = ["Message"]
 
@@ -35,6 +35,9 @@ KEYLIST = ["id", "channel_id", "guild_id", "author", "member", "content",
 
 
 class Message(DictObject):
+    guild = EntityLink(lambda client, id_: client.guilds.get(id_))
+    channel = EntityLink(lambda client, id_: client.channels.get(id_))
+
     def __init__(self, client, data):
         super(Message, self).__init__(data, KEYLIST)
         self.client = client
@@ -53,13 +56,33 @@ class Message(DictObject):
             guild = client.guilds.get(self.guild_id)
             if guild is None:
                 guild = client.get_guild(self.guild_id)
-            self.member = Member(client, guild, self.member)
+            member = dict(self.member)
+            member.setdefault("user", data['author'])
+            self.member = Member(client, guild, member)
             self.member.user = self.author
         if self.mentions is not None:
             self.mentions = [User(client, user) for user in self.mentions]
         if self.referenced_message is not None:
             self.referenced_message = Message(client, self.referenced_message)
 
+    def _update(self, data):
+        changed = super(Message, self)._update(data)
+        if "mentions" in changed and self.mentions is not None:
+            self.mentions = [
+                User(self.client, user) for user in self.mentions
+            ]
+        if "referenced_message" in changed and \
+                self.referenced_message is not None:
+            self.referenced_message = Message(
+                self.client, self.referenced_message
+            )
+        if "member" in changed and self.member is not None and \
+                not isinstance(self.member, Member):
+            guild = self.client.guilds.get(self.guild_id)
+            self.member = Member(self.client, guild, self.member)
+            self.member.user = self.author
+        return changed
+
     def crosspost(self):
         self.channel.crosspost(self)
 
@@ -82,9 +105,11 @@ class Message(DictObject):
         self.channel.delete_all_reactions_for_emoji(self, emoji, urlencoded)
 
     def edit(self, content=EMPTY, file=None, embeds=EMPTY, flags=EMPTY,
-             allowed_mentions=EMPTY, attachments=EMPTY, components=EMPTY):
+             allowed_mentions=EMPTY, attachments=EMPTY, components=EMPTY,
+             files=None):
         self.channel.edit_message(self, content, file, embeds, flags,
-                                  allowed_mentions, attachments, components)
+                                  allowed_mentions, attachments, components,
+                                  files)
 
     def delete(self):
         self.channel.delete_message(self)
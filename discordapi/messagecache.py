@@ -0,0 +1,195 @@
+#
+# NicoBot is Nicovideo Player bot for Discord, written from the scratch.
+# This file is part of NicoBot.
+#
+# Copyright (C) 2021 Wonjun Jung (KokoseiJ)
+#
+#    Nicobot is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+
+
+import time
+from threading import Lock
+from collections import OrderedDict
+
+__all__ = ["MessageCache"]
+
+
+class MessageCache:
+    """LRU cache of messages, populated from gateway events.
+
+    Messages are kept in a single LRU order shared across channels, and each
+    channel additionally keeps its own LRU order so that one busy channel
+    can't push every other channel's messages out of the cache.
+
+    This cache is opt-in. Enable it with client.set_message_cache method.
+
+    Attributes:
+        max_messages:
+            Maximum amount of messages to be stored in total.
+        max_per_channel:
+            Maximum amount of messages to be stored per channel. None for no
+            per-channel limit.
+        ttl:
+            Seconds after which a stored message is considered stale. None
+            for no expiration.
+        hits:
+            Amount of lookups served from the cache.
+        misses:
+            Amount of lookups that weren't found, or were expired.
+    """
+    def __init__(self, max_messages=1000, max_per_channel=100, ttl=None):
+        self.max_messages = max_messages
+        self.max_per_channel = max_per_channel
+        self.ttl = ttl
+
+        self.hits = 0
+        self.misses = 0
+
+        self._messages = OrderedDict()
+        self._channels = {}
+        self._lock = Lock()
+
+    def get(self, id_):
+        """Returns cached message with the id, or None if there isn't one."""
+        with self._lock:
+            entry = self._messages.get(id_)
+            if entry is None:
+                self.misses += 1
+                return None
+
+            message, stored_at = entry
+            if self._is_expired(stored_at):
+                self._remove(id_)
+                self.misses += 1
+                return None
+
+            self._messages.move_to_end(id_)
+            self._channels[message.channel_id].move_to_end(id_)
+            self.hits += 1
+
+            return message
+
+    def peek(self, id_):
+        """Same as .get, but doesn't count as a lookup or refresh the LRU."""
+        entry = self._messages.get(id_)
+        if entry is None or self._is_expired(entry[1]):
+            return None
+        return entry[0]
+
+    def put(self, message):
+        """Stores message, evicting least recently used ones if needed."""
+        if message.id is None or message.channel_id is None:
+            return
+
+        with self._lock:
+            id_ = message.id
+            channel_id = message.channel_id
+
+            self._messages[id_] = (message, time.monotonic())
+            self._messages.move_to_end(id_)
+
+            channel = self._channels.setdefault(channel_id, OrderedDict())
+            channel[id_] = None
+            channel.move_to_end(id_)
+
+            if self.max_per_channel is not None:
+                while len(channel) > self.max_per_channel:
+                    self._remove(next(iter(channel)))
+
+            while len(self._messages) > self.max_messages:
+                self._remove(next(iter(self._messages)))
+
+            self._evict_expired()
+
+    def update(self, payload):
+        """Merges partial MESSAGE_UPDATE payload into the cached message.
+
+        Returns:
+            Updated Message object, or None if it wasn't cached.
+        """
+        with self._lock:
+            entry = self._messages.get(payload.get("id"))
+            if entry is None or self._is_expired(entry[1]):
+                return None
+            message = entry[0]
+            message._update(payload)
+
+            return message
+
+    def remove(self, id_):
+        """Removes message from the cache, returns it if it was cached."""
+        with self._lock:
+            return self._remove(id_)
+
+    def remove_channel(self, channel_id):
+        """Removes every message in the channel from the cache."""
+        with self._lock:
+            channel = self._channels.get(channel_id)
+            if channel is None:
+                return
+            for id_ in list(channel):
+                self._remove(id_)
+
+    def clear(self):
+        with self._lock:
+            self._messages.clear()
+            self._channels.clear()
+
+    def get_stats(self):
+        """Returns dict of current size and hit/miss statistics."""
+        lookups = self.hits + self.misses
+        return {
+            "messages": len(self._messages),
+            "channels": len(self._channels),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0
+        }
+
+    def _remove(self, id_):
+        entry = self._messages.pop(id_, None)
+        if entry is None:
+            return None
+        message = entry[0]
+
+        channel = self._channels.get(message.channel_id)
+        if channel is not None:
+            channel.pop(id_, None)
+            if not channel:
+                del self._channels[message.channel_id]
+
+        return message
+
+    def _is_expired(self, stored_at):
+        return self.ttl is not None and \
+            time.monotonic() - stored_at > self.ttl
+
+    def _evict_expired(self):
+        """Drops expired messages from the least recently used end.
+
+        Only the front of the LRU order is checked, so this stays cheap.
+        Expired messages elsewhere get dropped when they're looked up.
+        """
+        if self.ttl is None:
+            return
+
+        while self._messages:
+            id_, (_, stored_at) = next(iter(self._messages.items()))
+            if not self._is_expired(stored_at):
+                break
+            self._remove(id_)
+
+    def __len__(self):
+        return len(self._messages)
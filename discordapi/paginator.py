@@ -0,0 +1,118 @@
+#
+# NicoBot is Nicovideo Player bot for Discord, written from the scratch.
+# This file is part of NicoBot.
+#
+# Copyright (C) 2021 Wonjun Jung (KokoseiJ)
+#
+#    Nicobot is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+
+from .const import EMPTY
+
+from threading import Thread
+
+__all__ = ["Paginator"]
+
+
+class _PageFetch:
+    """Fetches a page, in a background thread if asked to."""
+    def __init__(self, fetch, cursor, count, background):
+        self.fetch = fetch
+        self.cursor = cursor
+        self.count = count
+        self.value = None
+        self.error = None
+        self.thread = None
+
+        if background:
+            self.thread = Thread(target=self.run)
+            self.thread.daemon = True
+            self.thread.start()
+        else:
+            self.run()
+
+    def run(self):
+        try:
+            self.value = self.fetch(self.cursor, self.count)
+        except Exception as e:
+            self.error = e
+
+    def result(self):
+        if self.thread is not None:
+            self.thread.join()
+        if self.error is not None:
+            raise self.error
+        return self.value
+
+
+class Paginator:
+    """Iterable going through paginated API results lazily.
+
+    Pages are fetched only as they're needed, and while the items of a page
+    are being processed, the next page gets fetched in the background. At
+    most two pages are held at once, so that going through any amount of
+    items takes constant memory. Requests go through client.send_request,
+    which waits for the rate limit of the route.
+
+    Attributes:
+        fetch:
+            function receiving cursor and the amount of items to fetch,
+            returning tuple of (items, next cursor).
+        page_size:
+            Maximum amount of items the API returns per request.
+        limit:
+            Maximum amount of items to yield in total. None for no limit.
+        cursor:
+            Cursor to start fetching from. EMPTY to start from the beginning.
+        prefetch:
+            Whether to fetch the next page in the background.
+    """
+    def __init__(self, fetch, page_size, limit=None, cursor=EMPTY,
+                 prefetch=True):
+        self.fetch = fetch
+        self.page_size = page_size
+        self.limit = limit
+        self.cursor = cursor
+        self.prefetch = prefetch
+
+    def __iter__(self):
+        remaining = self.limit
+        if remaining is not None and remaining <= 0:
+            return
+
+        page = _PageFetch(
+            self.fetch, self.cursor, self._get_count(remaining), False)
+
+        while page is not None:
+            items, cursor = page.result()
+            done = len(items) < page.count
+            if remaining is not None:
+                remaining -= len(items)
+                done = done or remaining <= 0
+
+            if done:
+                page = None
+            else:
+                page = _PageFetch(
+                    self.fetch, cursor, self._get_count(remaining),
+                    self.prefetch
+                )
+
+            for item in items:
+                yield item
+
+    def _get_count(self, remaining):
+        if remaining is None:
+            return self.page_size
+        return min(self.page_size, remaining)
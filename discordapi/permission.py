@@ -0,0 +1,235 @@
+#
+# NicoBot is Nicovideo Player bot for Discord, written from the scratch.
+# This file is part of NicoBot.
+#
+# Copyright (C) 2021 Wonjun Jung (KokoseiJ)
+#
+#    Nicobot is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+
+
+from threading import Lock
+
+__all__ = ["PermissionResolver"]
+
+CREATE_INSTANT_INVITE = 1 << 0
+KICK_MEMBERS = 1 << 1
+BAN_MEMBERS = 1 << 2
+ADMINISTRATOR = 1 << 3
+MANAGE_CHANNELS = 1 << 4
+MANAGE_GUILD = 1 << 5
+ADD_REACTIONS = 1 << 6
+VIEW_AUDIT_LOG = 1 << 7
+PRIORITY_SPEAKER = 1 << 8
+STREAM = 1 << 9
+VIEW_CHANNEL = 1 << 10
+SEND_MESSAGES = 1 << 11
+SEND_TTS_MESSAGES = 1 << 12
+MANAGE_MESSAGES = 1 << 13
+EMBED_LINKS = 1 << 14
+ATTACH_FILES = 1 << 15
+READ_MESSAGE_HISTORY = 1 << 16
+MENTION_EVERYONE = 1 << 17
+USE_EXTERNAL_EMOJIS = 1 << 18
+VIEW_GUILD_INSIGHTS = 1 << 19
+CONNECT = 1 << 20
+SPEAK = 1 << 21
+MUTE_MEMBERS = 1 << 22
+DEAFEN_MEMBERS = 1 << 23
+MOVE_MEMBERS = 1 << 24
+USE_VAD = 1 << 25
+CHANGE_NICKNAME = 1 << 26
+MANAGE_NICKNAMES = 1 << 27
+MANAGE_ROLES = 1 << 28
+MANAGE_WEBHOOKS = 1 << 29
+MANAGE_EMOJIS_AND_STICKERS = 1 << 30
+USE_APPLICATION_COMMANDS = 1 << 31
+REQUEST_TO_SPEAK = 1 << 32
+MANAGE_THREADS = 1 << 34
+USE_PUBLIC_THREADS = 1 << 35
+USE_PRIVATE_THREADS = 1 << 36
+USE_EXTERNAL_STICKERS = 1 << 37
+
+ALL_PERMISSIONS = (1 << 38) - 1
+
+ROLE_OVERWRITE = 0
+MEMBER_OVERWRITE = 1
+
+
+class PermissionResolver:
+    """Computes effective permissions of members, memoizing the results.
+
+    Results are cached per guild, and per channel for channel permissions.
+    Gateway invalidates them when roles, channels, members or the guild
+    itself get updated, so the resolver never has to be told about changes
+    made by the events.
+
+    Every guild has a generation, bumped by the invalidations. Results are
+    only stored if the generation didn't change while they were computed,
+    so that an event handled in the middle of a computation doesn't leave
+    a stale result cached.
+
+    Permissions are returned as int- check for a flag with bitwise and, like
+    `perms & permission.SEND_MESSAGES`.
+    """
+    def __init__(self):
+        self._base = {}
+        self._channel = {}
+        self._generations = {}
+        # Bumped by clear, as it leaves the generations of the guilds as-is
+        self._epoch = 0
+        self._lock = Lock()
+
+    def compute_base(self, member, guild=None):
+        """Returns guild-wide permissions of the member."""
+        if guild is None:
+            guild = member.guild
+        user_id = member.user.id
+
+        base = self._base.get(guild.id)
+        if base is not None:
+            perms = base.get(user_id)
+            if perms is not None:
+                return perms
+
+        generation = self._get_generation(guild.id)
+        perms = self._compute_base(guild, member)
+
+        with self._lock:
+            if generation == self._get_generation(guild.id):
+                self._base.setdefault(guild.id, {})[user_id] = perms
+
+        return perms
+
+    def compute(self, member, channel, guild=None):
+        """Returns permissions of the member in the channel."""
+        if guild is None:
+            guild = member.guild
+        user_id = member.user.id
+
+        channels = self._channel.get(guild.id)
+        if channels is not None:
+            perms = channels.get(channel.id, {}).get(user_id)
+            if perms is not None:
+                return perms
+
+        generation = self._get_generation(guild.id)
+        perms = self._compute_overwrites(
+            guild, member, channel, self.compute_base(member, guild)
+        )
+
+        with self._lock:
+            if generation == self._get_generation(guild.id):
+                self._channel.setdefault(guild.id, {}) \
+                    .setdefault(channel.id, {})[user_id] = perms
+
+        return perms
+
+    def has(self, member, flag, channel=None):
+        """Returns whether the member has every permission in flag."""
+        if channel is None:
+            perms = self.compute_base(member)
+        else:
+            perms = self.compute(member, channel)
+        return perms & flag == flag
+
+    def invalidate_guild(self, guild_id):
+        with self._lock:
+            self._bump_generation(guild_id)
+            self._base.pop(guild_id, None)
+            self._channel.pop(guild_id, None)
+
+    def invalidate_channel(self, guild_id, channel_id):
+        with self._lock:
+            self._bump_generation(guild_id)
+            channels = self._channel.get(guild_id)
+            if channels is not None:
+                channels.pop(channel_id, None)
+
+    def invalidate_member(self, guild_id, user_id):
+        with self._lock:
+            self._bump_generation(guild_id)
+            base = self._base.get(guild_id)
+            if base is not None:
+                base.pop(user_id, None)
+            for users in self._channel.get(guild_id, {}).values():
+                users.pop(user_id, None)
+
+    def clear(self):
+        with self._lock:
+            self._epoch += 1
+            self._base.clear()
+            self._channel.clear()
+
+    def _get_generation(self, guild_id):
+        return self._epoch, self._generations.get(guild_id, 0)
+
+    def _bump_generation(self, guild_id):
+        self._generations[guild_id] = self._generations.get(guild_id, 0) + 1
+
+    def _compute_base(self, guild, member):
+        if guild.owner_id == member.user.id:
+            return ALL_PERMISSIONS
+
+        role_map = guild.role_map
+        everyone = role_map.get(guild.id)
+        perms = int(everyone['permissions']) if everyone is not None else 0
+
+        for role_id in member.roles or ():
+            role = role_map.get(role_id)
+            if role is not None:
+                perms |= int(role['permissions'])
+
+        if perms & ADMINISTRATOR:
+            return ALL_PERMISSIONS
+
+        return perms
+
+    def _compute_overwrites(self, guild, member, channel, base):
+        if base & ADMINISTRATOR:
+            return ALL_PERMISSIONS
+
+        overwrites = {
+            overwrite['id']: overwrite
+            for overwrite in channel.permission_overwrites or ()
+        }
+        perms = base
+
+        everyone = overwrites.get(guild.id)
+        if everyone is not None:
+            perms &= ~int(everyone['deny'])
+            perms |= int(everyone['allow'])
+
+        allow = 0
+        deny = 0
+        for role_id in member.roles or ():
+            overwrite = overwrites.get(role_id)
+            if overwrite is not None and \
+                    int(overwrite['type']) == ROLE_OVERWRITE:
+                allow |= int(overwrite['allow'])
+                deny |= int(overwrite['deny'])
+        perms &= ~deny
+        perms |= allow
+
+        overwrite = overwrites.get(member.user.id)
+        if overwrite is not None and \
+                int(overwrite['type']) == MEMBER_OVERWRITE:
+            perms &= ~int(overwrite['deny'])
+            perms |= int(overwrite['allow'])
+
+        # Members who can't see the channel can't do anything else in there
+        if not perms & VIEW_CHANNEL:
+            return 0
+
+        return perms
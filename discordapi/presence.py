@@ -0,0 +1,212 @@
+#
+# NicoBot is Nicovideo Player bot for Discord, written from the scratch.
+# This file is part of NicoBot.
+#
+# Copyright (C) 2021 Wonjun Jung (KokoseiJ)
+#
+#    Nicobot is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+
+from array import array
+from bisect import bisect_left
+from heapq import merge
+from threading import Lock
+from collections import OrderedDict
+
+__all__ = ["PresenceStore"]
+
+STATUSES = ("offline", "online", "idle", "dnd")
+STATUS_CODES = {status: code for code, status in enumerate(STATUSES)}
+OFFLINE = 0
+
+
+class PresenceStore:
+    """Compact store of user presences, populated from gateway events.
+
+    User ids are kept packed in a sorted array of 64-bit ints, with the
+    status of each one as a single byte in a parallel array, so a stored
+    user costs 9 bytes instead of a dict entry and two int objects. Users
+    are looked up by binary search.
+
+    Users seen for the first time go to a small dict, which is merged into
+    the arrays once it holds merge_threshold users, or an eighth of the
+    arrays if that's more. Users going offline are marked offline in place
+    and dropped with the next merge.
+
+    Discord sends the same status of a user to every guild, so presences
+    are stored per user, and which guilds they came from isn't kept.
+    guilds only filters the presences to store, and there's no way to look
+    up the users of a guild. Use guild.members with the store for that.
+
+    Activities are much bigger than the status, so they're only kept for
+    the max_activities most recently updated users, if enabled at all.
+
+    This store is opt-in. Enable it with client.set_presence_store method,
+    and add GUILD_PRESENCES intent (1 << 8) to the client's intents.
+
+    Attributes:
+        guilds:
+            set of guild ids to store presences from. None to store
+            presences from every guild.
+        max_activities:
+            Maximum amount of users to keep activities of. 0 to not store
+            activities.
+        merge_threshold:
+            Minimum amount of new users to collect before merging them into
+            the arrays.
+    """
+    def __init__(self, guilds=None, max_activities=0, merge_threshold=1024):
+        self.guilds = set(guilds) if guilds is not None else None
+        self.max_activities = max_activities
+        self.merge_threshold = merge_threshold
+
+        self._ids = array("Q")
+        self._status = array("B")
+        # Users not merged into the arrays yet, user id -> status code
+        self._pending = {}
+        # Amount of users in the arrays marked offline
+        self._offline = 0
+        self._activities = OrderedDict()
+        self._lock = Lock()
+
+    def check(self, guild_id):
+        """Returns if presences from the guild should be stored."""
+        return self.guilds is None or guild_id in self.guilds
+
+    def update(self, payload):
+        """Stores PRESENCE_UPDATE payload, or presence from GUILD_CREATE.
+
+        Returns:
+            True if the presence got stored, False if it was filtered out.
+        """
+        if not self.check(payload.get("guild_id")):
+            return False
+
+        user_id = int(payload['user']['id'])
+        status = STATUS_CODES.get(payload.get("status"), OFFLINE)
+
+        with self._lock:
+            self._set_status(user_id, status)
+            if status == OFFLINE:
+                self._activities.pop(user_id, None)
+            elif self.max_activities:
+                activities = payload.get("activities")
+                if activities:
+                    self._activities[user_id] = activities
+                    self._activities.move_to_end(user_id)
+                    while len(self._activities) > self.max_activities:
+                        self._activities.popitem(last=False)
+                else:
+                    self._activities.pop(user_id, None)
+
+        return True
+
+    def get_status(self, user_id):
+        """Returns status string of the user, "offline" if unknown."""
+        with self._lock:
+            return STATUSES[self._get_status(int(user_id))]
+
+    def get_activities(self, user_id):
+        """Returns list of the user's activities, or None if not stored."""
+        with self._lock:
+            return self._activities.get(int(user_id))
+
+    def is_online(self, user_id):
+        with self._lock:
+            return self._get_status(int(user_id)) != OFFLINE
+
+    def remove(self, user_id):
+        """Forgets presence of the user."""
+        user_id = int(user_id)
+        with self._lock:
+            self._set_status(user_id, OFFLINE)
+            self._activities.pop(user_id, None)
+
+    def clear(self):
+        with self._lock:
+            self._ids = array("Q")
+            self._status = array("B")
+            self._pending.clear()
+            self._offline = 0
+            self._activities.clear()
+
+    def get_stats(self):
+        """Returns dict of amount of users per status and the table size."""
+        counts = dict.fromkeys(STATUSES[1:], 0)
+        with self._lock:
+            for status in self._status:
+                if status != OFFLINE:
+                    counts[STATUSES[status]] += 1
+            for status in self._pending.values():
+                counts[STATUSES[status]] += 1
+
+            counts.update({
+                "packed": len(self._ids),
+                "pending": len(self._pending),
+                "activities": len(self._activities)
+            })
+        return counts
+
+    def _find(self, user_id):
+        """Returns index of the user in the arrays, -1 if not in there."""
+        index = bisect_left(self._ids, user_id)
+        if index < len(self._ids) and self._ids[index] == user_id:
+            return index
+        return -1
+
+    def _get_status(self, user_id):
+        status = self._pending.get(user_id)
+        if status is not None:
+            return status
+        index = self._find(user_id)
+        return self._status[index] if index != -1 else OFFLINE
+
+    def _set_status(self, user_id, status):
+        index = self._find(user_id)
+        if index != -1:
+            prev = self._status[index]
+            self._status[index] = status
+            self._offline += (status == OFFLINE) - (prev == OFFLINE)
+        elif status == OFFLINE:
+            self._pending.pop(user_id, None)
+        else:
+            self._pending[user_id] = status
+
+        if len(self._pending) >= max(self.merge_threshold,
+                                     len(self._ids) // 8) or \
+                self._offline > len(self._ids) // 2 + self.merge_threshold:
+            self._merge()
+
+    def _merge(self):
+        """Merges the new users into the arrays, dropping offline ones."""
+        users = merge(
+            zip(self._ids, self._status), sorted(self._pending.items()))
+        ids = array("Q")
+        statuses = array("B")
+        for user_id, status in users:
+            if status != OFFLINE:
+                ids.append(user_id)
+                statuses.append(status)
+
+        self._ids = ids
+        self._status = statuses
+        self._pending.clear()
+        self._offline = 0
+
+    def _get_count(self):
+        return len(self._ids) - self._offline + len(self._pending)
+
+    def __len__(self):
+        with self._lock:
+            return self._get_count()
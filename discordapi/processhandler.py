@@ -0,0 +1,411 @@
+#
+# NicoBot is Nicovideo Player bot for Discord, written from the scratch.
+# This file is part of NicoBot.
+#
+# Copyright (C) 2021 Wonjun Jung (KokoseiJ)
+#
+#    Nicobot is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+
+from .const import LIB_NAME, API_URL
+from .client import DiscordClient
+from .handler import EventHandler
+from .memberpolicy import CacheNoMembers
+from .exceptions import DiscordError, DiscordHTTPError
+
+import os
+import json
+import logging
+import itertools
+import multiprocessing
+from threading import Thread, Event, Lock
+from concurrent.futures import ThreadPoolExecutor
+
+__all__ = ["ProcessPoolEventHandler", "WorkerClient"]
+
+logger = logging.getLogger(LIB_NAME)
+
+# Routing modes of ProcessPoolEventHandler
+ROUND_ROBIN = "round_robin"
+GUILD = "guild"
+
+# Events every worker needs to keep its guild and channel cache usable when
+# the events are routed round-robin.
+STRUCTURE_EVENTS = frozenset((
+    "GUILD_CREATE", "GUILD_UPDATE", "GUILD_DELETE", "CHANNEL_CREATE",
+    "CHANNEL_UPDATE", "CHANNEL_DELETE", "GUILD_ROLE_CREATE",
+    "GUILD_ROLE_UPDATE", "GUILD_ROLE_DELETE"
+))
+GUILD_ID_EVENTS = frozenset(("GUILD_CREATE", "GUILD_UPDATE", "GUILD_DELETE"))
+# GUILD_CREATE fields not kept for the replay, as the workers don't cache them
+REPLAY_SKIP_KEYS = frozenset(("members", "presences", "voice_states"))
+
+
+class WorkerClient(DiscordClient):
+    """Client running in the worker processes of ProcessPoolEventHandler.
+
+    It never connects to the gateway. Events are fed from the parent
+    process, and REST requests and gateway payloads are forwarded to the
+    parent's client over a pipe, so that every worker shares the parent's
+    connections and rate limits. The token never leaves the parent.
+
+    Only guilds and channels are cached, members are left out to keep the
+    workers lightweight.
+    """
+    def __init__(self, conn, handler, name="worker"):
+        super(WorkerClient, self).__init__(
+            token=None, handler=handler, name=name)
+        self.set_member_cache_policy(CacheNoMembers)
+
+        self._conn = conn
+        self._conn_lock = Lock()
+        self._calls = {}
+        self._call_ids = itertools.count()
+
+        self._receive_thread = Thread(
+            target=self._receive_loop, name=f"{name}_rpc")
+        self._receive_thread.daemon = True
+        self._receive_thread.start()
+
+    def send_request(self, method, route, data=None, expected_code=None,
+                     raise_at_exc=True, baseurl=API_URL, headers=None):
+        return self._call(
+            "send_request", method, route, data, expected_code,
+            raise_at_exc, baseurl, headers
+        )
+
+    def send(self, data):
+        return self._call("send", data)
+
+    def _call(self, name, *args):
+        call_id = next(self._call_ids)
+        slot = [Event(), None]
+        self._calls[call_id] = slot
+
+        try:
+            with self._conn_lock:
+                self._conn.send((call_id, name, args))
+        except OSError:
+            del self._calls[call_id]
+            raise DiscordError("Lost connection to the parent process.")
+
+        slot[0].wait()
+        result, error = slot[1]
+        if error is None:
+            return result
+        elif error[0] == "http":
+            raise DiscordHTTPError(error[1], error[2], None)
+        else:
+            raise DiscordError(error[1])
+
+    def _receive_loop(self):
+        while True:
+            try:
+                call_id, result, error = self._conn.recv()
+            except (EOFError, OSError):
+                break
+            slot = self._calls.pop(call_id, None)
+            if slot is not None:
+                slot[1] = (result, error)
+                slot[0].set()
+
+        for slot in list(self._calls.values()):
+            slot[1] = (None, ("error", "Lost connection to the parent."))
+            slot[0].set()
+
+
+def _worker_main(handler, events, conn, name):
+    client = WorkerClient(conn, handler, name)
+
+    while True:
+        try:
+            data = events.recv_bytes()
+        except (EOFError, OSError):
+            break
+
+        deliver = data[:1] == b"1"
+        event, payload = json.loads(data[1:])
+        try:
+            obj = client.event_parser._handle(event, payload)
+            if deliver:
+                client.handler.handle(event, obj)
+        except Exception:
+            logger.exception(f"Exception occured while handling {event}.")
+
+    client.stop_flag.set()
+
+
+class _Worker:
+    def __init__(self, process, events, conn):
+        self.process = process
+        self.events = events
+        self.conn = conn
+        self.conn_lock = Lock()
+
+
+class ProcessPoolEventHandler(EventHandler):
+    """Handler running another EventHandler in worker processes.
+
+    Events are sent to the workers as raw JSON before being parsed in the
+    gateway process, and each worker rebuilds the objects with its own
+    WorkerClient. REST requests made in the workers are sent back and run by
+    this process' client. This lets CPU-heavy handlers run without sharing
+    the GIL with the gateway.
+
+    handler should be an EventHandler subclass importable by the workers,
+    e.g. a MethodEventHandler subclass defined at module level. It gets
+    instantiated in every worker.
+
+    Workers that have died are restarted when the next event is routed to
+    them, and receive READY and the GUILD_CREATE of their guilds again,
+    kept up to date with the guild, channel and role events since. Other
+    events sent to a worker before it died are lost.
+
+    Attributes:
+        handler:
+            EventHandler subclass to be run in the workers.
+        workers:
+            Amount of worker processes.
+        routing:
+            "round_robin" to spread events evenly, or "guild" to send every
+            event of a guild to the same worker. Workers only cache guilds
+            routed to them in "guild" mode, while every worker receives
+            guild and channel events in "round_robin" mode.
+        restarts:
+            Amount of times a worker has been restarted.
+        rpc_threads:
+            Maximum amount of threads running the workers' requests.
+    """
+    def __init__(self, handler, workers=None, routing=ROUND_ROBIN,
+                 client=None, context="spawn", rpc_threads=16):
+        if routing not in (ROUND_ROBIN, GUILD):
+            raise ValueError(f"Unknown routing '{routing}'")
+        if not issubclass(handler, EventHandler):
+            raise TypeError("handler should be EventHandler subclass, "
+                            f"not '{handler}'")
+        super(ProcessPoolEventHandler, self).__init__(client)
+
+        self.handler = handler
+        self.workers = workers or os.cpu_count() or 1
+        self.routing = routing
+        self.restarts = 0
+        self.rpc_threads = rpc_threads
+
+        self._context = multiprocessing.get_context(context)
+        self._workers = [None] * self.workers
+        self._round_robin = itertools.cycle(range(self.workers))
+        self._ready = None
+        # Raw GUILD_CREATE of every guild, to be replayed to new workers
+        self._guilds = {}
+        self._executor = None
+        self._executor_lock = Lock()
+
+    def start(self):
+        """Starts the workers. Called automatically with the first event."""
+        for index in range(self.workers):
+            if self._workers[index] is None:
+                self._start_worker(index)
+
+    def stop(self):
+        """Stops the workers, letting them finish queued events."""
+        for index, worker in enumerate(self._workers):
+            if worker is None:
+                continue
+            worker.events.close()
+            worker.process.join(5)
+            if worker.process.is_alive():
+                worker.process.terminate()
+            worker.conn.close()
+            self._workers[index] = None
+
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
+            self._executor = None
+
+    def handle_raw(self, event, payload):
+        data = json.dumps([event, payload]).encode()
+        index = self._route(event, payload)
+
+        if event == "READY":
+            self._ready = data
+            # New session sends GUILD_CREATE of every guild again
+            self._guilds.clear()
+        elif self.routing == GUILD and index is not None:
+            self._send(index, True, data)
+        elif self.routing == GUILD or event not in STRUCTURE_EVENTS:
+            self._send(next(self._round_robin), True, data)
+
+        if event == "READY" or \
+                self.routing != GUILD and event in STRUCTURE_EVENTS:
+            # Broadcast, letting only one of the workers handle it
+            deliver = next(self._round_robin)
+            for index in range(self.workers):
+                self._send(index, index == deliver, data)
+
+        # After sending, so that a restarted worker doesn't get it twice
+        if event in STRUCTURE_EVENTS:
+            self._update_guild(event, payload)
+
+    def handle(self, event, obj):
+        # Events are handled in the workers
+        pass
+
+    def _update_guild(self, event, payload):
+        """Applies the event to the GUILD_CREATE kept for the replay."""
+        if event == "GUILD_CREATE":
+            self._guilds[payload['id']] = {
+                key: value for key, value in payload.items()
+                if key not in REPLAY_SKIP_KEYS
+            }
+            return
+        elif event == "GUILD_DELETE":
+            self._guilds.pop(payload['id'], None)
+            return
+
+        guild_id = payload.get("guild_id") if event != "GUILD_UPDATE" \
+            else payload.get("id")
+        guild = self._guilds.get(guild_id)
+        if guild is None:
+            return
+
+        if event == "GUILD_UPDATE":
+            guild.update(payload)
+        elif event.startswith("CHANNEL_"):
+            guild['channels'] = self._replace(
+                guild.get("channels", ()), payload['id'],
+                None if event == "CHANNEL_DELETE" else payload
+            )
+        elif event == "GUILD_ROLE_DELETE":
+            guild['roles'] = self._replace(
+                guild.get("roles", ()), payload['role_id'], None)
+        else:
+            guild['roles'] = self._replace(
+                guild.get("roles", ()), payload['role']['id'],
+                payload['role']
+            )
+
+    @staticmethod
+    def _replace(items, id_, new):
+        """Returns copy of items with the one with id_ replaced by new."""
+        items = [item for item in items if item.get("id") != id_]
+        if new is not None:
+            items.append(new)
+        return items
+
+    def _route(self, event, payload):
+        if not isinstance(payload, dict):
+            return None
+        guild_id = payload.get("guild_id")
+        if guild_id is None and event in GUILD_ID_EVENTS:
+            guild_id = payload.get("id")
+        if guild_id is None:
+            return None
+        return int(guild_id) % self.workers
+
+    def _send(self, index, deliver, data):
+        worker = self._workers[index]
+        if worker is None or not worker.process.is_alive():
+            worker = self._restart_worker(index)
+
+        data = (b"1" if deliver else b"0") + data
+        try:
+            worker.events.send_bytes(data)
+        except OSError:
+            worker = self._restart_worker(index)
+            worker.events.send_bytes(data)
+
+    def _restart_worker(self, index):
+        worker = self._workers[index]
+        if worker is not None:
+            logger.warning(f"Worker {index} has died, restarting...")
+            self.restarts += 1
+            worker.events.close()
+            worker.conn.close()
+        return self._start_worker(index)
+
+    def _start_worker(self, index):
+        events_recv, events_send = self._context.Pipe(duplex=False)
+        conn, child_conn = self._context.Pipe()
+        name = f"{self.client.name}_worker_{index}"
+
+        process = self._context.Process(
+            target=_worker_main,
+            args=(self.handler, events_recv, child_conn, name),
+            name=name
+        )
+        process.daemon = True
+        process.start()
+        events_recv.close()
+        child_conn.close()
+
+        worker = _Worker(process, events_send, conn)
+        self._workers[index] = worker
+
+        thread = Thread(
+            target=self._rpc_loop, args=(worker,), name=f"{name}_rpc")
+        thread.daemon = True
+        thread.start()
+
+        if self._ready is not None:
+            events_send.send_bytes(b"0" + self._ready)
+            for guild_id, guild in list(self._guilds.items()):
+                if self.routing == GUILD and \
+                        int(guild_id) % self.workers != index:
+                    continue
+                events_send.send_bytes(
+                    b"0" + json.dumps(["GUILD_CREATE", guild]).encode())
+
+        return worker
+
+    def _rpc_loop(self, worker):
+        while True:
+            try:
+                call_id, name, args = worker.conn.recv()
+            except (EOFError, OSError):
+                break
+            # Requests can wait on rate limits, so they run in parallel
+            self._get_executor().submit(
+                self._run_call, worker, call_id, name, args)
+
+    def _get_executor(self):
+        executor = self._executor
+        if executor is None:
+            with self._executor_lock:
+                if self._executor is None:
+                    self._executor = ThreadPoolExecutor(
+                        self.rpc_threads,
+                        thread_name_prefix=f"{self.client.name}_rpc"
+                    )
+                executor = self._executor
+        return executor
+
+    def _run_call(self, worker, call_id, name, args):
+        result = error = None
+        try:
+            if name == "send_request":
+                result = self.client.send_request(*args)
+            elif name == "send":
+                self.client.send(*args)
+            else:
+                raise DiscordError(f"Unknown call '{name}'")
+        except DiscordHTTPError as e:
+            error = ("http", e.code, e.message)
+        except Exception as e:
+            error = ("error", repr(e))
+
+        try:
+            with worker.conn_lock:
+                worker.conn.send((call_id, result, error))
+        except OSError:
+            pass
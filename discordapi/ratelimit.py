@@ -19,6 +19,7 @@
 #
 
 from .const import LIB_NAME
+from .util import get_route_template
 
 import time
 import logging
@@ -62,36 +63,56 @@ class RateLimitHandler:
                 del self.limit_list[route]
                 self.limit_list[bucket] = limit
 
-        logger.info(f"Registered {bucket} to {route}")
+        logger.info(f"Registered {bucket} to {get_route_template(route)}")
 
-    def set_limit(self, route, limit):
-        """Sets 429 Rate Limit in action."""
+    def set_limit(self, route, limit, warn=True):
+        """Sets Rate Limit in action.
+
+        warn should be False when the limit is set ahead of time from the
+        headers, rather than from 429 response.
+        """
+        # Routes can contain webhook tokens, which shouldn't be logged
+        name = route if route == "global" else get_route_template(route)
         if route in self.bucket_map:
             route = self.bucket_map[route]
 
-        logger.warning(f"You are being rate limited in {route} until {limit}!")
+        if warn:
+            logger.warning(
+                f"You are being rate limited in {name} until {limit}!")
+        else:
+            logger.debug(f"Bucket of {name} is exhausted until {limit}.")
 
         with self.limit_list_lock:
             self.limit_list[route] = limit
 
-    def check(self, route):
-        """Checks if limit is ongoing, and wait until it no longer is."""
+    def check(self, route, timeout=None):
+        """Checks if limit is ongoing, and wait until it no longer is.
+
+        Returns:
+            True without waiting if the limit lasts longer than timeout
+            seconds, False otherwise.
+        """
         if route[0] != "/":
             route = f"/{route}"
         if route in self.bucket_map:
             route = self.bucket_map[route]
-        
+
         limit = self.limit_list.get(route)
+        global_limit = self.limit_list.get("global")
+        if timeout is not None:
+            end = max(limit or 0, global_limit or 0)
+            if end - time.time() > timeout:
+                return True
+
         if limit:
             self._wait(limit)
             self._reset_limit(route, limit)
 
-        global_limit = self.limit_list.get("global")
         if global_limit:
             self._wait(global_limit)
             self._reset_limit("global", global_limit)
 
-        return False  
+        return False
 
     def _wait(self, limit):
         now = time.time()
@@ -0,0 +1,237 @@
+#
+# NicoBot is Nicovideo Player bot for Discord, written from the scratch.
+# This file is part of NicoBot.
+#
+# Copyright (C) 2021 Wonjun Jung (KokoseiJ)
+#
+#    Nicobot is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+
+from .util import get_route_template
+
+import copy
+import time
+from threading import Lock, Event
+from collections import OrderedDict
+
+__all__ = ["ResponseCache"]
+
+# Seconds to cache responses of the route templates for
+DEFAULT_TTLS = {
+    "/users/{id}": 60,
+    "/users/@me": 60,
+    "/channels/{id}": 10,
+    "/guilds/{id}": 10,
+    "/guilds/{id}/roles": 10,
+    "/guilds/{id}/channels": 10,
+    "/guilds/{id}/members/{id}": 10,
+    "/channels/{id}/messages/{id}": 10
+}
+
+
+def get_invalidated_paths(event, payload):
+    """Returns list of paths whose responses the gateway event outdates."""
+    if not isinstance(payload, dict):
+        return ()
+
+    guild_id = payload.get("guild_id")
+    user = payload.get("user") or {}
+
+    if event in ("GUILD_UPDATE", "GUILD_DELETE"):
+        id_ = payload.get("id")
+        return (f"/guilds/{id_}", f"/guilds/{id_}/roles",
+                f"/guilds/{id_}/channels")
+    elif event.startswith("GUILD_ROLE_"):
+        return (f"/guilds/{guild_id}/roles",)
+    elif event.startswith("CHANNEL_"):
+        return (f"/channels/{payload.get('id')}",
+                f"/guilds/{guild_id}/channels")
+    elif event in ("GUILD_MEMBER_ADD", "GUILD_MEMBER_UPDATE",
+                   "GUILD_MEMBER_REMOVE"):
+        return (f"/guilds/{guild_id}/members/{user.get('id')}",
+                f"/users/{user.get('id')}")
+    elif event in ("GUILD_BAN_ADD", "GUILD_BAN_REMOVE"):
+        return (f"/guilds/{guild_id}/bans/{user.get('id')}",
+                f"/guilds/{guild_id}/members/{user.get('id')}")
+    elif event in ("MESSAGE_UPDATE", "MESSAGE_DELETE"):
+        return (
+            f"/channels/{payload.get('channel_id')}/messages/"
+            f"{payload.get('id')}",
+        )
+    elif event == "MESSAGE_DELETE_BULK":
+        channel_id = payload.get("channel_id")
+        return tuple(
+            f"/channels/{channel_id}/messages/{id_}"
+            for id_ in payload.get("ids", ())
+        )
+    elif event == "USER_UPDATE":
+        return ("/users/@me", f"/users/{payload.get('id')}")
+
+    return ()
+
+
+def get_written_paths(path):
+    """Returns list of paths whose responses a non-GET request outdates.
+
+    These are the path itself and its ancestors, as writing a resource
+    changes the collection it is in and the object holding it, e.g. PUT on
+    /guilds/1/members/2/roles/3 changes /guilds/1/members/2.
+    """
+    parts = path.strip("/").split("/")
+    return [
+        "/" + "/".join(parts[:index]) for index in range(len(parts), 0, -1)
+    ]
+
+
+class _InFlight:
+    def __init__(self):
+        self.done = Event()
+        self.value = None
+        self.error = None
+
+
+class ResponseCache:
+    """Cache of GET responses, also merging identical concurrent requests.
+
+    Only one of the identical GET requests sent at the same time actually
+    goes to the network, and the rest wait for its response. Responses of
+    the routes listed in ttls are kept for the given seconds, up to
+    max_entries in LRU order, and get dropped early when a gateway event or
+    a non-GET request changes the resource or the ones under it.
+
+    This cache is opt-in. Enable it with client.set_response_cache method.
+
+    Attributes:
+        max_entries:
+            Maximum amount of responses to be stored.
+        ttls:
+            dict mapping route templates, as returned by get_route_template,
+            to seconds to cache the response for. Routes not in here are
+            only merged while in flight, never cached.
+        hits:
+            Amount of requests served from the cache.
+        coalesced:
+            Amount of requests served by waiting for an identical one.
+        misses:
+            Amount of requests that went to the network.
+    """
+    def __init__(self, max_entries=1000, ttls=None):
+        self.max_entries = max_entries
+        self.ttls = dict(DEFAULT_TTLS) if ttls is None else ttls
+
+        self.hits = 0
+        self.coalesced = 0
+        self.misses = 0
+
+        self._entries = OrderedDict()
+        self._paths = {}
+        self._inflight = {}
+        self._lock = Lock()
+
+    def request(self, route, fetch):
+        """Returns the response to GET route, calling fetch() if needed.
+
+        Returned values are copies, so they can be modified freely.
+        """
+        path = route.split("?", 1)[0]
+
+        with self._lock:
+            entry = self._entries.get(route)
+            if entry is not None:
+                if entry[0] > time.monotonic():
+                    self._entries.move_to_end(route)
+                    self.hits += 1
+                    return copy.deepcopy(entry[1])
+                self._remove(route)
+
+            inflight = self._inflight.get(route)
+            if inflight is None:
+                inflight = self._inflight[route] = _InFlight()
+                owner = True
+                self.misses += 1
+            else:
+                owner = False
+                self.coalesced += 1
+
+        if not owner:
+            inflight.done.wait()
+            if inflight.error is not None:
+                raise inflight.error
+            return copy.deepcopy(inflight.value)
+
+        try:
+            value = fetch()
+        except Exception as e:
+            inflight.error = e
+            raise
+        else:
+            inflight.value = value
+            ttl = self.ttls.get(get_route_template(path))
+            with self._lock:
+                # Not stored if invalidated while the request was in flight
+                if ttl and self._inflight.get(route) is inflight:
+                    self._store(route, path, value, ttl)
+            return value
+        finally:
+            with self._lock:
+                if self._inflight.get(route) is inflight:
+                    del self._inflight[route]
+            inflight.done.set()
+
+    def invalidate(self, path):
+        """Drops cached responses of the path, with any query string."""
+        with self._lock:
+            for route in self._paths.pop(path, ()):
+                self._entries.pop(route, None)
+            # Responses in flight could be fetched before the change
+            for route in list(self._inflight):
+                if route.split("?", 1)[0] == path:
+                    del self._inflight[route]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._paths.clear()
+
+    def get_stats(self):
+        """Returns dict of current size and hit/miss statistics."""
+        requests = self.hits + self.coalesced + self.misses
+        return {
+            "entries": len(self._entries),
+            "hits": self.hits,
+            "coalesced": self.coalesced,
+            "misses": self.misses,
+            "hit_rate": (self.hits + self.coalesced) / requests
+            if requests else 0.0
+        }
+
+    def _store(self, route, path, value, ttl):
+        self._entries[route] = (time.monotonic() + ttl, copy.deepcopy(value))
+        self._entries.move_to_end(route)
+        self._paths.setdefault(path, set()).add(route)
+
+        while len(self._entries) > self.max_entries:
+            self._remove(next(iter(self._entries)))
+
+    def _remove(self, route):
+        self._entries.pop(route, None)
+        path = route.split("?", 1)[0]
+        routes = self._paths.get(path)
+        if routes is not None:
+            routes.discard(route)
+            if not routes:
+                del self._paths[path]
+
+    def __len__(self):
+        return len(self._entries)
@@ -0,0 +1,187 @@
+#
+# NicoBot is Nicovideo Player bot for Discord, written from the scratch.
+# This file is part of NicoBot.
+#
+# Copyright (C) 2021 Wonjun Jung (KokoseiJ)
+#
+#    Nicobot is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+
+from .const import LIB_NAME
+from .exceptions import DiscordCircuitOpenError
+
+import time
+import random
+import logging
+from threading import Lock
+
+__all__ = ["RetryPolicy"]
+
+logger = logging.getLogger(LIB_NAME)
+
+# Circuit breaker states
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class _Circuit:
+    def __init__(self):
+        self.state = CLOSED
+        self.failures = 0
+        self.opened_at = 0
+
+
+class RetryPolicy:
+    """Decides how long requests may take and when they should be retried.
+
+    Requests failing with a connection error, a timeout or a 5xx response
+    are retried after an exponential backoff with full jitter, as long as
+    the attempts, the deadline and the retry budget allow. The budget
+    refills by .budget_ratio with every request, so that retries can't make
+    up more than that fraction of the traffic during an outage.
+
+    Every route has a circuit breaker. After .breaker_threshold failures in
+    a row, requests to the route fail right away with
+    DiscordCircuitOpenError for .breaker_cooldown seconds. Then a single
+    request is let through, closing the circuit if it succeeds.
+
+    Use RetryPolicy(max_attempts=1) to disable the retries.
+
+    Attributes:
+        timeout:
+            Seconds to wait for the connection and each read of the socket.
+        deadline:
+            Seconds a request may take in total, including retries and rate
+            limits. None for no deadline.
+        max_attempts:
+            Maximum amount of times to send a request.
+        backoff_base:
+            Seconds to back off for before the first retry, doubled with
+            every retry.
+        backoff_max:
+            Maximum seconds to back off for.
+        retry_methods:
+            HTTP methods that are safe to be sent again. POST is left out by
+            default as a retried message could be sent twice.
+        retry_budget:
+            Maximum amount of retries the budget can hold.
+        budget_ratio:
+            Amount of retries added to the budget by every request.
+        breaker_threshold:
+            Amount of failures in a row opening the circuit of a route.
+        breaker_cooldown:
+            Seconds the circuit stays open for.
+    """
+    def __init__(self, timeout=10, deadline=60, max_attempts=4,
+                 backoff_base=0.5, backoff_max=8,
+                 retry_methods=("GET", "HEAD", "PUT", "PATCH", "DELETE"),
+                 retry_budget=10, budget_ratio=0.1, breaker_threshold=5,
+                 breaker_cooldown=30):
+        self.timeout = timeout
+        self.deadline = deadline
+        self.max_attempts = max_attempts
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.retry_methods = frozenset(retry_methods)
+        self.retry_budget = retry_budget
+        self.budget_ratio = budget_ratio
+        self.breaker_threshold = breaker_threshold
+        self.breaker_cooldown = breaker_cooldown
+
+        self._budget = retry_budget
+        self._circuits = {}
+        self._lock = Lock()
+
+    def get_deadline(self):
+        """Returns time.monotonic() value a new request should end by."""
+        if self.deadline is None:
+            return None
+        return time.monotonic() + self.deadline
+
+    def get_backoff(self, attempt):
+        """Returns seconds to wait for before the attempt, starting from 1."""
+        limit = min(self.backoff_max, self.backoff_base * 2 ** (attempt - 1))
+        return random.uniform(0, limit)
+
+    def add_request(self):
+        """Refills the retry budget, called once per request."""
+        with self._lock:
+            self._budget = min(
+                self.retry_budget, self._budget + self.budget_ratio)
+
+    def get_retry_delay(self, method, attempt, deadline):
+        """Returns seconds to wait before retrying, None if it shouldn't be.
+
+        attempt is the amount of times the request has been sent. A retry
+        allowed by this method is taken out of the budget.
+        """
+        if method not in self.retry_methods or attempt >= self.max_attempts:
+            return None
+
+        delay = self.get_backoff(attempt)
+        if deadline is not None and time.monotonic() + delay >= deadline:
+            return None
+
+        with self._lock:
+            if self._budget < 1:
+                logger.warning("Retry budget is exhausted, not retrying.")
+                return None
+            self._budget -= 1
+
+        return delay
+
+    def check_circuit(self, route):
+        """Raises DiscordCircuitOpenError if route's circuit is open."""
+        with self._lock:
+            circuit = self._circuits.get(route)
+            if circuit is None or circuit.state == CLOSED:
+                return
+
+            # Lets a request through to probe the route once in a cooldown
+            now = time.monotonic()
+            if now - circuit.opened_at >= self.breaker_cooldown:
+                circuit.state = HALF_OPEN
+                circuit.opened_at = now
+                return
+
+        raise DiscordCircuitOpenError(
+            f"Circuit of {route} is open after {circuit.failures} failures.",
+            route, 0
+        )
+
+    def add_success(self, route):
+        with self._lock:
+            self._circuits.pop(route, None)
+
+    def add_failure(self, route):
+        with self._lock:
+            circuit = self._circuits.get(route)
+            if circuit is None:
+                circuit = self._circuits[route] = _Circuit()
+            circuit.failures += 1
+
+            if circuit.state == HALF_OPEN or \
+                    circuit.failures >= self.breaker_threshold:
+                if circuit.state != OPEN:
+                    logger.warning(
+                        f"Opening circuit of {route} after "
+                        f"{circuit.failures} failures.")
+                circuit.state = OPEN
+                circuit.opened_at = time.monotonic()
+
+    def get_circuit_state(self, route):
+        """Returns "closed", "open" or "half_open"."""
+        circuit = self._circuits.get(route)
+        return CLOSED if circuit is None else circuit.state
@@ -0,0 +1,297 @@
+#
+# NicoBot is Nicovideo Player bot for Discord, written from the scratch.
+# This file is part of NicoBot.
+#
+# Copyright (C) 2021 Wonjun Jung (KokoseiJ)
+#
+#    Nicobot is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+
+
+from .guild import Guild
+from .const import LIB_NAME
+from .util import StoppableThread
+from .snapshot import encode_guilds, decode_guilds
+
+import time
+import mmap
+import struct
+import logging
+
+__all__ = ["SharedCacheWriter", "SharedCacheReader"]
+
+logger = logging.getLogger(LIB_NAME)
+
+SHARED_MAGIC = b"NBSC"
+SHARED_VERSION = 1
+# magic, format version, generation, body length
+HEADER_STRUCT = struct.Struct("<4sH2xQQ")
+GENERATION_OFFSET = 8
+
+
+class _SharedBuffer:
+    """Fixed size buffer backed by either shared memory or an mmap'd file."""
+    def __init__(self, name=None, path=None, size=0, create=False):
+        self._shm = None
+        self._mmap = None
+
+        if path is not None:
+            if create:
+                with open(path, "wb") as f:
+                    f.truncate(size)
+            with open(path, "r+b") as f:
+                self._mmap = mmap.mmap(f.fileno(), 0)
+            self.buf = memoryview(self._mmap)
+        else:
+            from multiprocessing import shared_memory
+            self._shm = shared_memory.SharedMemory(
+                name=name, create=create, size=size
+            )
+            if not create:
+                # Readers shouldn't have the segment destroyed on their exit
+                try:
+                    from multiprocessing import resource_tracker
+                    resource_tracker.unregister(
+                        self._shm._name, "shared_memory")
+                except Exception:
+                    pass
+            self.buf = self._shm.buf
+
+        self.name = self._shm.name if self._shm is not None else path
+
+    def close(self):
+        if self._shm is not None:
+            self.buf = None
+            self._shm.close()
+        else:
+            self.buf.release()
+            self._mmap.close()
+
+    def unlink(self):
+        if self._shm is not None:
+            self._shm.unlink()
+
+
+class SharedCacheWriter:
+    """Publishes the guild cache for other processes to read.
+
+    Gateway process owns the writer, which periodically encodes the guild
+    cache with encode_guilds and writes it into a shared memory segment, or
+    an mmap'd file if path is given.
+
+    Writes are guarded by a generation counter working as a seqlock- it's
+    odd while a write is in progress and even once it's done, so that
+    readers don't need any lock to get a consistent copy.
+
+    Attributes:
+        client:
+            DiscordGateway object whose cache gets published.
+        name:
+            Name of the shared memory segment, or path of the file.
+        size:
+            Size of the segment in bytes, the encoded cache must fit in.
+        interval:
+            Seconds between publishes. Nothing is written if no event has
+            been received since the last one.
+        generation:
+            Current value of the generation counter.
+    """
+    def __init__(self, client, name=None, size=64 * 1024 * 1024,
+                 interval=1, path=None):
+        self.client = client
+        self.size = size
+        self.interval = interval
+        self.generation = 0
+
+        self._buffer = _SharedBuffer(name, path, size, create=True)
+        self.name = self._buffer.name
+        self._last_seq = None
+        self.publish_thread = None
+
+        HEADER_STRUCT.pack_into(
+            self._buffer.buf, 0, SHARED_MAGIC, SHARED_VERSION, 0, 0
+        )
+
+    def publish(self, force=False):
+        """Encodes the current cache and writes it into the buffer.
+
+        Returns:
+            True if written, False if nothing has changed since the last one.
+
+        Raises:
+            ValueError:
+                Raised if the encoded cache doesn't fit in the buffer.
+        """
+        guilds = self.client.guilds
+        seq = self.client.seq
+        if guilds is None or (not force and seq == self._last_seq):
+            return False
+
+        body = encode_guilds(
+            guild for guild in guilds.snapshot().values() if guild
+        )
+        capacity = self.size - HEADER_STRUCT.size
+        if len(body) > capacity:
+            raise ValueError(f"Encoded cache is {len(body)} bytes, which "
+                             f"exceeds shared buffer size {capacity}")
+
+        buf = self._buffer.buf
+        start = HEADER_STRUCT.size
+
+        self._set_generation(self.generation + 1)
+        buf[start:start + len(body)] = body
+        HEADER_STRUCT.pack_into(
+            buf, 0, SHARED_MAGIC, SHARED_VERSION,
+            self.generation, len(body)
+        )
+        self._set_generation(self.generation + 1)
+
+        self._last_seq = seq
+        return True
+
+    def _set_generation(self, generation):
+        self.generation = generation
+        struct.pack_into("<Q", self._buffer.buf, GENERATION_OFFSET, generation)
+
+    def start(self):
+        """Starts the thread publishing every .interval seconds."""
+        if self.publish_thread is not None:
+            return
+
+        self.publish_thread = StoppableThread(
+            target=self._publish_loop,
+            name=f"{self.client.name}_sharedcache"
+        )
+        self.publish_thread.daemon = True
+        self.publish_thread.start()
+
+    def _publish_loop(self):
+        stop_flag = self.publish_thread.stop_flag
+        while not stop_flag.wait(self.interval):
+            try:
+                self.publish()
+            except Exception:
+                logger.exception("Failed to publish shared cache.")
+
+    def close(self, unlink=True):
+        """Stops publishing and releases the buffer."""
+        if self.publish_thread is not None:
+            self.publish_thread.stop()
+            self.publish_thread = None
+
+        self._buffer.close()
+        if unlink:
+            self._buffer.unlink()
+
+
+class SharedCacheReader:
+    """Reads the guild cache published by SharedCacheWriter.
+
+    Readers never take a lock. The decoded guilds are kept until the
+    generation counter moves, so repeated lookups between publishes only
+    cost a read of the counter.
+
+    Attributes:
+        client:
+            Optional DiscordClient used by the returned objects to send HTTP
+            requests. Objects are read-only snapshots without it.
+        generation:
+            Generation of the currently decoded data.
+    """
+    def __init__(self, name=None, client=None, path=None, max_retries=100):
+        self.client = client
+        self.max_retries = max_retries
+        self.generation = None
+
+        self._buffer = _SharedBuffer(name, path)
+        self._guilds = {}
+        self._channels = {}
+        self._members = {}
+
+        magic, version, _, _ = HEADER_STRUCT.unpack_from(self._buffer.buf)
+        if magic != SHARED_MAGIC or version != SHARED_VERSION:
+            self._buffer.close()
+            raise ValueError(f"'{self._buffer.name}' is not a compatible "
+                             "shared cache")
+
+    def _read_generation(self):
+        return struct.unpack_from(
+            "<Q", self._buffer.buf, GENERATION_OFFSET)[0]
+
+    def refresh(self):
+        """Decodes the buffer again if the writer has published since.
+
+        Returns:
+            True if new data has been loaded.
+        """
+        buf = self._buffer.buf
+        start = HEADER_STRUCT.size
+
+        for _ in range(self.max_retries):
+            generation = self._read_generation()
+            if generation == self.generation:
+                return False
+            if generation % 2:
+                time.sleep(0.001)
+                continue
+
+            _, _, _, length = HEADER_STRUCT.unpack_from(buf)
+            body = bytes(buf[start:start + length])
+
+            if self._read_generation() != generation:
+                continue
+
+            self._load(decode_guilds(body) if length else [])
+            self.generation = generation
+            return True
+
+        logger.warning("Gave up reading shared cache being written.")
+        return False
+
+    def _load(self, data):
+        guilds = {}
+        channels = {}
+        members = {}
+
+        for obj in data:
+            guild = Guild(self.client, obj)
+            guilds[guild.id] = guild
+            if guild.channels is not None:
+                channels.update(guild.channels)
+            if guild.members is not None:
+                for user_id, member in guild.members.items():
+                    members[(guild.id, user_id)] = member
+
+        self._guilds = guilds
+        self._channels = channels
+        self._members = members
+
+    def get_guilds(self):
+        self.refresh()
+        return self._guilds
+
+    def get_guild(self, id_):
+        self.refresh()
+        return self._guilds.get(id_)
+
+    def get_channel(self, id_):
+        self.refresh()
+        return self._channels.get(id_)
+
+    def get_member(self, guild_id, user_id):
+        self.refresh()
+        return self._members.get((guild_id, user_id))
+
+    def close(self):
+        self._buffer.close()
@@ -18,14 +18,14 @@
 #    along with this program.  If not, see <https://www.gnu.org/licenses/>.
 #
 
-from ..file import File
 from ..user import User
 from ..member import Member
 from ..message import Message
 from ..const import LIB_NAME, EMPTY
 from ..dictobject import DictObject
 from ..gateway import DiscordGateway
-from ..util import get_formdata, clear_postdata
+from ..util import clear_postdata, collect_files, get_attachments, \
+    get_files_formdata
 
 import json
 import logging
@@ -273,19 +273,31 @@ class SlashCommandManager:
                 break
             self.edit(ctx, content=res)
 
-    def respond(self, ctx, type_, message=None):
+    def respond(self, ctx, type_, message=None, files=None):
         postdata = {
             "type": type_
         }
         if message is not None:
             postdata.update({"data": message})
 
-        self.client.send_request(
-            "POST", f"/interactions/{ctx.id}/{ctx.token}/callback", postdata
-        )
+        route = f"/interactions/{ctx.id}/{ctx.token}/callback"
+        files = collect_files(files=files)
+        if files:
+            message = dict(message or {})
+            message['attachments'] = get_attachments(
+                files, message.get('attachments', EMPTY))
+            postdata['data'] = message
+            content_type, formdata = get_files_formdata(postdata, files)
+
+            self.client.send_request(
+                "POST", route, formdata,
+                headers={"Content-Type": content_type}
+            )
+        else:
+            self.client.send_request("POST", route, postdata)
 
     def edit(self, ctx, content=EMPTY, file=None, embeds=EMPTY,
-             allowed_mentions=EMPTY, components=EMPTY):
+             allowed_mentions=EMPTY, components=EMPTY, files=None):
         
         postdata = {
             "content": content,
@@ -295,14 +307,10 @@ class SlashCommandManager:
         }
         postdata = clear_postdata(postdata)
 
-        if file is not None:
-            if not isinstance(file, File):
-                raise ValueError(f"file should be File, not {type(file)}")
-
-            content_type, formdata = get_formdata({
-                "file": file,
-                "payload_json": postdata
-            })
+        files = collect_files(file, files)
+        if files:
+            postdata['attachments'] = get_attachments(files)
+            content_type, formdata = get_files_formdata(postdata, files)
 
             headers = {"Content-Type": content_type}
 
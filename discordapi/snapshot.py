@@ -0,0 +1,211 @@
+#
+# NicoBot is Nicovideo Player bot for Discord, written from the scratch.
+# This file is part of NicoBot.
+#
+# Copyright (C) 2021 Wonjun Jung (KokoseiJ)
+#
+#    Nicobot is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+
+
+from .guild import Guild
+from .const import LIB_NAME
+from .cache import CacheDict
+from .util import StoppableThread
+
+import os
+import json
+import mmap
+import zlib
+import struct
+import logging
+
+__all__ = ["CacheSnapshot", "encode_guilds", "decode_guilds"]
+
+logger = logging.getLogger(LIB_NAME)
+
+SNAPSHOT_MAGIC = b"NBCS"
+SNAPSHOT_VERSION = 1
+HEADER_STRUCT = struct.Struct(">4sHQ")
+
+
+def encode_guilds(guilds):
+    """Encodes guilds with their channels and members into compact bytes.
+
+    Each guild is stored as its raw JSON object with channels and members
+    replaced with their current state, and the whole thing is compressed.
+
+    Args:
+        guilds:
+            Iterable of Guild objects.
+    """
+    data = []
+    for guild in guilds:
+        obj = guild._json.copy()
+        channels = guild.channels.snapshot() \
+            if guild.channels is not None else {}
+        members = guild.members.snapshot() \
+            if guild.members is not None else {}
+        obj['channels'] = [channel._json for channel in channels.values()]
+        obj['members'] = [member._json for member in members.values()]
+        obj['voice_states'] = []
+        # These are updated by events without going through ._update
+        obj['roles'] = guild.roles
+        obj['emojis'] = guild.emojis
+        data.append(obj)
+
+    raw = json.dumps(data, separators=(",", ":")).encode()
+    return zlib.compress(raw)
+
+
+def decode_guilds(buf):
+    """Decodes bytes-like object made by encode_guilds into list of dicts."""
+    return json.loads(zlib.decompress(buf))
+
+
+class CacheSnapshot:
+    """Persists the guild cache on disk for fast warm restarts.
+
+    The file starts with a header of magic, format version and body length,
+    followed by the body made by encode_guilds. It is read through mmap and
+    replaced atomically when written.
+
+    Guilds loaded from the snapshot have .stale attribute set to True, and
+    are served to the readers right away. They're reconciled with the live
+    data once their GUILD_CREATE arrives. Guilds the bot isn't in anymore get
+    dropped on READY.
+
+    Attributes:
+        path:
+            Path to the snapshot file.
+        interval:
+            Seconds between periodic saves, None to only save on stop.
+    """
+    def __init__(self, path, interval=None):
+        self.path = os.path.abspath(path)
+        self.interval = interval
+        self.client = None
+        self.save_thread = None
+
+    def set_client(self, client):
+        from .gateway import DiscordGateway
+        if not isinstance(client, DiscordGateway):
+            raise TypeError("client should be DiscordGateway, "
+                            f"not '{type(client)}'")
+        self.client = client
+
+    def start(self):
+        """Starts the thread saving snapshot every .interval seconds."""
+        if self.interval is None or self.save_thread is not None:
+            return
+
+        self.save_thread = StoppableThread(
+            target=self._save_loop,
+            name=f"{self.client.name}_snapshot"
+        )
+        self.save_thread.daemon = True
+        self.save_thread.start()
+
+    def stop(self):
+        if self.save_thread is not None:
+            self.save_thread.stop()
+            self.save_thread = None
+
+    def _save_loop(self):
+        stop_flag = self.save_thread.stop_flag
+        while not stop_flag.wait(self.interval):
+            try:
+                self.save()
+            except Exception:
+                logger.exception("Failed to save cache snapshot.")
+
+    def save(self):
+        """Writes current guild cache to the snapshot file."""
+        guilds = self.client.guilds
+        if guilds is None:
+            return
+
+        body = encode_guilds(
+            guild for guild in guilds.snapshot().values() if guild
+        )
+        header = HEADER_STRUCT.pack(
+            SNAPSHOT_MAGIC, SNAPSHOT_VERSION, len(body)
+        )
+
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(header)
+            f.write(body)
+        os.replace(tmp_path, self.path)
+
+        logger.debug(f"Saved cache snapshot to {self.path}")
+
+    def read(self):
+        """Returns list of guild dicts stored in the file.
+
+        None is returned if the file doesn't exist, is broken or was written
+        by a different format version.
+        """
+        try:
+            f = open(self.path, "rb")
+        except FileNotFoundError:
+            return None
+
+        with f:
+            if os.fstat(f.fileno()).st_size < HEADER_STRUCT.size:
+                return None
+
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                magic, version, length = HEADER_STRUCT.unpack_from(mm)
+                if magic != SNAPSHOT_MAGIC or version != SNAPSHOT_VERSION:
+                    logger.warning(f"Ignoring incompatible cache snapshot "
+                                   f"{self.path}")
+                    return None
+
+                start = HEADER_STRUCT.size
+                with memoryview(mm) as view:
+                    body = view[start:start + length]
+                    try:
+                        return decode_guilds(body)
+                    except (zlib.error, ValueError):
+                        logger.warning(f"Cache snapshot {self.path} is "
+                                       "broken, ignoring.")
+                        return None
+                    finally:
+                        body.release()
+
+    def load(self):
+        """Populates the client's cache with the stale guilds from the file.
+
+        Returns:
+            Amount of guilds loaded.
+        """
+        data = self.read()
+        if not data:
+            return 0
+
+        client = self.client
+        if client.guilds is None:
+            client.guilds = CacheDict()
+
+        for obj in data:
+            if client.guilds.get(obj['id']):
+                continue
+            guild = Guild(client, obj)
+            guild.stale = True
+            client.guilds[guild.id] = guild
+            client._index_guild(guild)
+
+        logger.info(f"Loaded {len(data)} guilds from cache snapshot.")
+        return len(data)
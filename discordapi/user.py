@@ -71,7 +71,7 @@ class BotUser(User):
             "PATCH", "", postdata
         )
 
-        self.__init__(self.client, user)
+        self._update(user)
 
         return self
 
@@ -96,8 +96,10 @@ class BotUser(User):
         channel = self._send_request(
             "POST", "/channels", postdata
         )
+        channel = get_channel(self.client, channel)
+        self.client._index_channel(channel)
 
-        return get_channel(self.client, channel)
+        return channel
 
     def get_connections(self):
         connections = self._send_request(
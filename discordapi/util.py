@@ -23,6 +23,7 @@ from .file import File
 
 import os
 import json
+import zlib
 from select import select
 from threading import Thread, Event
 
@@ -98,6 +99,76 @@ class SelectableEvent:
         os.close(self._write_fd)
 
 
+def get_route_template(route):
+    """Returns route with ids and tokens replaced, e.g. /channels/{id}.
+
+    Query string is dropped, snowflakes become {id}, webhook and interaction
+    tokens become {token}, and reaction emojis become {emoji}. Useful to
+    group requests to the same endpoint together.
+    """
+    parts = route.split("?", 1)[0].strip("/").split("/")
+    template = []
+
+    for index, part in enumerate(parts):
+        prev = parts[index - 1] if index else None
+        if part.isdigit():
+            part = "{id}"
+        elif index >= 2 and parts[index - 2] in ("webhooks", "interactions")\
+                and prev.isdigit():
+            part = "{token}"
+        elif prev == "reactions":
+            part = "{emoji}"
+        template.append(part)
+
+    return "/" + "/".join(template)
+
+
+def get_decompressor(encoding):
+    """Returns zlib decompressobj for Content-Encoding, None if identity.
+
+    Raises:
+        ValueError:
+            Raised when the encoding isn't supported.
+    """
+    encoding = (encoding or "identity").strip().lower()
+    if encoding == "identity":
+        return None
+    elif encoding in ("gzip", "x-gzip"):
+        return zlib.decompressobj(16 + zlib.MAX_WBITS)
+    elif encoding == "deflate":
+        # HTTP deflate is zlib wrapped, 32 also accepts mislabeled gzip
+        return zlib.decompressobj(32 + zlib.MAX_WBITS)
+    raise ValueError(f"Unsupported Content-Encoding '{encoding}'")
+
+
+def read_response(res, chunk_size=64 * 1024):
+    """Reads body of the HTTP response, decompressing it if needed.
+
+    Compressed body is read and decompressed chunk by chunk, so that only
+    the decompressed content is ever held in full.
+
+    Returns:
+        tuple of (body, received) where received is the amount of bytes
+        actually read from the connection.
+    """
+    decompressor = get_decompressor(res.headers.get("Content-Encoding"))
+    if decompressor is None:
+        body = res.read()
+        return body, len(body)
+
+    chunks = []
+    received = 0
+    while True:
+        chunk = res.read(chunk_size)
+        if not chunk:
+            break
+        received += len(chunk)
+        chunks.append(decompressor.decompress(chunk))
+    chunks.append(decompressor.flush())
+
+    return b"".join(chunks), received
+
+
 def clear_postdata(data):
     """checks for postdata and remove the key if the value is EMPTY.
     """
@@ -106,32 +177,138 @@ def clear_postdata(data):
     }
 
 
+class MultipartEncoder:
+    """multipart/form-data body streamed from the files it contains.
+
+    Content-Length is known up front from the file sizes, and files are read
+    in chunks into a reused buffer while the body is being sent, so that
+    uploading a large file doesn't load it into the memory. The body can be
+    iterated multiple times, e.g. when the request gets resent after hitting
+    the rate limit. Yielded chunks may point to the reused buffer, so they're
+    only valid until the next chunk is requested.
+
+    Attributes:
+        boundary:
+            Boundary string separating the parts.
+        content_type:
+            Value to be used as Content-Type header.
+        parts:
+            list of (header, value) where header is bytes, and value is
+            either bytes or File.
+    """
+    CHUNK_SIZE = 64 * 1024
+
+    def __init__(self, data, boundary_prefix=None):
+        if boundary_prefix is None:
+            boundary_prefix = "VOCALOIDIA-"
+
+        randhex = os.urandom(8).hex()
+        self.boundary = f"{boundary_prefix}{randhex}"
+        self.content_type = \
+            f"multipart/form-data;boundary=\"{self.boundary}\""
+
+        self.parts = []
+        for key, value in data.items():
+            header = f"--{self.boundary}\r\n" \
+                f"Content-Disposition: form-data; name=\"{key}\""
+
+            if isinstance(value, File):
+                header += f"; filename=\"{value.get_name()}\"\r\n" \
+                    "Content-Type: application/octet-stream"
+            elif isinstance(value, (dict, list)):
+                value = json.dumps(value).encode()
+            elif isinstance(value, str):
+                value = value.encode()
+
+            header += "\r\n\r\n"
+            self.parts.append((header.encode(), value))
+
+        self._end = f"--{self.boundary}--\r\n".encode()
+
+    def __len__(self):
+        length = len(self._end)
+        for header, value in self.parts:
+            if isinstance(value, File):
+                size = value.get_size()
+            else:
+                size = len(value)
+            length += len(header) + size + 2
+        return length
+
+    def __iter__(self):
+        buf = bytearray(self.CHUNK_SIZE)
+        view = memoryview(buf)
+
+        for header, value in self.parts:
+            yield header
+            if isinstance(value, File) and value.path is not None:
+                with open(value.path, "rb") as fileobj:
+                    while True:
+                        size = fileobj.readinto(buf)
+                        if not size:
+                            break
+                        yield view[:size]
+            elif isinstance(value, File):
+                with value.fileobj.getbuffer() as content:
+                    for start in range(0, len(content), self.CHUNK_SIZE):
+                        yield content[start:start + self.CHUNK_SIZE]
+            else:
+                yield value
+            yield b"\r\n"
+
+        yield self._end
+
+
 def get_formdata(data, boundary_prefix=None):
-    if boundary_prefix is None:
-        boundary_prefix = "VOCALOIDIA-"
+    """Returns tuple of (content_type, body) of multipart/form-data.
+
+    body is MultipartEncoder, which gets streamed while being sent.
+    """
+    encoder = MultipartEncoder(data, boundary_prefix)
+    return encoder.content_type, encoder
+
+
+def collect_files(file=None, files=None):
+    """Returns list of File objects from file and files arguments.
 
-    randhex = os.urandom(8).hex()
-    boundary = f"{boundary_prefix}{randhex}"
+    Raises:
+        ValueError:
+            Raised if there's non-File object, or more than 10 files.
+    """
+    result = []
+    if file is not None:
+        result.append(file)
+    if files is not None:
+        result.extend(files)
+
+    for obj in result:
+        if not isinstance(obj, File):
+            raise ValueError(f"file should be File, not {type(obj)}")
+    if len(result) > 10:
+        raise ValueError("Can't upload more than 10 files at once.")
 
-    content_type = f"multipart/form-data;boundary=\"{boundary}\""
+    return result
 
-    body = bytes()
 
-    for key, value in data.items():
-        body += f"--{boundary}\n".encode()
-        body += f"Content-Disposition: form-data; name=\"{key}\"".encode()
+def get_attachments(files, attachments=EMPTY):
+    """Returns attachments array describing files, after the existing ones.
 
-        if isinstance(value, dict):
-            value = json.dumps(value).encode()
-        elif isinstance(value, File):
-            name = value.get_name()
-            value = value.read()
-            body += f"; filename=\"{name}\"\n".encode()
-            body += b"Content-Type: application/octet-stream"
+    Each file gets id of its index, matching files[n] form field name.
+    """
+    result = [] if attachments is EMPTY or attachments is None \
+        else list(attachments)
+    result.extend(
+        {"id": index, "filename": file.get_name()}
+        for index, file in enumerate(files)
+    )
+    return result
 
-        body += b"\n\n"
-        body += value if isinstance(value, bytes) else value.encode()
-        body += b"\n"
-    body += f"--{boundary}--\n".encode()
 
-    return content_type, body
+def get_files_formdata(payload, files):
+    """Returns tuple of (content_type, body) uploading files with payload.
+
+    Files are sent as files[n] fields, all in a single streamed body.
+    """
+    data = {f"files[{index}]": file for index, file in enumerate(files)}
+    data['payload_json'] = payload
+    return get_formdata(data)
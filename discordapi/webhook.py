@@ -0,0 +1,197 @@
+#
+# NicoBot is Nicovideo Player bot for Discord, written from the scratch.
+# This file is part of NicoBot.
+#
+# Copyright (C) 2021 Wonjun Jung (KokoseiJ)
+#
+#    Nicobot is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+
+from .message import Message
+from .httpclient import HTTPClient
+from .const import EMPTY, LIB_NAME, LIB_VER, LIB_URL
+from .util import clear_postdata, collect_files, get_attachments, \
+    get_files_formdata
+
+import re
+from urllib.parse import urlencode
+
+__all__ = ["Webhook"]
+
+WEBHOOK_URL_RE = re.compile(r"/webhooks/(\d+)/([^/?#]+)")
+
+
+class Webhook(HTTPClient):
+    """Client executing a webhook, without the need of a bot token.
+
+    Webhooks have rate limits separate from the bot's, and every Webhook
+    object has its own RateLimitHandler keyed by the webhook's id and token,
+    so that sending through many webhooks in parallel doesn't wait on a
+    single bucket. Reuse one object per webhook to keep its limits tracked.
+
+    Messages are returned as Message objects if client is given, and as
+    dict otherwise, as Message needs a client to look up the channels.
+
+    Attributes:
+        id:
+            id of the webhook.
+        token:
+            token of the webhook.
+        client:
+            DiscordClient used to build Message objects. Could be None.
+    """
+    def __init__(self, id_, token, client=None):
+        super(Webhook, self).__init__({
+            "User-Agent": f"{LIB_NAME} ({LIB_URL}, {LIB_VER})",
+            "Content-Type": "application/json",
+            "Accept-Encoding": "gzip, deflate"
+        })
+        self.id = str(id_)
+        self.token = token
+        self.client = client
+
+    @classmethod
+    def from_url(cls, url, client=None):
+        """Creates Webhook from its URL.
+
+        Raises:
+            ValueError:
+                Raised when url is not a webhook URL.
+        """
+        match = WEBHOOK_URL_RE.search(url)
+        if match is None:
+            raise ValueError(f"'{url}' is not a webhook URL.")
+        return cls(match.group(1), match.group(2), client)
+
+    def get(self):
+        """Returns the webhook object as dict."""
+        return self._webhook_request("GET", "")
+
+    def modify(self, name=EMPTY, avatar=EMPTY):
+        postdata = clear_postdata({"name": name, "avatar": avatar})
+        return self._webhook_request("PATCH", "", postdata)
+
+    def delete(self):
+        self._webhook_request("DELETE", "")
+
+    def execute(self, content=EMPTY, username=EMPTY, avatar_url=EMPTY,
+                tts=EMPTY, embeds=EMPTY, allowed_mentions=EMPTY,
+                components=EMPTY, file=None, files=None, thread_id=None,
+                thread_name=EMPTY, wait=True):
+        """Sends a message through the webhook.
+
+        Args:
+            thread_id:
+                id of the thread in the webhook's channel to send to.
+            thread_name:
+                Name of the thread to be created, for forum channels.
+            wait:
+                Whether to wait for the message to be created and return it.
+                Messages are sent faster without waiting, but None gets
+                returned and failures to create it are not reported.
+        """
+        postdata = clear_postdata({
+            "content": content,
+            "username": username,
+            "avatar_url": avatar_url,
+            "tts": tts,
+            "embeds": embeds,
+            "allowed_mentions": allowed_mentions,
+            "components": components,
+            "thread_name": thread_name
+        })
+        query = {"wait": "true" if wait else "false"}
+        if thread_id is not None:
+            query['thread_id'] = thread_id
+
+        message = self._send_files(
+            "POST", "", postdata, collect_files(file, files), query)
+
+        return self._get_message(message)
+
+    def get_message(self, message, thread_id=None):
+        message = self._webhook_request(
+            "GET", f"/messages/{self._get_id(message)}",
+            query=self._get_thread_query(thread_id)
+        )
+
+        return self._get_message(message)
+
+    def edit_message(self, message, content=EMPTY, embeds=EMPTY,
+                     allowed_mentions=EMPTY, attachments=EMPTY,
+                     components=EMPTY, file=None, files=None,
+                     thread_id=None):
+        """Edits the message sent by the webhook.
+
+        Files in file and files are uploaded as new attachments. Existing
+        attachments not in attachments get removed if attachments is given.
+        """
+        postdata = clear_postdata({
+            "content": content,
+            "embeds": embeds,
+            "allowed_mentions": allowed_mentions,
+            "attachments": attachments,
+            "components": components
+        })
+        files = collect_files(file, files)
+        if files:
+            postdata['attachments'] = get_attachments(files, attachments)
+
+        message = self._send_files(
+            "PATCH", f"/messages/{self._get_id(message)}", postdata, files,
+            self._get_thread_query(thread_id)
+        )
+
+        return self._get_message(message)
+
+    def delete_message(self, message, thread_id=None):
+        self._webhook_request(
+            "DELETE", f"/messages/{self._get_id(message)}",
+            query=self._get_thread_query(thread_id)
+        )
+
+    def _send_files(self, method, route, postdata, files, query):
+        if not files:
+            return self._webhook_request(method, route, postdata, query)
+
+        content_type, formdata = get_files_formdata(postdata, files)
+        headers = {"Content-Type": content_type}
+
+        return self._webhook_request(method, route, formdata, query, headers)
+
+    def _webhook_request(self, method, route, data=None, query=None,
+                         headers=None):
+        route = f"/webhooks/{self.id}/{self.token}{route}"
+        if query:
+            route = f"{route}?{urlencode(query)}"
+        return self.send_request(method, route, data, headers=headers)
+
+    def _get_message(self, data):
+        if data is None or self.client is None:
+            return data
+        return Message(self.client, data)
+
+    @staticmethod
+    def _get_id(message):
+        return message.id if isinstance(message, Message) else message
+
+    @staticmethod
+    def _get_thread_query(thread_id):
+        return {"thread_id": thread_id} if thread_id is not None else None
+
+    def __str__(self):
+        return f"<{self.__class__.__name__} id={self.id}>"
+
+    def __repr__(self):
+        return self.__str__()
@@ -7,6 +7,7 @@ sys.path.insert(0, projpath)
 
 from discordapi import DiscordClient
 
+import io
 import time
 
 
@@ -72,3 +73,46 @@ def chat_report(request, channel):
     def fin():
         channel.send(f"```===== {request.node.nodeid} Finished! =====```")
     request.addfinalizer(fin)
+
+
+@pytest.fixture(scope="function")
+def offline_client():
+    """Client that is never connected, fed with events by hand."""
+    client = DiscordClient(token="offline", name="Test_offline")
+    client.event_parser._handle("READY", {
+        "user": {"id": "1", "username": "bot", "discriminator": "0001"},
+        "guilds": [{"id": "100", "unavailable": True}],
+        "session_id": "session",
+        "application": {"id": "1"}
+    })
+    return client
+
+
+def make_guild_payload(guild_id="100", channel_count=2, member_count=2):
+    return {
+        "id": guild_id,
+        "name": f"guild_{guild_id}",
+        "roles": [{"id": guild_id, "name": "@everyone", "permissions": "0"}],
+        "channels": [
+            {"id": f"{guild_id}{i}", "type": 0, "name": f"channel_{i}"}
+            for i in range(channel_count)
+        ],
+        "members": [
+            {"user": {"id": f"{guild_id}{i}", "username": f"user_{i}",
+                      "discriminator": "0001"}, "roles": []}
+            for i in range(member_count)
+        ],
+        "voice_states": []
+    }
+
+
+class FakeResponse:
+    """Stand-in for the HTTPResponse returned by urlopen."""
+    def __init__(self, status=200, body=b"", headers=None, reason="OK"):
+        self.status = status
+        self.headers = headers or {}
+        self.reason = reason
+        self._body = io.BytesIO(body)
+
+    def read(self, size=-1):
+        return self._body.read(size)
@@ -0,0 +1,61 @@
+import pytest
+from .conftest import make_guild_payload
+
+import os
+import sys
+
+projpath = os.path.normpath(os.path.join(os.path.abspath(__file__), "../.."))
+sys.path.insert(0, projpath)
+
+from discordapi import BufferedSender
+
+
+def setup_channel(client):
+    client.event_parser._handle("GUILD_CREATE", make_guild_payload())
+    channel = client.get_channel("1000")
+    sent = []
+
+    def send_request(method, route, data, *args):
+        sent.append(data)
+        return {"id": str(len(sent)), "channel_id": "1000", "author": {
+            "id": "1", "username": "bot", "discriminator": "0001"}}
+
+    client.send_request = send_request
+    return channel, sent
+
+
+class TestBufferedSender:
+    def test_merges_sends_in_window(self, offline_client):
+        channel, sent = setup_channel(offline_client)
+        sender = channel.get_buffered_sender(window=0.1)
+        assert channel.get_buffered_sender() is sender
+
+        futures = [sender.send(f"line {i}") for i in range(20)]
+        messages = [future.result(5) for future in futures]
+        sender.close()
+
+        assert len(sent) == 1
+        assert sent[0]['content'] == "\n".join(
+            f"line {i}" for i in range(20))
+        assert all(message is messages[0] for message in messages)
+
+    def test_respects_limits(self, offline_client):
+        channel, sent = setup_channel(offline_client)
+        sender = BufferedSender(channel, window=60)
+
+        futures = [sender.send("a" * 999) for _ in range(3)]
+        futures += [sender.send(embeds=[{"title": str(i)}] * 4)
+                    for i in range(3)]
+        sender.flush()
+
+        assert [len(data.get('content', "")) for data in sent] == \
+            [1999, 999, 0]
+        assert [len(data.get('embeds', ())) for data in sent] == [0, 8, 4]
+        assert futures[0].result().id == futures[1].result().id == "1"
+        assert futures[-1].result().id == "3"
+
+        with pytest.raises(ValueError):
+            sender.send("a" * 2001)
+        sender.close()
+        with pytest.raises(RuntimeError):
+            sender.send("closed")
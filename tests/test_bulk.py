@@ -0,0 +1,65 @@
+from .conftest import make_guild_payload
+
+import os
+import sys
+import time
+
+projpath = os.path.normpath(os.path.join(os.path.abspath(__file__), "../.."))
+sys.path.insert(0, projpath)
+
+from discordapi import get_snowflake_time
+from discordapi.bulk import split_bulk_delete, DISCORD_EPOCH
+
+
+def make_snowflake(timestamp, increment=0):
+    return str((int(timestamp * 1000) - DISCORD_EPOCH) << 22 | increment)
+
+
+class TestBulk:
+    def test_split_bulk_delete(self):
+        now = time.time()
+        recent = [make_snowflake(now - 60, i) for i in range(201)]
+        old = [make_snowflake(now - 15 * 24 * 3600, i) for i in range(3)]
+
+        assert abs(get_snowflake_time(recent[0]) - (now - 60)) < 0.01
+
+        batches, singles = split_bulk_delete(recent + old + recent[:5], now)
+
+        assert [len(batch) for batch in batches] == [100, 100]
+        assert singles == old + [recent[-1]]
+
+    def test_purge(self, offline_client):
+        client = offline_client
+        client.event_parser._handle("GUILD_CREATE", make_guild_payload())
+        channel = client.get_channel("1000")
+        now = time.time()
+        messages = [
+            {"id": make_snowflake(now - index * 4 * 3600 - 60),
+             "channel_id": "1000", "content": str(index % 2), "author": {
+                 "id": "1000", "username": "user_0",
+                 "discriminator": "0001"}}
+            for index in range(120)
+        ]
+        requests = []
+        progress = []
+
+        def send_request(method, route, data=None, *args):
+            if method == "GET":
+                return messages[:100]
+            requests.append((method, route, data))
+
+        client.send_request = send_request
+        operation = channel.purge(
+            lambda message: message.content == "0", limit=100,
+            progress=lambda op: progress.append(op.done)
+        )
+
+        bulk = [data for method, _, data in requests if method == "POST"]
+        singles = [route for method, route, _ in requests
+                   if method == "DELETE"]
+
+        # 84 messages are within 2 weeks, 42 of them match
+        assert operation.total == operation.done == 50
+        assert len(bulk) == 1 and len(bulk[0]['messages']) == 42
+        assert len(singles) == 8
+        assert len(progress) == 9 and max(progress) == 50
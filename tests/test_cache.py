@@ -0,0 +1,48 @@
+import pytest
+
+import os
+import sys
+
+projpath = os.path.normpath(os.path.join(os.path.abspath(__file__), "../.."))
+sys.path.insert(0, projpath)
+
+from discordapi import CacheDict
+
+
+class TestCacheDict:
+    def test_snapshot_is_shared_until_write(self):
+        cache = CacheDict({"a": 1})
+        first = cache.snapshot()
+
+        assert cache.snapshot() is first
+
+        cache["b"] = 2
+        second = cache.snapshot()
+
+        assert second is not first
+        assert dict(first) == {"a": 1}
+        assert dict(second) == {"a": 1, "b": 2}
+
+    def test_snapshot_is_read_only(self):
+        cache = CacheDict({"a": 1})
+        with pytest.raises(TypeError):
+            cache.snapshot()["a"] = 2
+
+    def test_iteration_while_mutating(self):
+        cache = CacheDict({str(x): x for x in range(10)})
+        for key in cache.snapshot():
+            del cache[key]
+
+        assert not cache
+
+    def test_every_write_bumps_version(self):
+        cache = CacheDict()
+        version = cache.version
+        cache["a"] = 1
+        cache.update(b=2)
+        cache.setdefault("c", 3)
+        cache.pop("a")
+        del cache["b"]
+        cache.clear()
+
+        assert cache.version == version + 6
@@ -0,0 +1,140 @@
+from .conftest import make_guild_payload
+
+import os
+import sys
+import socket
+import socketserver
+from threading import Thread
+
+projpath = os.path.normpath(os.path.join(os.path.abspath(__file__), "../.."))
+sys.path.insert(0, projpath)
+
+import pytest
+
+from discordapi import DictCacheBackend, RedisCacheBackend, CacheBackendError
+
+
+class RESPHandler(socketserver.StreamRequestHandler):
+    """Minimal stand-in for a Redis server, supporting a few commands."""
+    def handle(self):
+        store = self.server.store
+        while True:
+            line = self.rfile.readline()
+            if not line:
+                return
+            args = []
+            for _ in range(int(line[1:])):
+                length = int(self.rfile.readline()[1:])
+                args.append(self.rfile.read(length + 2)[:-2])
+            self.server.commands.append(args)
+
+            command = args[0].upper()
+            if command == b"SET":
+                store[args[1]] = args[2]
+                self.wfile.write(b"+OK\r\n")
+            elif command == b"GET":
+                value = store.get(args[1])
+                if value is None:
+                    self.wfile.write(b"$-1\r\n")
+                else:
+                    self.wfile.write(b"$%d\r\n%s\r\n" % (len(value), value))
+            elif command == b"DEL":
+                self.wfile.write(b":%d\r\n" % int(
+                    store.pop(args[1], None) is not None))
+            else:
+                self.wfile.write(b"-ERR unknown command\r\n")
+
+
+@pytest.fixture
+def resp_server():
+    server = socketserver.ThreadingTCPServer(("127.0.0.1", 0), RESPHandler)
+    server.daemon_threads = True
+    server.store = {}
+    server.commands = []
+    Thread(target=server.serve_forever, daemon=True).start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+class TestCacheBackend:
+    def test_dict_backend_write_through(self, offline_client):
+        backend = DictCacheBackend()
+        offline_client.set_cache_backend(backend)
+        offline_client.event_parser._handle(
+            "GUILD_CREATE", make_guild_payload())
+
+        assert backend.get_guild("100")['name'] == "guild_100"
+        assert "members" not in backend.get_guild("100")
+        assert backend.get_channel("1000")['name'] == "channel_0"
+        assert backend.get_member("100", "1001")['user']['id'] == "1001"
+
+        offline_client.event_parser._handle("CHANNEL_DELETE", {
+            "id": "1000", "type": 0, "guild_id": "100"
+        })
+
+        assert backend.get_channel("1000") is None
+
+    def test_redis_backend_pipelines(self, offline_client, resp_server):
+        host, port = resp_server.server_address
+        backend = RedisCacheBackend(host, port, prefix="test:")
+        offline_client.set_cache_backend(backend)
+
+        try:
+            offline_client._dispatcher({
+                "op": 0, "s": 1, "t": "GUILD_CREATE",
+                "d": make_guild_payload()
+            })
+
+            assert not backend._pending
+            assert len(resp_server.commands) == 5
+            assert backend.get_channel("1001")['name'] == "channel_1"
+            assert backend.get_member("100", "1000")['user']['id'] == "1000"
+        finally:
+            backend.close()
+
+    def test_redis_backend_error(self, resp_server):
+        host, port = resp_server.server_address
+        backend = RedisCacheBackend(host, port)
+
+        try:
+            backend._queue("NOPE")
+            backend.set("key", 1)
+            with pytest.raises(CacheBackendError):
+                backend.flush()
+
+            assert backend.get("key") == 1
+        finally:
+            backend.close()
+
+    def test_redis_backend_unreachable(self, offline_client, resp_server):
+        # Port nothing listens on
+        sock = socket.socket()
+        sock.bind(("127.0.0.1", 0))
+        port = sock.getsockname()[1]
+        sock.close()
+        backend = RedisCacheBackend("127.0.0.1", port, max_pipeline=2)
+        offline_client.set_cache_backend(backend)
+        handled = []
+        offline_client.handler.handle = \
+            lambda event, obj: handled.append(event)
+
+        try:
+            offline_client._dispatcher({
+                "op": 0, "s": 1, "t": "GUILD_CREATE",
+                "d": make_guild_payload()
+            })
+
+            assert handled == ["GUILD_CREATE"]
+            assert offline_client.get_member("100", "1001") is not None
+            assert len(backend._pending) == 5
+
+            # Failed batch gets sent once the server is back
+            backend.host, backend.port = resp_server.server_address
+            backend._retry_at = 0
+            backend.flush()
+
+            assert not backend._pending
+            assert backend.get_member("100", "1001")['user']['id'] == "1001"
+        finally:
+            backend.close()
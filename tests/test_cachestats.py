@@ -0,0 +1,92 @@
+from .conftest import make_guild_payload
+
+import os
+import sys
+import itertools
+
+projpath = os.path.normpath(os.path.join(os.path.abspath(__file__), "../.."))
+sys.path.insert(0, projpath)
+
+from discordapi import CacheStatsReporter, MessageCache, PresenceStore
+
+
+class TestCacheStats:
+    def test_counts_per_type_and_guild(self, offline_client):
+        client = offline_client
+        client.event_parser._handle(
+            "GUILD_CREATE", make_guild_payload("100", 2, 10))
+        client.event_parser._handle(
+            "GUILD_CREATE", make_guild_payload("200", 3, 200))
+        stats = client.cache_stats(sample_size=20)
+
+        assert stats['types']['guilds']['count'] == 2
+        assert stats['types']['channels']['count'] == 5
+        assert stats['types']['members']['count'] == 210
+        assert stats['guilds']['200']['members'] == 200
+        assert stats['guilds']['200']['bytes'] > \
+            stats['guilds']['100']['bytes'] > 0
+        assert stats['bytes'] >= sum(
+            guild['bytes'] for guild in stats['guilds'].values())
+
+    def test_leaves_no_snapshots(self, offline_client):
+        client = offline_client
+        guild = client.event_parser._handle(
+            "GUILD_CREATE", make_guild_payload("100", 2, 10))
+        client.cache_stats()
+
+        # Snapshots would keep a copy of every cache until its next write
+        for cache in (client.guilds, client.channels, client.users,
+                      guild.channels, guild.members):
+            assert cache._snapshot is None
+
+    def test_reporter_top_guilds(self, offline_client):
+        client = offline_client
+        for guild_id, members in (("100", 5), ("200", 50), ("300", 20)):
+            client.event_parser._handle(
+                "GUILD_CREATE", make_guild_payload(guild_id, 1, members))
+        reports = []
+        reporter = CacheStatsReporter(
+            top=2, callback=lambda stats, top: reports.append(top))
+        reporter.set_client(client)
+        reporter.report()
+
+        assert [guild_id for guild_id, _ in reports[0]] == ["200", "300"]
+
+    def test_safe_while_gateway_mutates(self, offline_client, monkeypatch):
+        client = offline_client
+        client.set_message_cache(MessageCache)
+        client.set_presence_store(PresenceStore)
+        parser = client.event_parser
+        guild = parser._handle(
+            "GUILD_CREATE", make_guild_payload("100", 2, 10))
+        cachestats = sys.modules["discordapi.cachestats"]
+        sizeof = cachestats.sizeof
+        counter = itertools.count()
+
+        def mutating_sizeof(obj, *args, **kwargs):
+            # Gateway thread updating the cache while it's being measured
+            i = next(counter)
+            if i >= 50:
+                return sizeof(obj, *args, **kwargs)
+            user = {"id": f"9{i}", "username": "user",
+                    "discriminator": "0001"}
+            guild._json[f"extra_{i}"] = i
+            setattr(guild, f"extra_{i}", i)
+            parser._handle("CHANNEL_CREATE", {
+                "id": f"8{i}", "type": 0, "guild_id": "100"})
+            parser._handle("GUILD_MEMBER_ADD", {
+                "guild_id": "100", "user": user, "roles": []})
+            parser._handle("MESSAGE_CREATE", {
+                "id": str(i), "channel_id": "1000", "guild_id": "100",
+                "content": "hello", "author": user})
+            parser._handle("PRESENCE_UPDATE", {
+                "guild_id": "100", "user": user, "status": "online",
+                "activities": [{"name": str(i), "type": 0}]})
+            return sizeof(obj, *args, **kwargs)
+
+        monkeypatch.setattr(cachestats, "sizeof", mutating_sizeof)
+        stats = client.cache_stats(sample_size=1000)
+
+        # Counted as of when each cache was copied
+        assert stats['types']['members']['count'] == 10
+        assert stats['types']['channels']['count'] == 2
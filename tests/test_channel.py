@@ -1,8 +1,9 @@
 import pytest
-from .conftest import wanted_env, unwanted_env
+from .conftest import wanted_env, unwanted_env, make_guild_payload
 
 import os
 import sys
+import json
 
 projpath = os.path.normpath(os.path.join(os.path.abspath(__file__), "../.."))
 sys.path.insert(0, projpath)
@@ -71,6 +72,11 @@ class TestChannel:
             file=File(__file__)
         )
 
+        channel.send(
+            content="Testing multiple Files",
+            files=[File(__file__), File(("second.txt", b"second"))]
+        )
+
         channel.send(
             content="Testing reply_to Message obj behaviour",
             reply_to=plain_msg
@@ -139,3 +145,40 @@ class TestChannel:
 
         assert msg1 not in pinned
         assert msg2 not in pinned
+
+
+class TestChannelFiles:
+    def test_send_files_in_one_request(self, offline_client):
+        client = offline_client
+        client.event_parser._handle("GUILD_CREATE", make_guild_payload())
+        channel = client.get_channel("1000")
+        requests = []
+
+        def send_request(method, route, data, *args):
+            requests.append((route, data, args[-1]))
+            return {"id": "1", "channel_id": "1000", "author": {
+                "id": "1", "username": "bot", "discriminator": "0001"}}
+
+        client.send_request = send_request
+        channel.send("hello", files=[
+            File(("a.txt", b"first")), File(("b.txt", b"second"))
+        ])
+        channel.edit_message(
+            "1", file=File(("c.txt", b"third")),
+            attachments=[{"id": "10"}]
+        )
+
+        (route, body, headers), (_, edit_body, _) = requests
+        data = b"".join(bytes(chunk) for chunk in body)
+        payload = json.loads(
+            data.split(b'name="payload_json"\r\n\r\n')[1].split(b"\r\n")[0])
+        edit_data = b"".join(bytes(chunk) for chunk in edit_body)
+
+        assert route == "/channels/1000/messages"
+        assert headers['Content-Type'] == body.content_type
+        assert b'name="files[0]"; filename="a.txt"' in data
+        assert b'name="files[1]"; filename="b.txt"' in data
+        assert payload['attachments'] == [
+            {"id": 0, "filename": "a.txt"}, {"id": 1, "filename": "b.txt"}
+        ]
+        assert b'[{"id": "10"}, {"id": 0, "filename": "c.txt"}]' in edit_data
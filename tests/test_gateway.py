@@ -0,0 +1,288 @@
+from .conftest import make_guild_payload
+
+import os
+import sys
+from threading import Event
+
+projpath = os.path.normpath(os.path.join(os.path.abspath(__file__), "../.."))
+sys.path.insert(0, projpath)
+
+from discordapi import CacheNoMembers, CacheVoiceMembers, CacheRecentMembers
+
+
+class TestEntityIndex:
+    def test_guild_create_indexes(self, offline_client):
+        client = offline_client
+        client.event_parser._handle("GUILD_CREATE", make_guild_payload())
+
+        assert client.get_channel("1000").name == "channel_0"
+        assert client.get_user("1001").username == "user_1"
+        assert client.get_member("100", "1001").user.id == "1001"
+
+    def test_guild_delete_unindexes(self, offline_client):
+        client = offline_client
+        client.event_parser._handle("GUILD_CREATE", make_guild_payload())
+        client.event_parser._handle("GUILD_DELETE", {"id": "100"})
+
+        assert client.get_channel("1000") is None
+        assert client.get_user("1001") is None
+        assert not client.members
+
+    def test_user_shared_between_guilds(self, offline_client):
+        client = offline_client
+        shared = {"user": {"id": "42", "username": "shared",
+                           "discriminator": "0001"}, "roles": []}
+        for guild_id in ("100", "200"):
+            payload = make_guild_payload(guild_id)
+            payload['members'].append(dict(shared))
+            client.event_parser._handle("GUILD_CREATE", payload)
+
+        client.event_parser._handle("GUILD_MEMBER_REMOVE", {
+            "guild_id": "100", "user": shared['user']
+        })
+
+        assert client.get_member("100", "42") is None
+        assert client.get_user("42") is not None
+
+    def test_member_add(self, offline_client):
+        client = offline_client
+        client.event_parser._handle("GUILD_CREATE", make_guild_payload())
+        client.event_parser._handle("GUILD_MEMBER_ADD", {
+            "guild_id": "100", "roles": [],
+            "user": {"id": "7", "username": "new", "discriminator": "0001"}
+        })
+
+        assert client.get_guild("100").members["7"].user.username == "new"
+        assert client.get_user("7").username == "new"
+
+
+class TestMemberCachePolicy:
+    def test_no_members_keeps_self(self, offline_client):
+        client = offline_client
+        client.set_member_cache_policy(CacheNoMembers)
+        payload = make_guild_payload()
+        payload['members'].append({"user": {
+            "id": "1", "username": "bot", "discriminator": "0001"
+        }})
+        client.event_parser._handle("GUILD_CREATE", payload)
+
+        assert list(client.get_guild("100").members) == ["1"]
+
+    def test_voice_members(self, offline_client):
+        client = offline_client
+        client.set_member_cache_policy(CacheVoiceMembers)
+        payload = make_guild_payload()
+        payload['voice_states'] = [{"user_id": "1001", "channel_id": "1000"}]
+        client.event_parser._handle("GUILD_CREATE", payload)
+        guild = client.get_guild("100")
+
+        assert list(guild.members) == ["1001"]
+
+        client.event_parser._handle("VOICE_STATE_UPDATE", {
+            "guild_id": "100", "channel_id": None, "user_id": "1001",
+            "member": payload['members'][1]
+        })
+
+        assert not guild.members
+        assert client.get_member("100", "1001") is None
+
+    def test_recent_members(self, offline_client):
+        client = offline_client
+        client.set_member_cache_policy(CacheRecentMembers(max_members=1))
+        client.event_parser._handle("GUILD_CREATE", make_guild_payload())
+        guild = client.get_guild("100")
+
+        assert not guild.members
+
+        for user_id in ("1000", "1001"):
+            client.event_parser._handle("MESSAGE_CREATE", {
+                "id": user_id, "channel_id": "1000", "guild_id": "100",
+                "content": "", "member": {"roles": []},
+                "author": {"id": user_id, "username": "user",
+                           "discriminator": "0001"}
+            })
+
+        assert list(guild.members) == ["1001"]
+
+    def test_fetch_members(self, offline_client):
+        client = offline_client
+        client.set_member_cache_policy(CacheNoMembers)
+        client.event_parser._handle("GUILD_CREATE", make_guild_payload())
+        members = make_guild_payload(member_count=3)['members']
+
+        def request_guild_member(guild_id, query, limit, presences,
+                                 user_ids, nonce):
+            for index, member in enumerate(members):
+                client.event_parser._handle("GUILD_MEMBERS_CHUNK", {
+                    "guild_id": guild_id, "members": [member],
+                    "chunk_index": index, "chunk_count": len(members),
+                    "nonce": nonce
+                })
+        client.request_guild_member = request_guild_member
+
+        fetched = list(client.get_guild("100").fetch_members(timeout=1))
+
+        assert [member.user.id for member in fetched] == \
+            ["1000", "1001", "1002"]
+        assert not client.get_guild("100").members
+        assert not client.chunk_queue
+
+
+class TestInPlaceUpdate:
+    def test_guild_update_keeps_children(self, offline_client):
+        client = offline_client
+        client.event_parser._handle("GUILD_CREATE", make_guild_payload())
+        guild = client.get_guild("100")
+        channel = guild.channels["1000"]
+        member = guild.members["1000"]
+
+        obj = client.event_parser._handle("GUILD_UPDATE", {
+            "id": "100", "name": "renamed"
+        })
+
+        assert obj is guild
+        assert guild.name == "renamed"
+        assert guild.channels["1000"] is channel
+        assert guild.members["1000"] is member
+
+    def test_guild_create_replaces_state(self, offline_client):
+        client = offline_client
+        policy = CacheRecentMembers()
+        client.set_member_cache_policy(policy)
+        payload = make_guild_payload()
+        payload['voice_states'] = [{"user_id": "1000", "channel_id": "1000"}]
+        client.event_parser._handle("GUILD_CREATE", payload)
+        guild = client.get_guild("100")
+        for user_id in ("1000", "1001"):
+            client.event_parser._handle(
+                "VOICE_STATE_UPDATE", voice_state("100", user_id, "1000"))
+
+        # Guild comes back after an outage, with fewer members in voice
+        payload = make_guild_payload(member_count=1)
+        payload['member_count'] = 1
+        payload['voice_states'] = [{"user_id": "1000", "channel_id": "1001"}]
+        client.event_parser._handle("GUILD_CREATE", payload)
+
+        assert client.get_guild("100") is guild
+        assert guild.get_voice_members("1000") == frozenset()
+        assert guild.get_voice_members("1001") == {"1000"}
+        assert "1001" not in guild.voice_state
+        assert list(guild.members) == ["1000"]
+        assert not policy.check(guild, "1001")
+
+    def test_update_pairs(self, offline_client):
+        client = offline_client
+        client.emit_update_pairs = True
+        client.event_parser._handle("GUILD_CREATE", make_guild_payload())
+
+        before, after = client.event_parser._handle("CHANNEL_UPDATE", {
+            "id": "1000", "type": 0, "guild_id": "100", "name": "renamed"
+        })
+
+        assert before.name == "channel_0"
+        assert after.name == "renamed"
+        assert after is client.get_channel("1000")
+
+    def test_member_update_nested_user(self, offline_client):
+        client = offline_client
+        client.emit_update_pairs = True
+        client.event_parser._handle("GUILD_CREATE", make_guild_payload())
+
+        before, after = client.event_parser._handle("GUILD_MEMBER_UPDATE", {
+            "guild_id": "100", "roles": ["1"], "nick": "nick",
+            "user": {"id": "1000", "username": "renamed",
+                     "discriminator": "0001"}
+        })
+
+        assert before.user.username == "user_0"
+        assert after.user.username == "renamed"
+        assert after.nick == "nick"
+        assert client.get_user("1000").username == "renamed"
+
+
+def voice_state(guild_id, user_id, channel_id):
+    return {
+        "guild_id": guild_id, "channel_id": channel_id, "user_id": user_id,
+        "session_id": "session",
+        "member": {"roles": [], "user": {
+            "id": user_id, "username": "user", "discriminator": "0001"
+        }}
+    }
+
+
+class TestVoiceIndex:
+    def test_members_by_channel(self, offline_client):
+        client = offline_client
+        payload = make_guild_payload()
+        payload['voice_states'] = [{"user_id": "1000", "channel_id": "1000"}]
+        client.event_parser._handle("GUILD_CREATE", payload)
+        guild = client.get_guild("100")
+
+        assert guild.get_voice_members("1000") == {"1000"}
+
+        client.event_parser._handle(
+            "VOICE_STATE_UPDATE", voice_state("100", "1001", "1000"))
+        client.event_parser._handle(
+            "VOICE_STATE_UPDATE", voice_state("100", "1000", "1001"))
+
+        assert guild.get_voice_members("1000") == {"1001"}
+        assert guild.get_voice_members("1001") == {"1000"}
+
+        client.event_parser._handle(
+            "VOICE_STATE_UPDATE", voice_state("100", "1001", None))
+
+        assert "1000" not in guild.voice_members
+        assert "1001" not in guild.voice_state
+
+    def test_auto_leave(self, offline_client):
+        client = offline_client
+        payload = make_guild_payload()
+        payload['channels'][0]['type'] = 2
+        client.event_parser._handle("GUILD_CREATE", payload)
+        left = Event()
+        client.update_voice_state = lambda guild_id, channel_id: left.set()
+        client.add_voice_queue = lambda *args: None
+        channel = client.get_channel("1000")
+        channel.set_auto_leave(0)
+
+        client.event_parser._handle(
+            "VOICE_STATE_UPDATE", voice_state("100", "1", "1000"))
+        client.event_parser._handle(
+            "VOICE_STATE_UPDATE", voice_state("100", "1000", "1000"))
+
+        assert not channel.is_bot_alone()
+        assert channel.get_voice_member_count() == 2
+
+        client.event_parser._handle(
+            "VOICE_STATE_UPDATE", voice_state("100", "1000", None))
+
+        assert left.wait(1)
+
+    def test_auto_leave_ignores_other_channels(self, offline_client):
+        client = offline_client
+        payload = make_guild_payload()
+        payload['channels'][0]['type'] = 2
+        payload['channels'][1]['type'] = 2
+        client.event_parser._handle("GUILD_CREATE", payload)
+        left = Event()
+        client.update_voice_state = lambda guild_id, channel_id: left.set()
+        client.add_voice_queue = lambda *args: None
+        client.get_channel("1000").set_auto_leave(0.5)
+
+        client.event_parser._handle(
+            "VOICE_STATE_UPDATE", voice_state("100", "1", "1000"))
+        timer = client._auto_leave_timers["100"]
+
+        for channel_id in ("1001", None, "1001"):
+            client.event_parser._handle(
+                "VOICE_STATE_UPDATE", voice_state("100", "1000", channel_id))
+
+        assert client._auto_leave_timers["100"] is timer
+        assert left.wait(2)
+
+        client.event_parser._handle(
+            "VOICE_STATE_UPDATE", voice_state("100", "1001", "1001"))
+
+        assert client.get_guild("100").get_voice_members("1001") == \
+            {"1000", "1001"}
+        assert client.get_channel("1001").get_voice_member_count() == 2
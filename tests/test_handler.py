@@ -0,0 +1,60 @@
+import os
+import sys
+import time
+from threading import Thread
+
+projpath = os.path.normpath(os.path.join(os.path.abspath(__file__), "../.."))
+sys.path.insert(0, projpath)
+
+from discordapi import GeneratorEventHandler
+
+
+def queued(handler):
+    return [obj for _, obj in handler.event_queue.queue]
+
+
+class TestGeneratorEventHandler:
+    def test_overflow_policies(self, offline_client):
+        drop_new = GeneratorEventHandler(offline_client, 2, "drop_new")
+        drop_old = GeneratorEventHandler(offline_client, 2, "drop_old")
+        for i in range(4):
+            drop_new.handle("EVENT", i)
+            drop_old.handle("EVENT", i)
+
+        assert queued(drop_new) == [0, 1]
+        assert queued(drop_old) == [2, 3]
+        assert drop_new.dropped == drop_old.dropped == 2
+
+    def test_block_until_consumed(self, offline_client):
+        handler = GeneratorEventHandler(offline_client, 1)
+        handler.handle("EVENT", 0)
+        thread = Thread(target=handler.handle, args=("EVENT", 1))
+        thread.start()
+        time.sleep(0.05)
+
+        assert thread.is_alive()
+        assert next(handler.event_generator()) == ("EVENT", 0)
+        thread.join(1)
+        assert queued(handler) == [1]
+
+    def test_batch_generator(self, offline_client):
+        handler = GeneratorEventHandler(offline_client)
+        for i in range(5):
+            handler.handle("EVENT", i)
+        gen = handler.batch_generator(max_batch=3, max_wait=0.01)
+
+        assert [obj for _, obj in next(gen)] == [0, 1, 2]
+        assert [obj for _, obj in next(gen)] == [3, 4]
+
+    def test_batch_generator_stops(self, offline_client):
+        handler = GeneratorEventHandler(offline_client)
+        batches = []
+        thread = Thread(target=lambda: batches.extend(
+            handler.batch_generator()), daemon=True)
+        thread.start()
+        time.sleep(0.05)
+        offline_client.stop_flag.set()
+
+        thread.join(3)
+        assert not thread.is_alive()
+        assert batches == []
@@ -0,0 +1,62 @@
+from .conftest import FakeResponse
+
+import os
+import sys
+import json
+
+projpath = os.path.normpath(os.path.join(os.path.abspath(__file__), "../.."))
+sys.path.insert(0, projpath)
+
+from discordapi import HTTPTelemetry
+
+
+class TestHTTPTelemetry:
+    def test_records_requests(self, offline_client):
+        client = offline_client
+        events = []
+        client.http_telemetry.add_callback(events.append)
+        responses = [
+            FakeResponse(429, json.dumps(
+                {"retry_after": 0.05, "global": False}).encode(),
+                {"X-RateLimit-Scope": "shared"}),
+            FakeResponse(200, b'{"id": "1"}'),
+            FakeResponse(204)
+        ]
+
+        def send_request(method, route, data=None, baseurl=None,
+                         headers=None, timeout=None):
+            response = responses.pop(0)
+            return response, response.status >= 400
+
+        client._send_request = send_request
+        client.send_request("GET", "/channels/1/messages?limit=5")
+        client.send_request("PATCH", "/channels/2", {"name": "test"})
+
+        stats = client.http_stats()
+        messages = stats['routes']["GET /channels/{id}/messages"]
+        assert messages['count'] == 2
+        assert messages['statuses'] == {429: 1, 200: 1}
+        assert messages['ratelimited'] == {"shared": 1}
+        assert messages['ratelimit_wait'] >= 0.04
+        assert messages['bytes_in'] == len(json.dumps(
+            {"retry_after": 0.05, "global": False})) + len(b'{"id": "1"}')
+        assert stats['routes']["PATCH /channels/{id}"]['bytes_out'] == \
+            len(b'{"name": "test"}')
+        assert stats['total']['count'] == 3
+        assert sum(count for _, count in
+                   stats['total']['latency']['histogram']) == 3
+        assert [event['status'] for event in events] == [429, 200, 204]
+
+    def test_percentiles(self):
+        telemetry = HTTPTelemetry()
+        for latency in [0.01] * 90 + [0.3] * 9 + [3]:
+            telemetry.record("GET", "/users/{id}", 200, latency)
+
+        latency = telemetry.get_snapshot()['total']['latency']
+        assert latency['p50'] == 0.025
+        assert latency['p95'] == 0.5
+        assert latency['p99'] == 0.5
+        assert latency['max'] == 3
+
+        telemetry.reset()
+        assert telemetry.get_snapshot()['total']['count'] == 0
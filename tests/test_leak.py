@@ -0,0 +1,65 @@
+from .conftest import make_guild_payload
+
+import os
+import sys
+import gc
+import time
+import weakref
+
+projpath = os.path.normpath(os.path.join(os.path.abspath(__file__), "../.."))
+sys.path.insert(0, projpath)
+
+# Set LEAK_TEST_SECONDS to churn for the given duration instead, e.g. 3600
+ITERATIONS = int(os.environ.get("LEAK_TEST_ITERATIONS", 200))
+DURATION = float(os.environ.get("LEAK_TEST_SECONDS", 0))
+
+
+def make_message(id_, guild_id):
+    return {
+        "id": id_, "channel_id": f"{guild_id}0", "guild_id": guild_id,
+        "content": "hello",
+        "author": {"id": f"{guild_id}0", "username": "user_0",
+                   "discriminator": "0001"},
+        "member": {"roles": []}
+    }
+
+
+class TestGuildChurn:
+    def test_removed_guilds_are_freed(self, offline_client):
+        client = offline_client
+        client.weak_references = True
+        parser = client.event_parser
+
+        # Messages kept around, as they would be in a long event queue
+        retained = []
+        guilds = []
+        deadline = time.monotonic() + DURATION
+        i = 0
+
+        while i < ITERATIONS or time.monotonic() < deadline:
+            guild_id = str(1000 + i % 50)
+            guild = parser._handle(
+                "GUILD_CREATE", make_guild_payload(guild_id, 3, 20))
+            removed = weakref.ref(guild)
+            guilds.append(removed)
+            retained.append(parser._handle(
+                "MESSAGE_CREATE", make_message(str(i), guild_id)))
+            retained.append(guild.members[f"{guild_id}0"])
+            del guild
+            parser._handle("GUILD_DELETE", {"id": guild_id})
+            i += 1
+
+            if len(guilds) >= 100:
+                gc.collect()
+                guilds = [ref for ref in guilds if ref() is not None]
+                assert not guilds
+                retained = retained[-100:]
+
+        gc.collect()
+        assert not [ref for ref in guilds if ref() is not None]
+        # guilds could have just been emptied, the last one is always checked
+        assert removed() is None
+
+        message = retained[-2]
+        assert message.guild is None
+        assert message.member.guild is None
@@ -0,0 +1,65 @@
+from .conftest import make_guild_payload
+
+import os
+import sys
+
+projpath = os.path.normpath(os.path.join(os.path.abspath(__file__), "../.."))
+sys.path.insert(0, projpath)
+
+from discordapi import MessageCache
+
+
+def make_message(id_, channel_id="1000", content="hello"):
+    return {
+        "id": id_, "channel_id": channel_id, "guild_id": "100",
+        "content": content,
+        "author": {"id": "1000", "username": "user_0",
+                   "discriminator": "0001"}
+    }
+
+
+class TestMessageCache:
+    def setup_client(self, client, **kwargs):
+        client.event_parser._handle("GUILD_CREATE", make_guild_payload())
+        client.set_message_cache(MessageCache(**kwargs))
+        return client.event_parser
+
+    def test_create_update_delete(self, offline_client):
+        parser = self.setup_client(offline_client)
+        parser._handle("MESSAGE_CREATE", make_message("1"))
+
+        assert offline_client.get_cached_message("1").content == "hello"
+
+        parser._handle("MESSAGE_UPDATE", {
+            "id": "1", "channel_id": "1000", "content": "edited"
+        })
+        message = offline_client.get_cached_message("1")
+
+        assert message.content == "edited"
+        assert message.author.username == "user_0"
+
+        parser._handle("MESSAGE_DELETE", {"id": "1", "channel_id": "1000"})
+
+        assert offline_client.get_cached_message("1") is None
+
+    def test_limits(self, offline_client):
+        parser = self.setup_client(
+            offline_client, max_messages=3, max_per_channel=2)
+        for id_ in ("1", "2", "3"):
+            parser._handle("MESSAGE_CREATE", make_message(id_))
+        parser._handle("MESSAGE_CREATE", make_message("4", "1001"))
+        parser._handle("MESSAGE_CREATE", make_message("5", "1001"))
+
+        cache = offline_client.message_cache
+
+        assert len(cache) == 3
+        assert cache.get("1") is None
+        assert cache.get("2") is None
+        assert cache.get("3") is not None
+
+    def test_ttl_and_stats(self, offline_client):
+        parser = self.setup_client(offline_client, ttl=0)
+        parser._handle("MESSAGE_CREATE", make_message("1"))
+
+        assert offline_client.get_cached_message("1") is None
+        assert offline_client.message_cache.get_stats()['misses'] == 1
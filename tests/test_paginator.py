@@ -0,0 +1,83 @@
+from .conftest import make_guild_payload
+
+import os
+import sys
+from urllib.parse import urlparse, parse_qs
+
+projpath = os.path.normpath(os.path.join(os.path.abspath(__file__), "../.."))
+sys.path.insert(0, projpath)
+
+from discordapi import Paginator
+
+
+def make_messages(count):
+    return [
+        {"id": str(id_), "channel_id": "1000", "content": str(id_),
+         "author": {"id": "1000", "username": "user_0",
+                    "discriminator": "0001"}}
+        for id_ in range(1, count + 1)
+    ]
+
+
+def fake_history(messages, requests):
+    def send_request(method, route, *args):
+        query = {
+            key: int(value[0])
+            for key, value in parse_qs(urlparse(route).query).items()
+        }
+        requests.append(query)
+        limit = query.get("limit", 50)
+        if "after" in query:
+            page = [m for m in messages if int(m['id']) > query['after']]
+            page = page[:limit]
+        else:
+            before = query.get("before", len(messages) + 1)
+            page = [m for m in messages if int(m['id']) < before]
+            page = page[-limit:]
+        return list(reversed(page))
+    return send_request
+
+
+class TestPaginator:
+    def test_pages_until_exhausted(self):
+        requests = []
+
+        def fetch(cursor, count):
+            requests.append((cursor, count))
+            start = 0 if cursor is None else cursor
+            items = list(range(start, min(start + count, 25)))
+            return items, start + len(items)
+
+        items = list(Paginator(fetch, 10, cursor=None))
+
+        assert items == list(range(25))
+        assert requests == [(None, 10), (10, 10), (20, 10)]
+        assert list(Paginator(fetch, 10, limit=12, cursor=None)) == \
+            list(range(12))
+
+    def test_history(self, offline_client):
+        client = offline_client
+        client.event_parser._handle("GUILD_CREATE", make_guild_payload())
+        channel = client.get_channel("1000")
+        requests = []
+        client.send_request = fake_history(make_messages(250), requests)
+
+        ids = [int(message.id) for message in channel.history()]
+        assert ids == list(range(250, 0, -1))
+        assert len(requests) == 3
+
+        ids = [int(message.id) for message in channel.history(after="200")]
+        assert ids == list(range(201, 251))
+
+        ids = [
+            int(message.id)
+            for message in channel.history(limit=150, before="240")
+        ]
+        assert ids == list(range(239, 89, -1))
+        assert requests[-1] == {"limit": 50, "before": 140}
+
+        ids = [
+            int(message.id)
+            for message in channel.history(before="120", after="10")
+        ]
+        assert ids == list(range(119, 10, -1))
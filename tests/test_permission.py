@@ -0,0 +1,109 @@
+from .conftest import make_guild_payload
+
+import os
+import sys
+
+projpath = os.path.normpath(os.path.join(os.path.abspath(__file__), "../.."))
+sys.path.insert(0, projpath)
+
+from discordapi import permission
+from discordapi.permission import VIEW_CHANNEL, SEND_MESSAGES, ADMINISTRATOR
+
+
+def setup_guild(client):
+    payload = make_guild_payload()
+    payload['owner_id'] = "1"
+    payload['roles'] = [
+        {"id": "100", "name": "@everyone",
+         "permissions": str(VIEW_CHANNEL | SEND_MESSAGES)},
+        {"id": "200", "name": "muted", "permissions": "0"}
+    ]
+    payload['channels'][0]['permission_overwrites'] = [
+        {"id": "200", "type": 0, "allow": "0", "deny": str(SEND_MESSAGES)},
+    ]
+    payload['members'][1]['roles'] = ["200"]
+    client.event_parser._handle("GUILD_CREATE", payload)
+    return client.get_guild("100")
+
+
+class TestPermissionResolver:
+    def test_overwrites(self, offline_client):
+        guild = setup_guild(offline_client)
+        channel = guild.channels["1000"]
+        member = guild.members["1000"]
+        muted = guild.members["1001"]
+
+        assert member.get_permissions(channel) & SEND_MESSAGES
+        assert not muted.get_permissions(channel) & SEND_MESSAGES
+        assert muted.get_permissions(guild.channels["1001"]) & SEND_MESSAGES
+
+    def test_role_events_invalidate(self, offline_client):
+        guild = setup_guild(offline_client)
+        channel = guild.channels["1000"]
+        muted = guild.members["1001"]
+        resolver = offline_client.permission_resolver
+
+        assert not resolver.has(muted, SEND_MESSAGES, channel)
+
+        offline_client.event_parser._handle("GUILD_ROLE_UPDATE", {
+            "guild_id": "100",
+            "role": {"id": "200", "name": "muted",
+                     "permissions": str(ADMINISTRATOR)}
+        })
+
+        assert resolver.has(muted, SEND_MESSAGES, channel)
+
+        offline_client.event_parser._handle("GUILD_ROLE_DELETE", {
+            "guild_id": "100", "role_id": "200"
+        })
+
+        assert muted.get_permissions() == VIEW_CHANNEL | SEND_MESSAGES
+        assert "200" not in guild.role_map
+
+    def test_channel_update_invalidates(self, offline_client):
+        guild = setup_guild(offline_client)
+        member = guild.members["1000"]
+
+        assert member.get_permissions(guild.channels["1001"]) & VIEW_CHANNEL
+
+        offline_client.event_parser._handle("CHANNEL_UPDATE", {
+            "id": "1001", "type": 0, "guild_id": "100",
+            "permission_overwrites": [
+                {"id": "100", "type": 0, "allow": "0",
+                 "deny": str(VIEW_CHANNEL)}
+            ]
+        })
+
+        assert member.get_permissions(guild.channels["1001"]) == 0
+
+    def test_owner_has_everything(self, offline_client):
+        guild = setup_guild(offline_client)
+        offline_client.event_parser._handle("GUILD_MEMBER_ADD", {
+            "guild_id": "100", "roles": [],
+            "user": {"id": "1", "username": "bot", "discriminator": "0001"}
+        })
+
+        assert guild.members["1"].get_permissions() == \
+            permission.ALL_PERMISSIONS
+
+    def test_invalidation_during_compute(self, offline_client, monkeypatch):
+        guild = setup_guild(offline_client)
+        muted = guild.members["1001"]
+        resolver = offline_client.permission_resolver
+        compute_base = resolver._compute_base
+
+        def racing_compute_base(guild, member):
+            # Role gets updated after the old roles have been read
+            perms = compute_base(guild, member)
+            offline_client.event_parser._handle("GUILD_ROLE_UPDATE", {
+                "guild_id": "100",
+                "role": {"id": "200", "name": "muted",
+                         "permissions": str(ADMINISTRATOR)}
+            })
+            return perms
+
+        monkeypatch.setattr(resolver, "_compute_base", racing_compute_base)
+        assert not muted.get_permissions() & ADMINISTRATOR
+        monkeypatch.setattr(resolver, "_compute_base", compute_base)
+
+        assert muted.get_permissions() == permission.ALL_PERMISSIONS
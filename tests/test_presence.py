@@ -0,0 +1,75 @@
+from .conftest import make_guild_payload
+
+import os
+import sys
+
+projpath = os.path.normpath(os.path.join(os.path.abspath(__file__), "../.."))
+sys.path.insert(0, projpath)
+
+from discordapi import PresenceStore
+
+
+def make_presence(user_id, status, guild_id="100", activities=None):
+    return {
+        "user": {"id": user_id}, "guild_id": guild_id, "status": status,
+        "activities": activities or []
+    }
+
+
+class TestPresenceStore:
+    def test_packed_ids(self):
+        store = PresenceStore(merge_threshold=2)
+        store.update(make_presence("2", "online"))
+
+        assert store.get_stats()['pending'] == 1
+        assert store.get_status("2") == "online"
+
+        store.update(make_presence("1", "dnd"))
+        store.update(make_presence("3", "idle"))
+
+        assert list(store._ids) == [1, 2]
+        assert store.get_status("1") == "dnd"
+        assert store.get_status("3") == "idle"
+        assert store.get_status("4") == "offline"
+
+        store.update(make_presence("1", "offline"))
+        store.update(make_presence("2", "idle"))
+
+        assert len(store) == 2
+        assert store.get_status("1") == "offline"
+        assert store.get_stats() == {
+            "online": 0, "idle": 2, "dnd": 0,
+            "packed": 2, "pending": 1, "activities": 0
+        }
+
+        store.update(make_presence("4", "online"))
+
+        assert list(store._ids) == [2, 3, 4]
+        assert len(store) == 3
+
+    def test_guild_filter_and_activities(self):
+        store = PresenceStore(guilds=["100"], max_activities=1)
+        game = [{"name": "game", "type": 0}]
+
+        assert not store.update(make_presence("1", "online", "200", game))
+        store.update(make_presence("1", "online", activities=game))
+        store.update(make_presence("2", "online", activities=game))
+
+        assert not store.is_online("3")
+        assert store.get_activities("1") is None
+        assert store.get_activities("2") == game
+
+    def test_gateway_events(self, offline_client):
+        client = offline_client
+        client.set_presence_store(PresenceStore)
+        payload = make_guild_payload()
+        payload['presences'] = [make_presence("1000", "idle", None)]
+        client.event_parser._handle("GUILD_CREATE", payload)
+
+        assert client.get_guild("100").presences is None
+        assert client.presence_store.get_status("1000") == "idle"
+
+        client.event_parser._handle(
+            "PRESENCE_UPDATE", make_presence("1001", "online"))
+
+        assert client.presence_store.get_status("1001") == "online"
@@ -0,0 +1,79 @@
+from .conftest import make_guild_payload
+
+import os
+import sys
+from threading import Event
+
+projpath = os.path.normpath(os.path.join(os.path.abspath(__file__), "../.."))
+sys.path.insert(0, projpath)
+
+from discordapi import ProcessPoolEventHandler
+from discordapi.handler import MethodEventHandler
+
+
+class EchoHandler(MethodEventHandler):
+    def on_message_create(self, message):
+        if message.content == "crash":
+            os._exit(1)
+        self.client.send_request(
+            "POST", f"/channels/{message.channel_id}/messages",
+            {"content": f"{os.getpid()} {message.guild.name}"}
+        )
+
+
+def make_message(id_, content="hello"):
+    return {
+        "id": id_, "channel_id": "1000", "guild_id": "100",
+        "content": content,
+        "author": {"id": "1000", "username": "user_0",
+                   "discriminator": "0001"}
+    }
+
+
+class TestProcessPoolEventHandler:
+    def test_requests_come_back_to_parent(self, offline_client):
+        client = offline_client
+        requests = []
+        received = Event()
+
+        def send_request(method, route, data, *args):
+            requests.append(data['content'])
+            if len(requests) == 4:
+                received.set()
+
+        client.send_request = send_request
+        handler = ProcessPoolEventHandler(EchoHandler, workers=1)
+        client.set_handler(handler)
+
+        events = [
+            ("READY", {
+                "user": {"id": "1", "username": "bot",
+                         "discriminator": "0001"},
+                "guilds": [], "session_id": "session",
+                "application": {"id": "1"}
+            }),
+            ("GUILD_CREATE", make_guild_payload()),
+            ("MESSAGE_CREATE", make_message("1")),
+            ("GUILD_UPDATE", dict(make_guild_payload(), name="renamed")),
+            ("MESSAGE_CREATE", make_message("2", "crash")),
+        ]
+
+        try:
+            for event, payload in events:
+                handler.handle_raw(event, payload)
+            # Gives the crashed worker time to exit before the next events
+            handler._workers[0].process.join(10)
+            for i in range(3):
+                handler.handle_raw("MESSAGE_CREATE", make_message(str(i)))
+
+            assert received.wait(30)
+        finally:
+            handler.stop()
+
+        assert handler.restarts == 1
+        # The restarted worker got the guild, as updated, replayed to it
+        assert requests[0].endswith("guild_100")
+        assert all(content.endswith("renamed") for content in requests[1:])
+        assert str(os.getpid()) not in {
+            content.split()[0] for content in requests
+        }
@@ -0,0 +1,95 @@
+import os
+import sys
+from threading import Thread, Event
+
+projpath = os.path.normpath(os.path.join(os.path.abspath(__file__), "../.."))
+sys.path.insert(0, projpath)
+
+from discordapi import ResponseCache
+from discordapi.util import get_route_template
+
+
+def user(id_, name="user"):
+    return {"id": id_, "username": name, "discriminator": "0001"}
+
+
+class TestResponseCache:
+    def test_route_template(self):
+        assert get_route_template("/channels/1/messages?limit=5") == \
+            "/channels/{id}/messages"
+        assert get_route_template("webhooks/1/abc/messages/@original") == \
+            "/webhooks/{id}/{token}/messages/@original"
+
+    def test_coalesce_concurrent_requests(self):
+        cache = ResponseCache()
+        release = Event()
+        calls = []
+
+        def fetch():
+            calls.append(1)
+            release.wait(1)
+            return {"id": "1"}
+
+        results = []
+        threads = [
+            Thread(target=lambda: results.append(
+                cache.request("/channels/1/messages?limit=1", fetch)))
+            for _ in range(5)
+        ]
+        for thread in threads:
+            thread.start()
+        release.set()
+        for thread in threads:
+            thread.join()
+
+        assert len(calls) == 1
+        assert results == [{"id": "1"}] * 5
+        # Not in the TTL table, so it's only merged while in flight
+        assert len(cache) == 0
+
+    def test_cache_and_invalidation(self, offline_client):
+        client = offline_client
+        client.set_response_cache(ResponseCache)
+        requests = []
+
+        def request(method, route, *args):
+            requests.append((method, route))
+            return user("5", f"name_{len(requests)}")
+
+        client._request = request
+
+        assert client.fetch_user("5").username == "name_1"
+        assert client.fetch_user("5").username == "name_1"
+
+        client.event_parser._handle("GUILD_MEMBER_UPDATE", {
+            "guild_id": "100", "user": user("5"), "roles": []
+        })
+        assert client.fetch_user("5").username == "name_2"
+
+        client.send_request("PATCH", "/users/5", {})
+        assert client.fetch_user("5").username == "name_4"
+
+        stats = client.response_cache.get_stats()
+        assert stats['hits'] == 1 and stats['misses'] == 3
+
+    def test_write_invalidates_ancestors(self, offline_client):
+        client = offline_client
+        client.set_response_cache(ResponseCache)
+        requests = []
+
+        def request(method, route, *args):
+            requests.append((method, route))
+            return {"version": len(requests)}
+
+        client._request = request
+        roles = "/guilds/100/roles"
+        member = "/guilds/100/members/5"
+
+        first = client.send_request("GET", roles)
+        assert client.send_request("GET", roles) == first
+        client.send_request("PATCH", f"{roles}/7", {})
+        assert client.send_request("GET", roles) != first
+
+        first = client.send_request("GET", member)
+        client.send_request("PUT", f"{member}/roles/7")
+        assert client.send_request("GET", member) != first
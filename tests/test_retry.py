@@ -0,0 +1,164 @@
+import pytest
+from .conftest import FakeResponse
+
+import os
+import sys
+import json
+import time
+import logging
+from urllib.error import URLError
+
+projpath = os.path.normpath(os.path.join(os.path.abspath(__file__), "../.."))
+sys.path.insert(0, projpath)
+
+from discordapi import RetryPolicy, DiscordHTTPError, DiscordRequestError, \
+    DiscordCircuitOpenError, Webhook
+from discordapi.const import LIB_NAME
+
+
+def fake_responses(client, responses):
+    sent = []
+
+    def send_request(method, route, data=None, baseurl=None, headers=None,
+                     timeout=None):
+        sent.append((route, timeout))
+        response = responses.pop(0)
+        if isinstance(response, Exception):
+            raise response
+        return response, response.status >= 400
+
+    client._send_request = send_request
+    return sent
+
+
+def fast_policy(**kwargs):
+    kwargs.setdefault("backoff_base", 0.001)
+    return RetryPolicy(**kwargs)
+
+
+class TestRetryPolicy:
+    def test_retries_errors_with_backoff(self, offline_client):
+        client = offline_client
+        client.set_retry_policy(fast_policy())
+        sent = fake_responses(client, [
+            URLError("connection reset"),
+            FakeResponse(502, b"<html>Bad Gateway</html>"),
+            FakeResponse(429, json.dumps(
+                {"retry_after": 0, "global": False}).encode()),
+            FakeResponse(200, b'{"id": "1"}')
+        ])
+
+        assert client.send_request("GET", "/users/1") == {"id": "1"}
+        assert len(sent) == 4
+        assert all(0 < timeout <= 10 for _, timeout in sent)
+
+    def test_gives_up(self, offline_client):
+        client = offline_client
+        client.set_retry_policy(fast_policy(max_attempts=2))
+        sent = fake_responses(client, [
+            FakeResponse(503, b"<html></html>"),
+            FakeResponse(503, b"<html></html>"),
+            URLError("timed out")
+        ])
+
+        with pytest.raises(DiscordHTTPError) as excinfo:
+            client.send_request("GET", "/users/1")
+        assert excinfo.value.code == 503
+        # Sending a message again could post it twice
+        with pytest.raises(DiscordRequestError) as excinfo:
+            client.send_request("POST", "/channels/1/messages", {})
+        assert excinfo.value.attempts == 1
+        assert len(sent) == 3
+
+    def test_retry_budget(self, offline_client):
+        client = offline_client
+        client.set_retry_policy(fast_policy(retry_budget=1, budget_ratio=0))
+        sent = fake_responses(client, [URLError("down")] * 5)
+
+        with pytest.raises(DiscordRequestError):
+            client.send_request("GET", "/users/1")
+        with pytest.raises(DiscordRequestError):
+            client.send_request("GET", "/users/1")
+        assert len(sent) == 3
+
+    def test_circuit_breaker(self, offline_client):
+        client = offline_client
+        policy = fast_policy(max_attempts=1, breaker_threshold=2,
+                             breaker_cooldown=0.05)
+        client.set_retry_policy(policy)
+        sent = fake_responses(client, [
+            URLError("down"), URLError("down"), FakeResponse(200, b"{}")
+        ])
+
+        for _ in range(2):
+            with pytest.raises(DiscordRequestError):
+                client.send_request("GET", "/channels/1")
+        # Shared by every channel, as it's kept per route template
+        with pytest.raises(DiscordCircuitOpenError):
+            client.send_request("GET", "/channels/2")
+        assert len(sent) == 2
+        assert policy.get_circuit_state("/channels/{id}") == "open"
+
+        time.sleep(0.05)
+        assert client.send_request("GET", "/channels/2") == {}
+        assert policy.get_circuit_state("/channels/{id}") == "closed"
+
+    def test_deadline_bounds_ratelimit_wait(self, offline_client):
+        client = offline_client
+        client.set_retry_policy(fast_policy(deadline=0.2))
+        sent = fake_responses(client, [FakeResponse(200, b"{}")])
+        client.ratelimit_handler.set_limit("global", time.time() + 1.5)
+
+        start = time.monotonic()
+        with pytest.raises(DiscordRequestError):
+            client.send_request("GET", "/users/1")
+        assert time.monotonic() - start < 0.5
+        assert sent == []
+
+        client.ratelimit_handler.limit_list.clear()
+        client.send_request("GET", "/users/1")
+        # Socket timeout is capped to what's left of the deadline
+        assert sent[0][1] <= 0.2
+
+    @pytest.mark.parametrize("telemetry", [True, False])
+    def test_non_json_ratelimit(self, offline_client, telemetry):
+        client = offline_client
+        client.set_retry_policy(fast_policy())
+        if not telemetry:
+            client.set_http_telemetry(None)
+        sent = fake_responses(client, [
+            FakeResponse(429, b"<html>banned</html>", {"Retry-After": "0"}),
+            FakeResponse(200, b'{"id": "1"}'),
+            FakeResponse(429, b"<html>banned</html>")
+        ])
+
+        assert client.send_request("GET", "/users/1") == {"id": "1"}
+        with pytest.raises(DiscordHTTPError) as excinfo:
+            client.send_request("GET", "/users/1")
+        assert excinfo.value.code == 429
+        assert len(sent) == 3
+
+    def test_webhook_token_not_logged(self, caplog):
+        caplog.set_level(logging.DEBUG, logger=LIB_NAME)
+        webhook = Webhook("123", "secret-token")
+        webhook.set_retry_policy(fast_policy(max_attempts=2))
+        fake_responses(webhook, [
+            FakeResponse(502, b"<html>Bad Gateway</html>"),
+            FakeResponse(429, json.dumps({"retry_after": 0}).encode()),
+            FakeResponse(200, b'{"id": "1"}', {
+                "X-RateLimit-Bucket": "bucket",
+                "X-RateLimit-Remaining": "0",
+                "X-RateLimit-Reset-After": "0"
+            }),
+            URLError("timed out"),
+            URLError("timed out")
+        ])
+
+        assert webhook.get() == {"id": "1"}
+        with pytest.raises(DiscordRequestError) as excinfo:
+            webhook.get()
+
+        assert "secret-token" not in str(excinfo.value)
+        assert excinfo.value.route == "/webhooks/{id}/{token}"
+        assert "retrying" in caplog.text
+        assert "secret-token" not in caplog.text
@@ -0,0 +1,76 @@
+from .conftest import make_guild_payload
+
+import os
+import sys
+import multiprocessing
+
+projpath = os.path.normpath(os.path.join(os.path.abspath(__file__), "../.."))
+sys.path.insert(0, projpath)
+
+from discordapi import SharedCacheWriter, SharedCacheReader
+
+
+def read_channel_name(name, channel_id, queue):
+    reader = SharedCacheReader(name)
+    try:
+        queue.put(reader.get_channel(channel_id).name)
+    finally:
+        reader.close()
+
+
+class TestSharedCache:
+    def test_publish_and_read(self, offline_client):
+        client = offline_client
+        client.event_parser._handle("GUILD_CREATE", make_guild_payload())
+        writer = SharedCacheWriter(client, size=1024 * 1024)
+        reader = SharedCacheReader(writer.name)
+
+        try:
+            assert reader.get_guild("100") is None
+
+            writer.publish(force=True)
+
+            assert reader.get_guild("100").name == "guild_100"
+            assert reader.get_member("100", "1001").user.id == "1001"
+            assert reader.generation == writer.generation
+            assert writer.generation % 2 == 0
+
+            assert not reader.refresh()
+        finally:
+            reader.close()
+            writer.close()
+
+    def test_read_from_other_process(self, offline_client):
+        client = offline_client
+        client.event_parser._handle("GUILD_CREATE", make_guild_payload())
+        writer = SharedCacheWriter(client, size=1024 * 1024)
+
+        try:
+            writer.publish(force=True)
+
+            ctx = multiprocessing.get_context("spawn")
+            queue = ctx.Queue()
+            process = ctx.Process(
+                target=read_channel_name, args=(writer.name, "1001", queue)
+            )
+            process.start()
+            process.join(30)
+
+            assert queue.get(timeout=1) == "channel_1"
+        finally:
+            writer.close()
+
+    def test_mmap_file(self, offline_client, tmp_path):
+        client = offline_client
+        client.event_parser._handle("GUILD_CREATE", make_guild_payload())
+        path = str(tmp_path / "shared.bin")
+        writer = SharedCacheWriter(client, size=1024 * 1024, path=path)
+        reader = SharedCacheReader(path=path)
+
+        try:
+            writer.publish(force=True)
+
+            assert reader.get_channel("1000").name == "channel_0"
+        finally:
+            reader.close()
+            writer.close()
@@ -0,0 +1,66 @@
+from .conftest import make_guild_payload
+
+import os
+import sys
+
+projpath = os.path.normpath(os.path.join(os.path.abspath(__file__), "../.."))
+sys.path.insert(0, projpath)
+
+from discordapi import DiscordClient, CacheSnapshot
+
+
+class TestCacheSnapshot:
+    def test_roundtrip(self, offline_client, tmp_path):
+        path = str(tmp_path / "cache.bin")
+        offline_client.event_parser._handle(
+            "GUILD_CREATE", make_guild_payload())
+        offline_client.set_cache_snapshot(CacheSnapshot(path), load=False)
+        offline_client.cache_snapshot.save()
+
+        client = DiscordClient(token="offline", name="Test_snapshot")
+        client.set_cache_snapshot(CacheSnapshot(path))
+        guild = client.get_guild("100")
+
+        assert guild.stale
+        assert guild.name == "guild_100"
+        assert client.get_channel("1001").name == "channel_1"
+        assert client.get_member("100", "1001").user.username == "user_1"
+
+    def test_reconcile(self, offline_client, tmp_path):
+        path = str(tmp_path / "cache.bin")
+        offline_client.event_parser._handle(
+            "GUILD_CREATE", make_guild_payload())
+        offline_client.set_cache_snapshot(CacheSnapshot(path), load=False)
+        offline_client.cache_snapshot.save()
+
+        client = DiscordClient(token="offline", name="Test_snapshot")
+        client.set_cache_snapshot(CacheSnapshot(path))
+        client.event_parser._handle("READY", {
+            "user": {"id": "1", "username": "bot", "discriminator": "0001"},
+            "guilds": [{"id": "100", "unavailable": True}],
+            "session_id": "session",
+            "application": {"id": "1"}
+        })
+        guild = client.get_guild("100")
+
+        assert guild and guild.stale
+
+        payload = make_guild_payload(channel_count=1)
+        payload['name'] = "renamed"
+        client.event_parser._handle("GUILD_CREATE", payload)
+
+        assert client.get_guild("100") is guild
+        assert not guild.stale
+        assert guild.name == "renamed"
+        assert client.get_channel("1001") is None
+
+    def test_missing_or_broken_file(self, offline_client, tmp_path):
+        path = tmp_path / "cache.bin"
+        snapshot = CacheSnapshot(str(path))
+        snapshot.set_client(offline_client)
+
+        assert snapshot.load() == 0
+
+        path.write_bytes(b"garbage")
+
+        assert snapshot.load() == 0
@@ -0,0 +1,69 @@
+from .conftest import FakeResponse
+
+import os
+import sys
+import json
+import gzip
+import zlib
+
+projpath = os.path.normpath(os.path.join(os.path.abspath(__file__), "../.."))
+sys.path.insert(0, projpath)
+
+from discordapi import File
+from discordapi.util import MultipartEncoder, get_formdata, read_response
+
+
+def encode(body):
+    return b"".join(bytes(chunk) for chunk in body)
+
+
+class TestMultipartEncoder:
+    def test_streams_file_with_known_length(self, tmp_path):
+        path = tmp_path / "upload.bin"
+        content = os.urandom(MultipartEncoder.CHUNK_SIZE * 3 + 7)
+        path.write_bytes(content)
+
+        content_type, body = get_formdata({
+            "file": File(str(path)),
+            "payload_json": {"content": "hello"}
+        })
+        data = encode(body)
+
+        assert len(body) == len(data)
+        assert f'boundary="{body.boundary}"' in content_type
+        assert content in data
+        assert b'filename="upload.bin"\r\n' in data
+        assert data.endswith(f"--{body.boundary}--\r\n".encode())
+        assert b"\r\n\r\n" + json.dumps({"content": "hello"}).encode() + \
+            b"\r\n" in data
+        # Body can be sent again, e.g. after being rate limited
+        assert encode(body) == data
+
+    def test_in_memory_file(self):
+        _, body = get_formdata({"file": File(("a.txt", b"x" * 100000))})
+
+        assert len(body) == len(encode(body))
+        assert b"x" * 100000 in encode(body)
+
+
+class TestReadResponse:
+    body = json.dumps([{"id": str(i), "content": "hello"}
+                       for i in range(1000)]).encode()
+
+    def test_identity(self):
+        assert read_response(FakeResponse(200, self.body)) == \
+            (self.body, len(self.body))
+
+    def test_gzip(self):
+        compressed = gzip.compress(self.body)
+        res = FakeResponse(200, compressed, {"Content-Encoding": "gzip"})
+
+        assert read_response(res, chunk_size=1024) == \
+            (self.body, len(compressed))
+
+    def test_deflate(self):
+        compressed = zlib.compress(self.body)
+        res = FakeResponse(200, compressed, {"Content-Encoding": "deflate"})
+
+        assert read_response(res, chunk_size=1024) == \
+            (self.body, len(compressed))
@@ -0,0 +1,82 @@
+import pytest
+from .conftest import make_guild_payload, FakeResponse
+
+import os
+import sys
+import time
+
+projpath = os.path.normpath(os.path.join(os.path.abspath(__file__), "../.."))
+sys.path.insert(0, projpath)
+
+from discordapi import Webhook, Message, File
+
+
+def record_requests(webhook):
+    requests = []
+
+    def request(method, route, data=None, expected_code=None,
+                raise_at_exc=True, baseurl=None, headers=None):
+        requests.append((method, route, data, headers))
+        if method == "DELETE" or "wait=false" in route:
+            return None
+        return {"id": "5", "channel_id": "1000", "guild_id": "100",
+                "webhook_id": webhook.id, "content": "hello", "author": {
+                    "id": webhook.id, "username": "hook",
+                    "discriminator": "0000"}}
+
+    webhook._request = request
+    return requests
+
+
+class TestWebhook:
+    def test_from_url(self):
+        webhook = Webhook.from_url(
+            "https://discord.com/api/webhooks/123/abc-DEF_1?wait=true")
+
+        assert (webhook.id, webhook.token) == ("123", "abc-DEF_1")
+        assert "Authorization" not in webhook.headers
+        with pytest.raises(ValueError):
+            Webhook.from_url("https://discord.com/api/channels/123")
+
+    def test_execute_edit_delete(self, offline_client):
+        offline_client.event_parser._handle(
+            "GUILD_CREATE", make_guild_payload())
+        webhook = Webhook("123", "token", offline_client)
+        requests = record_requests(webhook)
+
+        message = webhook.execute("hello", username="logger", thread_id="9")
+        assert webhook.execute("hello", wait=False) is None
+        webhook.edit_message(message, file=File(("a.txt", b"a")))
+        webhook.delete_message("5", thread_id="9")
+
+        assert isinstance(message, Message)
+        assert message.channel is offline_client.get_channel("1000")
+        assert [request[:2] for request in requests] == [
+            ("POST", "/webhooks/123/token?wait=true&thread_id=9"),
+            ("POST", "/webhooks/123/token?wait=false"),
+            ("PATCH", "/webhooks/123/token/messages/5"),
+            ("DELETE", "/webhooks/123/token/messages/5?thread_id=9")
+        ]
+        assert requests[0][2] == {"content": "hello", "username": "logger"}
+        assert requests[2][3]['Content-Type'].startswith(
+            "multipart/form-data")
+
+    def test_separate_rate_limits(self):
+        first = Webhook("1", "a")
+        second = Webhook("2", "b")
+        sent = []
+
+        def send_request(method, route, data=None, baseurl=None,
+                         headers=None, timeout=None):
+            sent.append(route)
+            return FakeResponse(204), False
+
+        second._send_request = send_request
+        first.ratelimit_handler.set_limit(
+            "/webhooks/1/a", time.time() + 60, False)
+        first.ratelimit_handler.set_limit("global", time.time() + 60, False)
+
+        start = time.monotonic()
+        second.execute("hello", wait=False)
+        assert time.monotonic() - start < 1
+        assert sent == ["/webhooks/2/b?wait=false"]